@@ -1 +0,0 @@
-# TODO
\ No newline at end of file
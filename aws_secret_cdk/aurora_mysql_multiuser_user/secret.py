@@ -1,8 +1,141 @@
+import json
+
+from typing import List, Optional, Tuple, Union
+from aws_cdk import aws_secretsmanager, core, aws_kms, aws_lambda, aws_rds
+from aws_cdk.core import SecretValue
+from aws_secret_cdk.aurora_mysql_multiuser_user.secret_rotation import SecretRotation
 from aws_secret_cdk.base_secret import BaseSecret
+from aws_secret_cdk.password_policy import PasswordPolicy
+from aws_secret_cdk.performance_profile import PerformanceProfile
+from aws_secret_cdk.vpc_parameters import VPCParameters
 
 
 class Secret(BaseSecret):
-    def __init__(self) -> None:
+    """
+    Class which creates a whole infrastructure around secret management of a database user which is rotated
+    with the alternating users scheme: every rotation changes the password of either the user or its clone,
+    whichever is not currently used, hence connections made with the current credentials keep working.
+    """
+    def __init__(
+            self,
+            stack: core.Stack,
+            prefix: str,
+            vpc_parameters: VPCParameters,
+            database: Union[aws_rds.CfnDBInstance, aws_rds.CfnDBCluster],
+            master_secret: aws_secretsmanager.ISecret,
+            username: str,
+            kms_key: Optional[aws_kms.Key] = None,
+            master_kms_key: Optional[aws_kms.IKey] = None,
+            password_policy: Optional[PasswordPolicy] = None,
+            additional_endpoints: Optional[List[Tuple[str, int]]] = None,
+            performance_profile: Optional[PerformanceProfile] = None,
+            profiling: bool = False,
+            profile_slowest_invocation: bool = False
+    ) -> None:
+        """
+        Constructor.
+
+        :param stack: A stack in which resources should be created.
+        :param prefix: A prefix to give for every resource.
+        :param vpc_parameters: VPC parameters for resource (e.g. lambda rotation function) configuration.
+        :param database: A database instance for which this secret should be applied.
+        :param master_secret: A secret of the database master user, e.g. the secret of a
+            single user aurora_mysql_single_user.secret.Secret of the same database.
+        :param username: An existing database user with every grant the application needs.
+            The first rotation creates its clone (the user name with _clone appended) with the same grants.
+        :param kms_key: Custom or managed KMS key for secret encryption.
+        :param master_kms_key: Custom or managed KMS key of the master secret, if it has one.
+        :param password_policy: Rules for passwords generated on every rotation.
+        :param additional_endpoints: (host, port) pairs of other MySQL servers where the same users
+            must have the same passwords, e.g. replicas which do not replicate users.
+        :param performance_profile: Size, runtime and concurrency of the rotation lambda function.
+        :param profiling: Record resource usage of every rotation step, see SecretRotation.
+        :param profile_slowest_invocation: Also log a cProfile summary of the slowest rotation step.
+        """
         super().__init__()
 
-        raise NotImplementedError()
+        # This template is sent to a lambda function that executes secret rotation.
+        # If you choose to change this template, make sure you change lambda
+        # function source code too.
+        template = {
+            'engine': 'mysql',
+            'host': database.attr_endpoint_address,
+            'username': username,
+            'dbname': None,
+            'port': 3306,
+            'masterarn': master_secret.secret_arn
+        }
+
+        # Instances and clusters have different attributes.
+        if isinstance(database, aws_rds.CfnDBInstance):
+            template['dbname'] = database.db_name
+        elif isinstance(database, aws_rds.CfnDBCluster):
+            template['dbname'] = database.database_name
+
+        if additional_endpoints:
+            template['endpoints'] = [{'host': host, 'port': port} for host, port in additional_endpoints]
+
+        # Create a secret instance. The generated password is replaced by the first rotation,
+        # which happens as soon as the rotation schedule is created.
+        self.secret = aws_secretsmanager.Secret(
+            scope=stack,
+            id=prefix + 'RdsMultiUserSecret',
+            description=f'A multi user secret for {prefix}.',
+            encryption_key=kms_key,
+            generate_secret_string=(password_policy or PasswordPolicy()).secret_string_generator(
+                'password',
+                json.dumps(template)
+            ),
+            secret_name=prefix + 'RdsMultiUserSecret'
+        )
+
+        # Make sure database is fully deployed and configured before creating a secret for it.
+        self.secret.node.add_dependency(database)
+
+        # Create a lambda function for secret rotation.
+        self.secret_rotation = SecretRotation(
+            stack=stack,
+            prefix=prefix,
+            secret=self.secret,
+            master_secret=master_secret,
+            vpc_parameters=vpc_parameters,
+            kms_key=kms_key,
+            master_kms_key=master_kms_key,
+            password_policy=password_policy,
+            performance_profile=performance_profile,
+            profiling=profiling,
+            profile_slowest_invocation=profile_slowest_invocation
+        )
+
+        # Make sure secrets manager can invoke this lambda function.
+        self.sm_invoke_permission = aws_lambda.CfnPermission(
+            scope=stack,
+            id=prefix + 'MultiUserSecretsManagerInvokePermission',
+            action='lambda:InvokeFunction',
+            function_name=self.secret_rotation.rotation_lambda.function_name,
+            principal="secretsmanager.amazonaws.com",
+        )
+
+        # Make sure lambda function is created before making its permissions.
+        self.sm_invoke_permission.node.add_dependency(self.secret_rotation.rotation_lambda)
+
+        # Apply rotation for the secret instance.
+        self.rotation_schedule = self.create_rotation_schedule(
+            stack=stack,
+            id=prefix + 'MultiUserRotationSchedule',
+            secret=self.secret,
+            rotation_lambda=self.secret_rotation.rotation_lambda,
+            automatically_after_days=30
+        )
+
+        # Make sure invoke permission for secrets manager is created before creating a schedule.
+        self.rotation_schedule.node.add_dependency(self.sm_invoke_permission)
+
+    @property
+    def password(self) -> SecretValue:
+        return self.secret.secret_value
+
+    @property
+    def username(self) -> SecretValue:
+        # The user alternates with every rotation, hence it must be read from the secret too.
+        return self.secret.secret_value_from_json('username')
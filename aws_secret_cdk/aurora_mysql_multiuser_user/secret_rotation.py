@@ -1,8 +1,173 @@
+from typing import Optional
+from aws_cdk import core, aws_iam, aws_secretsmanager, aws_kms
+from aws_lambda.cloud_formation.lambda_aws_cdk import LambdaFunction
+from aws_secret_cdk.aurora_mysql_single_user.rotation_code import RotationCode
 from aws_secret_cdk.base_secret_rotation import BaseSecretRotation
+from aws_secret_cdk.password_policy import PasswordPolicy
+from aws_secret_cdk.performance_profile import PerformanceProfile
+from aws_secret_cdk.vpc_parameters import VPCParameters
 
 
 class SecretRotation(BaseSecretRotation):
-    def __init__(self) -> None:
+    """
+    Class which creates a lambda function responsible for RDS multi user (alternating users) secret rotation.
+    """
+    def __init__(
+            self,
+            stack: core.Stack,
+            prefix: str,
+            secret: aws_secretsmanager.Secret,
+            master_secret: aws_secretsmanager.ISecret,
+            vpc_parameters: VPCParameters,
+            kms_key: Optional[aws_kms.IKey] = None,
+            master_kms_key: Optional[aws_kms.IKey] = None,
+            password_policy: Optional[PasswordPolicy] = None,
+            performance_profile: Optional[PerformanceProfile] = None,
+            profiling: bool = False,
+            profile_slowest_invocation: bool = False
+    ) -> None:
+        """
+        Constructor.
+
+        :param stack: A stack in which resources should be created.
+        :param prefix: A prefix to give for every resource.
+        :param secret: A secret instance which the lambda function should be able to rotate.
+        :param master_secret: A secret of the database master user, which the lambda function
+        reads in order to create the clone user and change passwords.
+        :param vpc_parameters: VPC parameters for resource (e.g. lambda rotation function) configuration.
+        :param kms_key: Custom or managed KMS key for secret encryption which the
+        lambda function should be able to access.
+        :param master_kms_key: Custom or managed KMS key of the master secret, if it has one.
+        :param password_policy: Rules for generated passwords. Passwords are generated by
+        the lambda function itself with default rules if not specified.
+        :param performance_profile: Size, runtime and concurrency of the lambda function.
+        PerformanceProfile.minimal() if not specified.
+        :param profiling: Record wall time, CPU time and peak memory of every rotation step
+        as metrics, in order to right-size the lambda function. Slows the function down.
+        :param profile_slowest_invocation: Also run every rotation step under cProfile and log
+        the top functions of the slowest one. Has no effect unless profiling is enabled.
+        """
         super().__init__()
 
-        raise NotImplementedError()
+        password_policy = password_policy or PasswordPolicy()
+        performance_profile = performance_profile or PerformanceProfile.minimal()
+
+        self.__prefix = prefix + 'MultiUserSecretRotation'
+
+        # Read more about the permissions required to successfully rotate a secret:
+        # https://docs.aws.amazon.com/secretsmanager/latest/userguide//rotating-secrets-required-permissions.html
+        rotation_lambda_role_statements = [
+            # We enforce lambdas to run in a VPC.
+            # Therefore lambdas need some network interface permissions.
+            aws_iam.PolicyStatement(
+                actions=[
+                    'ec2:CreateNetworkInterface',
+                    'ec2:ModifyNetworkInterface',
+                    'ec2:DeleteNetworkInterface',
+                    'ec2:AttachNetworkInterface',
+                    'ec2:DetachNetworkInterface',
+                    'ec2:DescribeNetworkInterfaces',
+                    "logs:CreateLogGroup",
+                    "logs:CreateLogStream",
+                    "logs:PutLogEvents",
+                ],
+                effect=aws_iam.Effect.ALLOW,
+                resources=['*']
+            ),
+            # Lambda needs to call secrets manager to get secret value in order to update database password.
+            aws_iam.PolicyStatement(
+                actions=[
+                    "secretsmanager:DescribeSecret",
+                    "secretsmanager:GetSecretValue",
+                    "secretsmanager:PutSecretValue",
+                    "secretsmanager:UpdateSecretVersionStage"
+                ],
+                effect=aws_iam.Effect.ALLOW,
+                resources=[secret.secret_arn]
+            ),
+            # Lambda logs into the database as the master user, the master secret is only read.
+            aws_iam.PolicyStatement(
+                actions=[
+                    "secretsmanager:GetSecretValue"
+                ],
+                effect=aws_iam.Effect.ALLOW,
+                resources=[master_secret.secret_arn]
+            )
+        ]
+
+        if password_policy.use_api:
+            rotation_lambda_role_statements.append(
+                # Passwords are generated by secrets manager instead of the lambda function itself.
+                # GetRandomPassword does not access any resource, hence it can not be restricted to one.
+                aws_iam.PolicyStatement(
+                    actions=[
+                        "secretsmanager:GetRandomPassword"
+                    ],
+                    effect=aws_iam.Effect.ALLOW,
+                    resources=['*']
+                )
+            )
+
+        kms_key_arns = [key.key_arn for key in [kms_key, master_kms_key] if key is not None]
+        if kms_key_arns:
+            rotation_lambda_role_statements.append(
+                # Secrets may be KMS encrypted.
+                # Therefore the lambda function should be able to get this value.
+                aws_iam.PolicyStatement(
+                    actions=[
+                        'kms:GenerateDataKey',
+                        'kms:Decrypt',
+                    ],
+                    effect=aws_iam.Effect.ALLOW,
+                    resources=kms_key_arns,
+                )
+            )
+
+        self.rotation_lambda_role = aws_iam.Role(
+            scope=stack,
+            id=self.__prefix + 'LambdaRole',
+            role_name=self.__prefix + 'LambdaRole',
+            assumed_by=aws_iam.CompositePrincipal(
+                aws_iam.ServicePrincipal("lambda.amazonaws.com"),
+                aws_iam.ServicePrincipal("secretsmanager.amazonaws.com"),
+            ),
+            inline_policies={
+                self.__prefix + 'LambdaPolicy': aws_iam.PolicyDocument(
+                    statements=rotation_lambda_role_statements
+                )
+            },
+        )
+
+        # Create a lambda function responsible for rds password rotation.
+        # It ships the same code as the single user rotation lambda function with a different handler.
+        self.rotation_lambda_function = LambdaFunction(
+            scope=stack,
+            prefix=self.__prefix,
+            # Lambda function descriptions are limited to 256 characters.
+            description=(
+                'A lambda function that is utilized by AWS SecretsManager to rotate a secret after X number of days. '
+                'This lambda function logs in as the master user and alternates between a user and its clone, '
+                'changing the password of the one which is not in use.'
+            ),
+            memory=performance_profile.memory,
+            timeout=performance_profile.timeout,
+            handler='multiuser_lambda_function.lambda_handler',
+            runtime=performance_profile.runtime,
+            role=self.rotation_lambda_role,
+            env={
+                'SECRETS_MANAGER_ENDPOINT': vpc_parameters.secrets_manager_endpoint_url(stack),
+                **password_policy.environment,
+                'PROFILING_ENABLED': str(profiling).lower(),
+                'PROFILING_CPROFILE': str(profile_slowest_invocation).lower()
+            },
+            security_groups=vpc_parameters.rotation_lambda_security_groups,
+            subnets=vpc_parameters.rotation_lambda_subnets,
+            vpc=vpc_parameters.rotation_lambda_vpc,
+            # Every rotation lambda function of the stack shares the same code asset.
+            source_code=RotationCode.of(stack, performance_profile.runtime),
+            **performance_profile.function_options
+        ).lambda_function
+
+        # Secrets manager invokes the alias with provisioned concurrency, if there is one.
+        self.rotation_lambda_alias = performance_profile.create_alias(stack, self.__prefix, self.rotation_lambda_function)
+        self.rotation_lambda = self.rotation_lambda_alias or self.rotation_lambda_function
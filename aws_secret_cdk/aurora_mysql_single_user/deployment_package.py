@@ -0,0 +1,398 @@
+import ast
+import atexit
+import copy
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class DeploymentPackage:
+    """
+    Class which builds a minimal deployment package of a lambda function for a single target runtime.
+
+    For Python 3 runtimes Python 2 compatibility branches of the vendored pymysql are folded away,
+    Python 2 only modules are dropped and docstrings are stripped. The sources are edited line by line
+    rather than regenerated or compiled, hence the package only depends on the sources and the target
+    runtime, not on the interpreter running the build, and the asset hash is the same on every machine.
+    Python 2 runtimes get the sources as they are.
+    """
+    # Names from pymysql._compat that are constant on AWS Lambda Python 3 runtimes.
+    PY3_CONSTANTS = {
+        'PY2': False,
+        'JYTHON': False,
+        'IRONPYTHON': False
+    }
+
+    # Modules which are only imported under Python 2.
+    PY2_ONLY_MODULES = [
+        os.path.join('pymysql', '_socketio.py')
+    ]
+
+    # Modules which only Python 3 is able to parse.
+    PY3_ONLY_MODULES = [
+        'async_lambda_function.py',
+        'async_mysql.py'
+    ]
+
+    # Files which are never needed at runtime.
+    EXCLUDED_FILES = [
+        # The source directory is a python package only for the sake of setuptools.
+        '__init__.py'
+    ]
+    EXCLUDED_DIRECTORIES = ['__pycache__']
+    EXCLUDED_EXTENSIONS = ['.pyc', '.pyo']
+
+    def __init__(self, source_path: str, runtime: str) -> None:
+        """
+        Constructor.
+
+        :param source_path: Path to the lambda function source code directory.
+        :param runtime: Target lambda runtime name, e.g. python3.8.
+        """
+        self.source_path = source_path
+        self.runtime = runtime
+
+    @property
+    def target_version(self) -> Tuple[int, int]:
+        """
+        Python version of the target runtime, e.g. (3, 8) for python3.8.
+        """
+        major, minor = self.runtime[len('python'):].split('.')[:2]
+        return int(major), int(minor)
+
+    def build(self, output_path: Optional[str] = None) -> 'BuildReport':
+        """
+        Builds the deployment package.
+
+        :param output_path: An empty or non-existent directory for the package. A temporary one,
+        removed when the process exits, if not given.
+
+        :return: A report with sizes of the source directory and the built package.
+        """
+        if self.target_version[0] >= 3 and sys.version_info < (3, 8):
+            # Statement line ranges (end_lineno) are only known since Python 3.8.
+            raise RuntimeError(f'Building a {self.runtime} deployment package requires Python 3.8 or newer.')
+
+        if output_path is None:
+            output_path = tempfile.mkdtemp(prefix='aws-secret-cdk-')
+            atexit.register(shutil.rmtree, output_path, True)
+        os.makedirs(output_path, exist_ok=True)
+
+        for relative_path in self.__source_files():
+            source_file = os.path.join(self.source_path, relative_path)
+            target_file = os.path.join(output_path, relative_path)
+            os.makedirs(os.path.dirname(target_file), exist_ok=True)
+
+            if not relative_path.endswith('.py') or self.target_version[0] < 3:
+                shutil.copyfile(source_file, target_file)
+                continue
+
+            with open(source_file, encoding='utf-8', newline='') as file:
+                source = file.read()
+
+            with open(target_file, 'w', encoding='utf-8', newline='') as file:
+                file.write(_SourceStripper(source, relative_path, self.PY3_CONSTANTS).strip())
+
+        return BuildReport(self.runtime, self.source_path, output_path)
+
+    def signature(self) -> str:
+        """
+        Fingerprint of everything a build depends on: the target runtime and the path, size and modification
+        time of every source file. Cheap enough to compute on every use, since no file is read.
+
+        :return: A hex digest which changes whenever the source directory contents change.
+        """
+        digest = hashlib.sha256()
+        digest.update(f'{self.runtime}\0{os.path.realpath(self.source_path)}'.encode())
+        for relative_path in self.__source_files():
+            stat = os.stat(os.path.join(self.source_path, relative_path))
+            digest.update(f'\0{relative_path}\0{stat.st_size}\0{stat.st_mtime_ns}'.encode())
+        return digest.hexdigest()
+
+    def __source_files(self) -> List[str]:
+        excluded = list(self.EXCLUDED_FILES)
+        if self.target_version[0] >= 3:
+            excluded += self.PY2_ONLY_MODULES
+        else:
+            excluded += self.PY3_ONLY_MODULES
+
+        files = []
+        for root, directories, names in os.walk(self.source_path):
+            directories[:] = sorted(d for d in directories if d not in self.EXCLUDED_DIRECTORIES)
+            for name in sorted(names):
+                relative_path = os.path.relpath(os.path.join(root, name), self.source_path)
+                if relative_path in excluded or os.path.splitext(name)[1] in self.EXCLUDED_EXTENSIONS:
+                    continue
+                files.append(relative_path)
+        return files
+
+
+class BuildReport:
+    """
+    Sizes of a lambda function source directory and the deployment package built from it.
+    """
+    def __init__(self, runtime: str, source_path: str, output_path: str) -> None:
+        """
+        Constructor.
+
+        :param runtime: Target lambda runtime name.
+        :param source_path: Path to the lambda function source code directory.
+        :param output_path: Path to the built deployment package.
+        """
+        self.runtime = runtime
+        self.source_path = source_path
+        self.output_path = output_path
+        self.source = directory_size(source_path, skip_directories=DeploymentPackage.EXCLUDED_DIRECTORIES)
+        self.artifact = directory_size(output_path)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'runtime': self.runtime,
+            'output_path': self.output_path,
+            'source': self.source,
+            'artifact': self.artifact
+        }
+
+    def __str__(self) -> str:
+        return (
+            f'{self.runtime} deployment package at {self.output_path}: '
+            f'{self.artifact["files"]} files, {self.artifact["bytes"]} bytes, {self.artifact["zipped_bytes"]} zipped; '
+            f'source: {self.source["files"]} files, {self.source["bytes"]} bytes, {self.source["zipped_bytes"]} zipped.'
+        )
+
+
+def directory_size(path: str, skip_directories: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Measures a directory the way lambda sees it: number of files, their total size and the deflated zip size.
+
+    :param path: Directory to measure.
+    :param skip_directories: Directory names to leave out, e.g. __pycache__.
+
+    :return: A dictionary with files, bytes and zipped_bytes keys.
+    """
+    files = 0
+    size = 0
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for root, directories, names in os.walk(path):
+            directories[:] = sorted(d for d in directories if d not in (skip_directories or []))
+            for name in sorted(names):
+                file_path = os.path.join(root, name)
+                files += 1
+                size += os.path.getsize(file_path)
+                archive.write(file_path, os.path.relpath(file_path, path))
+    return {'files': files, 'bytes': size, 'zipped_bytes': len(buffer.getvalue())}
+
+
+def build_deployment_package(source_path: str, runtime: str, output_path: Optional[str] = None) -> str:
+    """
+    Builds a minimal deployment package.
+
+    :param source_path: Path to the lambda function source code directory.
+    :param runtime: Target lambda runtime name, e.g. python3.8.
+    :param output_path: An empty or non-existent directory for the package. A temporary one,
+    removed when the process exits, if not given.
+
+    :return: Path to the built deployment package.
+    """
+    return DeploymentPackage(source_path, runtime).build(output_path).output_path
+
+
+# Deployment packages built by this process, keyed by the signature of their source directory.
+_built_packages: Dict[str, str] = {}
+
+
+def cached_deployment_package(source_path: str, runtime: str) -> Tuple[str, str]:
+    """
+    Builds a minimal deployment package once per process and source directory contents.
+
+    Every rotation construct of an app ships the same package, hence it is built on first use and reused
+    until a source file changes.
+
+    :param source_path: Path to the lambda function source code directory.
+    :param runtime: Target lambda runtime name, e.g. python3.8.
+
+    :return: Path to the built deployment package and the signature it was built for.
+    """
+    package = DeploymentPackage(source_path, runtime)
+    signature = package.signature()
+    if signature not in _built_packages:
+        _built_packages[signature] = package.build().output_path
+    return _built_packages[signature], signature
+
+
+class _Py3Folder(ast.NodeTransformer):
+    """
+    Replaces Python 2 compatibility flags with constants and drops the branches they make unreachable.
+    """
+    def __init__(self, constants: Dict[str, bool]) -> None:
+        self.constants = constants
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if isinstance(node.ctx, ast.Load) and node.id in self.constants:
+            return ast.copy_location(ast.Constant(value=self.constants[node.id]), node)
+        return node
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not) and isinstance(node.operand, ast.Constant):
+            return ast.copy_location(ast.Constant(value=not node.operand.value), node)
+        return node
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> ast.AST:
+        self.generic_visit(node)
+        values = list(node.values)
+        # Only leading constants are folded, so no expression with side effects is ever dropped.
+        while len(values) > 1 and isinstance(values[0], ast.Constant):
+            deciding = not values[0].value if isinstance(node.op, ast.And) else values[0].value
+            if deciding:
+                return values[0]
+            values.pop(0)
+        if len(values) == 1:
+            return values[0]
+        node.values = values
+        return node
+
+    def visit_If(self, node: ast.If) -> Any:
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            return (node.body if node.test.value else node.orelse) or ast.copy_location(ast.Pass(), node)
+        return node
+
+    def visit_IfExp(self, node: ast.IfExp) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant):
+            return node.body if node.test.value else node.orelse
+        return node
+
+
+class _SourceStripper:
+    """
+    Strips docstrings and folds Python 2 compatibility branches of a module by editing its source lines.
+
+    Kept lines are copied as they are, only the statements of a folded branch are dedented to the level of
+    the if statement they replace. Branches which can not be moved that way, e.g. ones with multi-line strings,
+    are kept as they are, since the folding is an optimization only.
+    """
+    # Statement attributes holding nested statement lists, in source order.
+    BODIES = {
+        ast.If: ['body', 'orelse'],
+        ast.For: ['body', 'orelse'],
+        ast.AsyncFor: ['body', 'orelse'],
+        ast.While: ['body', 'orelse'],
+        ast.With: ['body'],
+        ast.AsyncWith: ['body'],
+        ast.FunctionDef: ['body'],
+        ast.AsyncFunctionDef: ['body'],
+        ast.ClassDef: ['body']
+    }
+
+    def __init__(self, source: str, filename: str, constants: Dict[str, bool]) -> None:
+        # Split lines the way the tokenizer does, so that line numbers of the tree match.
+        self.lines = io.StringIO(source, newline='').readlines()
+        self.tree = ast.parse(source, filename=filename)
+        self.folder = _Py3Folder(constants)
+
+    def strip(self) -> str:
+        return ''.join(self.__body(self.tree.body, 0, True))
+
+    def __body(self, statements: List[ast.stmt], dedent: int, docstring: bool) -> List[str]:
+        lines = []
+        for index, statement in enumerate(statements):
+            if index == 0 and docstring and _is_docstring(statement):
+                continue
+
+            branch = self.__folded_branch(statement)
+            if branch is None:
+                lines += self.__statement(statement, dedent)
+            elif branch:
+                lines += self.__body(branch, dedent + branch[0].col_offset - statement.col_offset, False)
+
+        return lines
+
+    def __statement(self, statement: ast.stmt, dedent: int) -> List[str]:
+        start = min([statement.lineno] + [decorator.lineno for decorator in getattr(statement, 'decorator_list', [])])
+        if isinstance(statement, ast.Try):
+            # Every except clause is a header followed by its own body.
+            bodies = [statement.body] + [handler.body for handler in statement.handlers]
+            bodies += [statement.orelse, statement.finalbody]
+        else:
+            bodies = [getattr(statement, name) for name in self.BODIES.get(type(statement), [])]
+        bodies = [body for body in bodies if body]
+
+        lines = []
+        position = start
+        for body in bodies:
+            # Compound statements written on a single line are copied as they are.
+            if body[0].lineno < position or self.lines[body[0].lineno - 1][:body[0].col_offset].strip():
+                return self.__copy(start, statement.end_lineno, dedent)
+
+            lines += self.__copy(position, body[0].lineno - 1, dedent)
+            body_lines = self.__body(body, dedent, type(statement) in (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+            lines += body_lines or [' ' * (body[0].col_offset - dedent) + 'pass\n']
+            position = body[-1].end_lineno + 1
+
+        return lines + self.__copy(position, statement.end_lineno, dedent)
+
+    def __folded_branch(self, statement: ast.stmt) -> Optional[List[ast.stmt]]:
+        if not isinstance(statement, ast.If) or self.lines[statement.lineno - 1].lstrip().startswith('elif'):
+            return None
+
+        test = self.folder.visit(copy.deepcopy(statement.test))
+        if not isinstance(test, ast.Constant):
+            return None
+
+        branch = statement.body if test.value else statement.orelse
+        if not branch:
+            return branch
+
+        # An elif chain, a branch on the line of its header or a multi-line string would not survive the dedent.
+        if isinstance(branch[0], ast.If) and self.lines[branch[0].lineno - 1].lstrip().startswith('elif'):
+            return None
+        if self.lines[branch[0].lineno - 1][:branch[0].col_offset].strip():
+            return None
+        for node in ast.walk(ast.Module(body=branch, type_ignores=[])):
+            if isinstance(node, (ast.Constant, ast.JoinedStr)) and node.end_lineno > node.lineno:
+                return None
+
+        return branch
+
+    def __copy(self, first: int, last: int, dedent: int) -> List[str]:
+        lines = []
+        for line in self.lines[first - 1:last]:
+            indent = len(line) - len(line.lstrip(' '))
+            lines.append(line[min(dedent, indent):])
+        return lines
+
+
+def _is_docstring(statement: ast.stmt) -> bool:
+    return (
+        isinstance(statement, ast.Expr) and
+        isinstance(statement.value, ast.Constant) and
+        isinstance(statement.value.value, str)
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Builds a minimal lambda function deployment package.')
+    parser.add_argument('--runtime', default=f'python{sys.version_info[0]}.{sys.version_info[1]}')
+    parser.add_argument('--source', default=os.path.join(os.path.dirname(os.path.realpath(__file__)), 'package_src'))
+    parser.add_argument('--output', help='Output directory, a temporary one removed on exit by default.')
+    parser.add_argument('--json', help='Write the size report to this file.')
+    args = parser.parse_args()
+
+    report = DeploymentPackage(args.source, args.runtime).build(args.output)
+    print(report)
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(report.to_dict(), report_file, indent=2, sort_keys=True)
@@ -0,0 +1,417 @@
+import asyncio
+import functools
+import logging
+import time
+
+import async_mysql
+import lambda_function
+import pymysql
+
+from caching_client import CachingSecretsManagerClient
+from connection_result import ConnectionResult, classify_error
+from credential_probe import ProbeResult, endpoint_of
+from instrumentation import recorder
+from profiling import profiler
+
+# Python 3 only. Set the lambda function handler to async_lambda_function.lambda_handler to use it.
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Seconds to wait for any packet of a logged in database server, so that a stalled server fails the step
+# instead of hanging until the lambda function times out.
+READ_TIMEOUT = 30.0
+
+
+def lambda_handler(event, context):
+    """Secrets Manager RDS MySQL Handler running every rotation step on an asyncio event loop
+
+    Does exactly what lambda_function.lambda_handler does, with the same secret format, validations, checkpoints
+    and errors. Secrets manager calls run in the default executor and database logins use a non-blocking client,
+    hence independent I/O within a step (e.g. fetching the AWSPENDING, AWSCURRENT and AWSPREVIOUS versions or
+    logging in with every candidate credential) overlaps. Batch and dry run events are delegated to the synchronous
+    handler.
+
+    Args:
+        event (dict): Lambda dictionary of event parameters. These keys must include the following:
+            - SecretId: The secret ARN or identifier
+            - ClientRequestToken: The ClientRequestToken of the secret version
+            - Step: The rotation step (one of createSecret, setSecret, testSecret, or finishSecret)
+
+        context (LambdaContext): The Lambda runtime information
+
+    Raises:
+        ResourceNotFoundException: If the secret with the specified arn and stage does not exist
+
+        ValueError: If the secret is not properly configured for rotation
+
+        KeyError: If the secret json does not contain the expected keys
+
+    """
+    if event.get('DryRun') or ('SecretIds' in event and 'SecretId' not in event):
+        return lambda_function.lambda_handler(event, context)
+
+    runtime_context = lambda_function.setup_runtime()
+
+    arn = event['SecretId']
+    token = event['ClientRequestToken']
+    step = event['Step']
+
+    # Reads are memoized for the duration of this invocation only.
+    service_client = CachingSecretsManagerClient(runtime_context.service_client)
+    counters = runtime_context.service_client.counters()
+    loop = asyncio.new_event_loop()
+    try:
+        with profiler.profile(step):
+            loop.run_until_complete(run_step(service_client, arn, token, step))
+    finally:
+        # Tasks still pending must be cancelled and awaited, or they are destroyed with the loop.
+        unfinished = async_mysql.all_tasks(loop)
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            loop.run_until_complete(asyncio.gather(*unfinished, return_exceptions=True))
+        loop.close()
+        retries = lambda_function.counter_deltas(counters, runtime_context.service_client.counters())
+        logger.info("Secrets manager API calls made: %d, avoided: %d, retried: %d, throttled: %d." % (service_client.api_calls_made, service_client.api_calls_avoided, retries['Retries'], retries['Throttles']))
+        recorder.flush({'Step': step})
+
+
+async def run_step(service_client, arn, token, step):
+    """Validates the secret version staging and runs the requested rotation step
+
+    Args:
+        service_client (client): The secrets manager service client
+
+        arn (string): The secret ARN or other identifier
+
+        token (string): The ClientRequestToken associated with the secret version
+
+        step (string): The rotation step (one of createSecret, setSecret, testSecret, or finishSecret)
+
+    Raises:
+        ValueError: If the secret is not properly configured for rotation or the step is invalid
+
+    """
+    metadata = await in_executor(service_client.describe_secret, SecretId=arn)
+    if not lambda_function.check_version_staging(metadata, arn, token):
+        return
+
+    steps = {
+        'createSecret': create_secret,
+        'setSecret': set_secret,
+        'testSecret': test_secret,
+        'finishSecret': finish_secret
+    }
+    if step not in steps:
+        logger.error("lambda_handler: Invalid step parameter %s for secret %s" % (step, arn))
+        raise ValueError("Invalid step parameter %s for secret %s" % (step, arn))
+
+    with recorder.span(step):
+        await steps[step](service_client, arn, token)
+
+
+async def create_secret(service_client, arn, token):
+    """Generate a new secret, see lambda_function.create_secret
+
+    The AWSCURRENT and AWSPENDING versions are fetched at the same time.
+
+    """
+    current, pending = await asyncio.gather(
+        in_executor(lambda_function.get_secret_dict, service_client, arn, "AWSCURRENT"),
+        in_executor(lambda_function.get_secret_dict, service_client, arn, "AWSPENDING", token),
+        return_exceptions=True
+    )
+
+    # Make sure the current secret exists
+    if isinstance(current, Exception):
+        raise current
+
+    if not isinstance(pending, Exception):
+        logger.info("createSecret: Successfully retrieved secret for %s." % arn)
+        return
+    if not isinstance(pending, service_client.exceptions.ResourceNotFoundException):
+        raise pending
+
+    current['password'] = await in_executor(lambda_function.new_password, service_client)
+    await in_executor(
+        service_client.put_secret_value,
+        SecretId=arn,
+        ClientRequestToken=token,
+        SecretString=lambda_function.json.dumps(current),
+        VersionStages=['AWSPENDING']
+    )
+    logger.info("createSecret: Successfully put secret for ARN %s and version %s." % (arn, token))
+
+
+async def set_secret(service_client, arn, token):
+    """Set the pending secret in the database, see lambda_function.set_secret
+
+    The AWSPENDING, AWSCURRENT and AWSPREVIOUS versions are fetched at the same time, every endpoint is rotated at
+    the same time and every candidate credential logs in at the same time.
+
+    """
+    pending_dict, current_dict, previous_dict = await asyncio.gather(
+        in_executor(lambda_function.get_secret_dict, service_client, arn, "AWSPENDING", token),
+        in_executor(lambda_function.get_secret_dict, service_client, arn, "AWSCURRENT"),
+        in_executor(get_optional_secret_dict, service_client, arn, "AWSPREVIOUS")
+    )
+    # Both refer to the same initial password secret, the second lookup is memoized.
+    current_dict = await in_executor(lambda_function.with_initial_password, service_client, current_dict)
+    pending_dict = await in_executor(lambda_function.with_initial_password, service_client, pending_dict)
+
+    await fan_out('setSecret', arn, pending_dict, lambda endpoint: set_endpoint_secret(
+        arn,
+        token,
+        lambda_function.with_endpoint(pending_dict, endpoint),
+        lambda_function.with_endpoint(current_dict, endpoint),
+        lambda_function.with_endpoint(previous_dict, endpoint)
+    ))
+
+
+async def set_endpoint_secret(arn, token, pending_dict, current_dict, previous_dict):
+    """Set the pending secret in a single database endpoint, see lambda_function.set_endpoint_secret"""
+    candidates = lambda_function.login_candidates(pending_dict, current_dict, previous_dict)
+    endpoint = lambda_function.endpoint_label(pending_dict)
+    name, conn, probe = None, None, None
+
+    # A retried attempt goes straight to the credential which worked for an earlier attempt of this rotation
+    known_good = lambda_function.known_good_candidate(candidates, arn, token, endpoint)
+    if known_good:
+        result = await connect(known_good[1])
+        if result.succeeded:
+            name, conn = known_good[0], result.connection
+            logger.info("setSecret: Resuming with %s secret known from an earlier attempt for secret arn %s." % (name, arn))
+
+    # Otherwise try every credential at the same time, the first successful login wins
+    if not conn:
+        probe = await probe_credentials(candidates)
+        name, conn = probe.name, probe.connection
+
+    if conn:
+        lambda_function.checkpoints.save(arn, token, **{lambda_function.checkpoint_key('credential', endpoint): name})
+
+    # If the pending secret already works, there is nothing to do
+    if name == 'AWSPENDING':
+        await conn.close()
+        logger.info("setSecret: AWSPENDING secret is already set as password in MySQL DB for secret arn %s." % arn)
+        return
+
+    # Do not mistake an unreachable database for wrong credentials
+    if not conn and probe.endpoint_unreachable:
+        logger.error("setSecret: Unable to reach MySQL DB for secret arn %s: %s" % (arn, probe.describe_failures()))
+        raise ValueError("Unable to reach MySQL DB for secret arn %s" % arn)
+
+    if not conn:
+        logger.error("setSecret: Unable to log into database with previous, current, or pending secret of secret arn %s" % arn)
+        raise ValueError("Unable to log into database with previous, current, or pending secret of secret arn %s" % arn)
+
+    logger.info("setSecret: Logged into MySQL DB with %s secret for secret arn %s." % (name, arn))
+
+    # Now set the password to the pending password
+    try:
+        password_option = lambda_function.get_password_option(lambda_function.server_profiles.record(conn).version)
+        await conn.query("SET PASSWORD = " + password_option, pending_dict['password'])
+        await conn.commit()
+        lambda_function.checkpoints.save(arn, token, **{lambda_function.checkpoint_key('password_set', endpoint): True})
+        logger.info("setSecret: Successfully set password for user %s in MySQL DB for secret arn %s." % (pending_dict['username'], arn))
+    finally:
+        await conn.close()
+
+
+async def test_secret(service_client, arn, token):
+    """Test the pending secret against the database, see lambda_function.test_secret"""
+    logger.info('Testing secret with AWSPENDING stage...')
+    secret_dict = await in_executor(lambda_function.get_secret_dict, service_client, arn, "AWSPENDING", token)
+    await fan_out('testSecret', arn, secret_dict, lambda endpoint: test_endpoint_secret(arn, lambda_function.with_endpoint(secret_dict, endpoint)))
+
+
+async def test_endpoint_secret(arn, secret_dict):
+    """Test the pending secret against a single database endpoint, see lambda_function.test_endpoint_secret"""
+    conn = (await connect(secret_dict)).connection
+
+    if not conn:
+        logger.error("testSecret: Unable to log into database with pending secret of secret ARN %s" % arn)
+        raise ValueError("Unable to log into database with pending secret of secret ARN %s" % arn)
+
+    try:
+        await conn.query("SELECT NOW()")
+        await conn.commit()
+    finally:
+        await conn.close()
+
+    logger.info("testSecret: Successfully signed into MySQL DB with AWSPENDING secret in %s." % arn)
+
+
+async def finish_secret(service_client, arn, token):
+    """Finish the rotation by marking the pending secret as current, see lambda_function.finish_secret"""
+    await in_executor(lambda_function.finish_secret.__wrapped__, service_client, arn, token)
+
+
+async def fan_out(step, arn, secret_dict, function):
+    """Runs a rotation step against every database endpoint of a secret at the same time
+
+    Same outcome as lambda_function.fan_out.
+
+    Args:
+        step (string): The rotation step, for logging
+
+        arn (string): The secret ARN or other identifier
+
+        secret_dict (dict): The Secret Dictionary listing the endpoints
+
+        function (function): Returns a coroutine running the step against a single endpoint, it takes an additional
+        endpoint of the secret or None for the host of the secret itself
+
+    Raises:
+        ValueError: If the step failed on any endpoint
+
+    """
+    endpoints = secret_dict.get('endpoints') or []
+    if not endpoints:
+        await function(None)
+        return
+
+    async def run(endpoint):
+        start = time.time()
+        try:
+            await function(endpoint)
+            error = None
+        except Exception as e:
+            error = e
+        return lambda_function.endpoint_label(lambda_function.with_endpoint(secret_dict, endpoint)), time.time() - start, error
+
+    results = await asyncio.gather(*[run(endpoint) for endpoint in [None] + list(endpoints)])
+    lambda_function.report_endpoints(step, arn, results)
+
+
+async def connect(secret_dict):
+    """Tries to log into MySQL DB with a secret dictionary and classifies the outcome
+
+    Mirrors lambda_function.connect, including the adaptive connect timeout and the cached server public key, but
+    always opens a new connection.
+
+    Args:
+        secret_dict (dict): The Secret Dictionary
+
+    Returns:
+        ConnectionResult: The outcome of the attempt holding an open AsyncConnection on success
+
+    Raises:
+        KeyError: If the secret json does not contain the expected keys
+
+    """
+    port = int(secret_dict['port']) if 'port' in secret_dict else 3306
+    dbname = secret_dict['dbname'] if 'dbname' in secret_dict else None
+    host = secret_dict['host']
+    connect_timeout = lambda_function.connect_timeouts.timeout(host, port)
+    public_key = lambda_function.server_profiles.public_key(host, port)
+
+    start = time.time()
+    while True:
+        try:
+            with recorder.span('MySQL.Login'):
+                conn = await async_mysql.connect(host, secret_dict['username'], secret_dict['password'], port=port, db=dbname, connect_timeout=connect_timeout, server_public_key=public_key, read_timeout=READ_TIMEOUT)
+            break
+        except pymysql.OperationalError as e:
+            status = classify_error(e)
+            if status == ConnectionResult.AUTH_FAILURE and public_key is not None:
+                # The key may belong to another server, e.g. after a failover, retry once fetching the current one
+                logger.info("Login to %s:%d as %s with a cached server public key failed, retrying without it." % (host, port, secret_dict['username']))
+                lambda_function.server_profiles.forget_public_key(host, port)
+                public_key = None
+                continue
+
+            elapsed = time.time() - start
+            logger.info("Login to %s:%d as %s failed with %s after %.3fs: %s" % (host, port, secret_dict['username'], status, elapsed, e))
+            return ConnectionResult(status, error=e, elapsed=elapsed)
+
+    elapsed = time.time() - start
+    lambda_function.connect_timeouts.record(host, port, elapsed)
+    lambda_function.server_profiles.record(conn)
+    return ConnectionResult(ConnectionResult.SUCCESS, connection=conn, elapsed=elapsed)
+
+
+async def probe_credentials(candidates):
+    """Tries to log into the database with every candidate credential at the same time
+
+    Same outcome as credential_probe.probe_credentials: the first successful login wins, connections obtained
+    later are closed and attempts against an endpoint which turned out to be unreachable are abandoned.
+
+    Args:
+        candidates (list): A list of (name, secret_dict) tuples, where name describes the credential in logs
+
+    Returns:
+        ProbeResult: The winning candidate, if any, and the failures observed so far
+
+    """
+    result = ProbeResult()
+    attempts = {}
+    for name, secret_dict in candidates:
+        logger.info('Attempting to get connection from %s secret.' % name)
+        attempts[asyncio.ensure_future(_attempt(name, secret_dict))] = (name, secret_dict)
+
+    unfinished = set(attempts)
+    while unfinished:
+        done, unfinished = await asyncio.wait(unfinished, return_when=asyncio.FIRST_COMPLETED)
+        for attempt in done:
+            name, secret_dict = attempts[attempt]
+            connection_result = attempt.result()
+            if connection_result.succeeded and result.connection is None:
+                result.name = name
+                result.secret_dict = secret_dict
+                result.connection = connection_result.connection
+            elif connection_result.succeeded:
+                logger.info("Closing redundant connection obtained with %s secret." % name)
+                await connection_result.connection.close()
+            else:
+                result.failures[name] = connection_result
+                if connection_result.endpoint_unreachable:
+                    result.unreachable_endpoints.add(endpoint_of(secret_dict))
+
+        if result.connection is not None:
+            break
+        # Attempts against an unreachable endpoint can only time out, there is no point waiting for them.
+        if all(endpoint_of(attempts[attempt][1]) in result.unreachable_endpoints for attempt in unfinished):
+            break
+
+    for attempt in unfinished:
+        attempt.cancel()
+
+    # Cancellation only takes effect at the next scheduling point, an attempt may log in meanwhile.
+    for connection_result in await asyncio.gather(*unfinished, return_exceptions=True):
+        if isinstance(connection_result, ConnectionResult) and connection_result.succeeded:
+            logger.info("Closing redundant connection obtained by a cancelled attempt.")
+            await connection_result.connection.close()
+    return result
+
+
+async def _attempt(name, secret_dict):
+    try:
+        return await connect(secret_dict)
+    except Exception as e:
+        logger.warning('Connection attempt with %s secret failed: %r' % (name, e))
+        return ConnectionResult(ConnectionResult.ERROR, error=e)
+
+
+def get_optional_secret_dict(service_client, arn, stage):
+    """Gets the secret dictionary of a stage which may not exist, see lambda_function.get_secret_dict
+
+    Returns:
+        SecretDictionary: Secret dictionary, or None if there is no version with the stage
+
+    """
+    try:
+        return lambda_function.get_secret_dict(service_client, arn, stage)
+    except service_client.exceptions.ResourceNotFoundException:
+        return None
+
+
+def in_executor(function, *args, **kwargs):
+    """Runs a blocking function in the default executor of the running event loop
+
+    Returns:
+        Future: Resolves to the return value of the function
+
+    """
+    return asyncio.get_event_loop().run_in_executor(None, functools.partial(function, *args, **kwargs))
@@ -0,0 +1,399 @@
+import asyncio
+import os
+import struct
+
+from pymysql import _auth, err
+from pymysql.charset import charset_by_name
+from pymysql.connections import DEFAULT_CHARSET, MAX_PACKET_LEN, Connection, lenenc_int
+from pymysql.constants import CLIENT, COMMAND, CR
+from pymysql.protocol import EOFPacketWrapper, MysqlPacket, OKPacketWrapper
+
+# Python 3 only, the synchronous rotation code does not depend on this module.
+
+
+class AsyncConnection(object):
+    """Minimal non-blocking MySQL client built on the pymysql protocol packet classes
+
+    Supports exactly what the rotation needs: logging in with mysql_native_password or caching_sha2_password
+    (including an auth switch and the RSA full authentication), running text queries and reading small text
+    result sets. Errors are raised as the same pymysql exceptions the synchronous client raises, hence they
+    can be classified the same way.
+
+    """
+    # Values are quoted exactly like the synchronous client quotes them, honouring NO_BACKSLASH_ESCAPES.
+    escape = Connection.escape
+    escape_string = Connection.escape_string
+    _quote_bytes = Connection._quote_bytes
+    _binary_prefix = False
+
+    def __init__(self, host, user, password, port=3306, db=None, charset=DEFAULT_CHARSET, server_public_key=None, read_timeout=None):
+        self.host = host
+        self.port = port
+        self.user = user.encode('utf-8')
+        self.password = password or b''
+        if not isinstance(self.password, bytes):
+            self.password = self.password.encode('latin1')
+        self.db = db.encode('utf-8') if db else None
+        self.charset = charset
+        self.encoding = charset_by_name(charset).encoding
+
+        self.server_version = None
+        self.server_capabilities = 0
+        self.server_status = 0
+        self.salt = b''
+        self.server_public_key = server_public_key
+        self.read_timeout = read_timeout
+
+        self._auth_plugin_name = ''
+        self._reader = None
+        self._writer = None
+        self._next_seq_id = 0
+
+    @property
+    def open(self):
+        return self._writer is not None
+
+    async def connect(self, connect_timeout=None):
+        """Opens the connection, reads the server handshake and logs in
+
+        Args:
+            connect_timeout (float): Seconds to wait for the TCP connection and, separately, for the handshake and
+            the authentication, None to wait forever
+
+        Raises:
+            OperationalError: If the server can not be reached or rejects the credentials
+
+        """
+        try:
+            self._reader, self._writer = await with_timeout(asyncio.open_connection(self.host, self.port), connect_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise err.OperationalError(CR.CR_CONN_HOST_ERROR, "Can't connect to MySQL server on %r (%s)" % (self.host, str(e) or 'timed out'))
+
+        try:
+            await with_timeout(self._login(), connect_timeout)
+        except asyncio.TimeoutError:
+            self.force_close()
+            raise err.OperationalError(CR.CR_SERVER_LOST, "Lost connection to MySQL server at 'reading initial communication packet' (timed out)")
+        except BaseException:
+            self.force_close()
+            raise
+
+    async def query(self, sql, args=None):
+        """Runs a query and reads its result
+
+        Args:
+            sql (string): The query, with %s placeholders if args are given
+
+            args (object): A single value or a tuple of values substituted into the query, escaped like pymysql
+            cursors do
+
+        Returns:
+            list: Rows of the result set as tuples of strings (None for NULL), empty for statements without one
+
+        """
+        if isinstance(args, (tuple, list)):
+            sql = sql % tuple(self.escape(arg) for arg in args)
+        elif args is not None:
+            sql = sql % self.escape(args)
+        await self._execute_command(COMMAND.COM_QUERY, sql.encode(self.encoding))
+        return await self._read_result()
+
+    async def commit(self):
+        await self.query('COMMIT')
+
+    async def close(self):
+        """Sends COM_QUIT and closes the connection"""
+        if self._writer is None:
+            return
+        try:
+            self._next_seq_id = 0
+            self._write_packet(struct.pack('<B', COMMAND.COM_QUIT))
+            await self._writer.drain()
+        except Exception:
+            pass
+        self.force_close()
+
+    def force_close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _login(self):
+        await self._read_handshake()
+        await self._authenticate()
+
+    async def _read_handshake(self):
+        packet = await self._read_packet()
+        data = packet.get_all_data()
+
+        i = 1
+        server_end = data.find(b'\0', i)
+        self.server_version = data[i:server_end].decode('latin1')
+        i = server_end + 1 + 4
+
+        self.salt = data[i:i + 8]
+        i += 9
+
+        self.server_capabilities = struct.unpack('<H', data[i:i + 2])[0]
+        i += 2
+
+        salt_len = 12
+        if len(data) >= i + 6:
+            _, self.server_status, capabilities_high, salt_len = struct.unpack('<BHHB', data[i:i + 6])
+            self.server_capabilities |= capabilities_high << 16
+            salt_len = max(12, salt_len - 9)
+            i += 6
+
+        i += 10
+        if len(data) >= i + salt_len:
+            self.salt += data[i:i + salt_len]
+            i += salt_len
+
+        i += 1
+        if self.server_capabilities & CLIENT.PLUGIN_AUTH and len(data) >= i:
+            server_end = data.find(b'\0', i)
+            self._auth_plugin_name = (data[i:] if server_end < 0 else data[i:server_end]).decode('utf-8')
+
+    async def _authenticate(self):
+        client_flag = CLIENT.CAPABILITIES
+        if self.db:
+            client_flag |= CLIENT.CONNECT_WITH_DB
+
+        data = struct.pack('<iIB23s', client_flag, MAX_PACKET_LEN, charset_by_name(self.charset).id, b'')
+        data += self.user + b'\0'
+
+        plugin_name = self._auth_plugin_name.encode('ascii')
+        if self._auth_plugin_name == 'caching_sha2_password':
+            authresp = _auth.scramble_caching_sha2(self.password, self.salt)
+        elif self._auth_plugin_name in ('', 'mysql_native_password'):
+            authresp = _auth.scramble_native_password(self.password, self.salt)
+        else:
+            plugin_name, authresp = b'mysql_native_password', _auth.scramble_native_password(self.password, self.salt)
+
+        if self.server_capabilities & CLIENT.PLUGIN_AUTH_LENENC_CLIENT_DATA:
+            data += lenenc_int(len(authresp)) + authresp
+        else:
+            data += struct.pack('B', len(authresp)) + authresp
+
+        if self.db and self.server_capabilities & CLIENT.CONNECT_WITH_DB:
+            data += self.db + b'\0'
+        if self.server_capabilities & CLIENT.PLUGIN_AUTH:
+            data += plugin_name + b'\0'
+        if self.server_capabilities & CLIENT.CONNECT_ATTRS:
+            data += _encode_connect_attrs()
+
+        self._write_packet(data)
+        await self._finish_authentication(await self._read_packet())
+
+    async def _finish_authentication(self, packet):
+        if packet.is_auth_switch_request():
+            packet.read_uint8()
+            plugin_name = packet.read_string()
+            self._auth_plugin_name = plugin_name.decode('ascii')
+            self.salt = packet.read_all()
+            if self.salt.endswith(b'\0'):
+                self.salt = self.salt[:-1]
+            if plugin_name == b'mysql_native_password':
+                packet = await self._roundtrip(_auth.scramble_native_password(self.password, self.salt))
+            elif plugin_name == b'caching_sha2_password':
+                packet = await self._roundtrip(_auth.scramble_caching_sha2(self.password, self.salt))
+            else:
+                raise err.OperationalError(2059, "Authentication plugin '%s' not configured" % self._auth_plugin_name)
+
+        if packet.is_extra_auth_data() and self._auth_plugin_name == 'caching_sha2_password':
+            packet = await self._caching_sha2_full_auth(packet)
+
+        packet.check_error()
+        if not packet.is_ok_packet():
+            raise err.OperationalError(CR.CR_SERVER_LOST, "Unexpected packet while authenticating")
+        self.server_status = OKPacketWrapper(packet).server_status
+
+    async def _caching_sha2_full_auth(self, packet):
+        # 3 - fast auth succeeded, 4 - full auth needed
+        packet.advance(1)
+        result = packet.read_uint8()
+        if result == 3:
+            return await self._read_packet()
+        if result != 4:
+            raise err.OperationalError(CR.CR_AUTH_PLUGIN_ERR, "caching sha2: Unknown result for fast auth: %s" % result)
+
+        if not self.server_public_key:
+            packet = await self._roundtrip(b'\x02')
+            packet.check_error()
+            self.server_public_key = packet.get_all_data()[1:]
+        return await self._roundtrip(_auth.sha2_rsa_encrypt(self.password, self.salt, self.server_public_key))
+
+    async def _roundtrip(self, data):
+        self._write_packet(data)
+        return await self._read_packet()
+
+    async def _execute_command(self, command, data):
+        self._next_seq_id = 0
+        self._write_packet(struct.pack('<B', command) + data)
+        await self._writer.drain()
+
+    async def _read_result(self):
+        packet = await self._read_packet()
+        packet.check_error()
+        if packet.is_ok_packet():
+            # The status tells whether backslashes still escape, e.g. after a change of sql_mode.
+            self.server_status = OKPacketWrapper(packet).server_status
+            return []
+
+        field_count = packet.read_length_encoded_integer()
+        # Column definitions are not needed, every value is returned as a string.
+        for _ in range(field_count):
+            await self._read_packet()
+        (await self._read_packet()).check_error()
+
+        rows = []
+        while True:
+            packet = await self._read_packet()
+            packet.check_error()
+            if packet.is_eof_packet():
+                self.server_status = EOFPacketWrapper(packet).server_status
+                return rows
+            row = []
+            for _ in range(field_count):
+                value = packet.read_length_coded_string()
+                row.append(value.decode(self.encoding) if value is not None else None)
+            rows.append(tuple(row))
+
+    def _write_packet(self, payload):
+        if self._writer is None:
+            raise err.InterfaceError(0, '')
+        while True:
+            chunk, payload = payload[:MAX_PACKET_LEN], payload[MAX_PACKET_LEN:]
+            self._writer.write(struct.pack('<I', len(chunk))[:3] + struct.pack('<B', self._next_seq_id) + chunk)
+            self._next_seq_id = (self._next_seq_id + 1) % 256
+            if len(chunk) < MAX_PACKET_LEN:
+                return
+
+    async def _read_packet(self):
+        if self._reader is None:
+            raise err.InterfaceError(0, '')
+
+        try:
+            payload = await with_timeout(self._read_payload(), self.read_timeout)
+        except asyncio.TimeoutError:
+            self.force_close()
+            raise err.OperationalError(CR.CR_SERVER_LOST, "Lost connection to MySQL server during query (timed out)")
+
+        return MysqlPacket(payload, self.encoding)
+
+    async def _read_payload(self):
+        if self._writer.transport.get_write_buffer_size():
+            await self._writer.drain()
+
+        payload = b''
+        try:
+            while True:
+                header = await self._reader.readexactly(4)
+                length = header[0] | header[1] << 8 | header[2] << 16
+                if header[3] != self._next_seq_id:
+                    raise err.InternalError("Packet sequence number wrong - got %d expected %d" % (header[3], self._next_seq_id))
+                self._next_seq_id = (self._next_seq_id + 1) % 256
+                payload += await self._reader.readexactly(length)
+                if length < MAX_PACKET_LEN:
+                    break
+        except (asyncio.IncompleteReadError, OSError) as e:
+            self.force_close()
+            raise err.OperationalError(CR.CR_SERVER_LOST, "Lost connection to MySQL server during query (%s)" % e)
+
+        return payload
+
+
+async def with_timeout(coroutine, timeout):
+    """Runs a coroutine in the current task, cancelling it after a timeout
+
+    Unlike asyncio.wait_for, the coroutine does not run in a task of its own. A cancellation of the current task
+    always reaches the coroutine, hence it is never swallowed by a result which happened to be ready and no task is
+    left behind with an exception nobody retrieves.
+
+    Args:
+        coroutine (coroutine): The coroutine to run
+
+        timeout (float): Seconds to wait for the coroutine, None to wait forever
+
+    Returns:
+        object: The return value of the coroutine
+
+    Raises:
+        asyncio.TimeoutError: If the coroutine did not finish in time
+
+    """
+    if timeout is None:
+        return await coroutine
+
+    loop = asyncio.get_event_loop()
+    task = _current_task(loop)
+    expired = []
+
+    def expire():
+        expired.append(True)
+        task.cancel()
+
+    handle = loop.call_later(timeout, expire)
+    try:
+        return await coroutine
+    except asyncio.CancelledError:
+        if expired:
+            raise asyncio.TimeoutError()
+        raise
+    finally:
+        handle.cancel()
+
+
+def all_tasks(loop):
+    """Lists the tasks of an event loop which are not done yet, on Python 3.6 too
+
+    Returns:
+        set: The unfinished tasks
+
+    """
+    tasks = asyncio.all_tasks(loop) if hasattr(asyncio, 'all_tasks') else asyncio.Task.all_tasks(loop)
+    return {task for task in tasks if not task.done()}
+
+
+def _current_task(loop):
+    return asyncio.current_task(loop) if hasattr(asyncio, 'current_task') else asyncio.Task.current_task(loop)
+
+
+def _encode_connect_attrs():
+    connect_attrs = b''
+    for k, v in [('_client_name', 'pymysql-asyncio'), ('_pid', str(os.getpid()))]:
+        k, v = k.encode('utf-8'), v.encode('utf-8')
+        connect_attrs += struct.pack('B', len(k)) + k + struct.pack('B', len(v)) + v
+    return struct.pack('B', len(connect_attrs)) + connect_attrs
+
+
+async def connect(host, user, password, port=3306, db=None, connect_timeout=None, server_public_key=None, read_timeout=None):
+    """Opens a logged in AsyncConnection
+
+    Args:
+        host (string): The database host
+
+        user (string): The user to log in as
+
+        password (string): The password to log in with
+
+        port (int): The database port
+
+        db (string): The database to use, or None
+
+        connect_timeout (float): Seconds to wait for the TCP connection and for the login, None to wait forever
+
+        server_public_key (bytes): The RSA public key of the server if already known, fetched when needed otherwise
+
+        read_timeout (float): Seconds to wait for any packet of the server, None to wait forever
+
+    Returns:
+        AsyncConnection: The open connection
+
+    Raises:
+        OperationalError: If the server can not be reached or rejects the credentials
+
+    """
+    conn = AsyncConnection(host, user, password, port=port, db=db, server_public_key=server_public_key, read_timeout=read_timeout)
+    await conn.connect(connect_timeout)
+    return conn
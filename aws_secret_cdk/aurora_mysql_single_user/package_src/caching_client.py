@@ -0,0 +1,113 @@
+import logging
+import threading
+
+logger = logging.getLogger()
+
+
+class CachingSecretsManagerClient(object):
+    """Request scoped memoizing wrapper around a secrets manager service client
+
+    Rotation steps read the same secret metadata and secret versions several times. This wrapper
+    memoizes describe_secret and get_secret_value responses and drops the cached data of a secret
+    whenever it is modified through put_secret_value or update_secret_version_stage. Every other
+    attribute (e.g. exceptions, get_random_password) is delegated to the wrapped client.
+
+    A new instance should be created for every invocation so that no stale data outlives a rotation step.
+    Cached responses are shared between callers and must be treated as read only.
+
+    """
+    def __init__(self, service_client):
+        self._service_client = service_client
+        self._lock = threading.Lock()
+        self._descriptions = {}
+        self._secret_values = {}
+        self.api_calls_made = 0
+        self.api_calls_avoided = 0
+
+    def __getattr__(self, name):
+        return getattr(self._service_client, name)
+
+    def describe_secret(self, SecretId):
+        """Memoized describe_secret keyed by the secret id
+
+        Args:
+            SecretId (string): The secret ARN or other identifier
+
+        Returns:
+            dict: The describe_secret response
+
+        """
+        return self._memoize(self._descriptions, SecretId, self._service_client.describe_secret, SecretId=SecretId)
+
+    def get_secret_value(self, SecretId, VersionStage=None, VersionId=None):
+        """Memoized get_secret_value keyed by (secret id, stage, version)
+
+        Args:
+            SecretId (string): The secret ARN or other identifier
+
+            VersionStage (string): The stage identifying the secret version
+
+            VersionId (string): The version of the secret
+
+        Returns:
+            dict: The get_secret_value response
+
+        Raises:
+            ResourceNotFoundException: If the secret with the specified arn and stage does not exist
+
+        """
+        kwargs = {'SecretId': SecretId}
+        if VersionStage is not None:
+            kwargs['VersionStage'] = VersionStage
+        if VersionId is not None:
+            kwargs['VersionId'] = VersionId
+
+        key = (SecretId, VersionStage, VersionId)
+        return self._memoize(self._secret_values, key, self._service_client.get_secret_value, **kwargs)
+
+    def put_secret_value(self, **kwargs):
+        """Delegates to put_secret_value and invalidates cached data of the modified secret"""
+        try:
+            return self._service_client.put_secret_value(**kwargs)
+        finally:
+            self._count_call()
+            self.invalidate(kwargs['SecretId'])
+
+    def update_secret_version_stage(self, **kwargs):
+        """Delegates to update_secret_version_stage and invalidates cached data of the modified secret"""
+        try:
+            return self._service_client.update_secret_version_stage(**kwargs)
+        finally:
+            self._count_call()
+            self.invalidate(kwargs['SecretId'])
+
+    def invalidate(self, secret_id):
+        """Drops every cached response of a secret
+
+        Args:
+            secret_id (string): The secret ARN or other identifier
+
+        """
+        with self._lock:
+            self._descriptions.pop(secret_id, None)
+            for key in [key for key in self._secret_values if key[0] == secret_id]:
+                del self._secret_values[key]
+
+    def _memoize(self, cache, key, call, **kwargs):
+        with self._lock:
+            if key in cache:
+                self.api_calls_avoided += 1
+                return cache[key]
+
+        try:
+            response = call(**kwargs)
+        finally:
+            self._count_call()
+
+        with self._lock:
+            cache[key] = response
+        return response
+
+    def _count_call(self):
+        with self._lock:
+            self.api_calls_made += 1
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger()
+
+# Lambda keeps /tmp of an execution environment even when the function process is restarted after a timeout.
+DEFAULT_CHECKPOINT_DIRECTORY = '/tmp/rotation-checkpoints'
+
+# Seconds after which a checkpoint of an abandoned rotation is deleted.
+CHECKPOINT_TTL = 24 * 60 * 60
+
+
+class CheckpointStore(object):
+    """Progress of rotation steps keyed by (secret arn, ClientRequestToken)
+
+    Secrets manager invokes a failed or timed out rotation step again with the same token. A checkpoint records
+    what an earlier attempt already found out, e.g. which credential was able to log into the database and
+    whether the pending password was applied, so that a retried step can go straight to the known-good path.
+
+    Checkpoints are JSON files in the ephemeral storage of the execution environment, hence they survive a
+    function process restarted after a timeout but are not shared between execution environments. A missing
+    or unreadable checkpoint is never an error, it only means a step has to start over. Checkpoints never
+    contain secret values, only names of the secret stages.
+
+    """
+    def __init__(self, directory=None, ttl=CHECKPOINT_TTL):
+        self.directory = directory or os.environ.get('CHECKPOINT_DIRECTORY', DEFAULT_CHECKPOINT_DIRECTORY)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def load(self, arn, token):
+        """Reads the checkpoint of a rotation
+
+        Args:
+            arn (string): The secret ARN or other identifier
+
+            token (string): The ClientRequestToken associated with the secret version
+
+        Returns:
+            dict: The recorded values, empty if nothing was recorded
+
+        """
+        try:
+            with open(self._path(arn, token)) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+        if time.time() - checkpoint.get('updated', 0) > self.ttl:
+            return {}
+        return checkpoint.get('values', {})
+
+    def save(self, arn, token, **values):
+        """Merges values into the checkpoint of a rotation
+
+        Args:
+            arn (string): The secret ARN or other identifier
+
+            token (string): The ClientRequestToken associated with the secret version
+
+            values: The values to record
+
+        """
+        with self._lock:
+            checkpoint = self.load(arn, token)
+            checkpoint.update(values)
+            path = self._path(arn, token)
+            try:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+                    self._prune()
+                # Write to a temporary file first, so a process killed mid-write never leaves a broken checkpoint
+                with open(path + '.tmp', 'w') as checkpoint_file:
+                    json.dump({'updated': time.time(), 'values': checkpoint}, checkpoint_file)
+                os.rename(path + '.tmp', path)
+            except (IOError, OSError) as e:
+                logger.warning("Unable to save rotation checkpoint to %s: %s" % (path, e))
+
+    def discard(self, arn, token):
+        """Deletes the checkpoint of a finished rotation along with checkpoints of abandoned rotations
+
+        Args:
+            arn (string): The secret ARN or other identifier
+
+            token (string): The ClientRequestToken associated with the secret version
+
+        """
+        with self._lock:
+            try:
+                os.remove(self._path(arn, token))
+            except (IOError, OSError):
+                pass
+            self._prune()
+
+    def _prune(self):
+        try:
+            names = os.listdir(self.directory)
+        except (IOError, OSError):
+            return
+
+        now = time.time()
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except (IOError, OSError):
+                pass
+
+    def _path(self, arn, token):
+        key = hashlib.sha1(('%s\n%s' % (arn, token)).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + '.json')
@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger()
+
+# Seconds an idle connection is kept before it is considered stale.
+MAX_IDLE_TIME = 300
+
+# Maximum number of idle connections kept for a single endpoint.
+MAX_IDLE_PER_ENDPOINT = 2
+
+
+class ConnectionPool(object):
+    """Container wide pool of idle, already authenticated database connections
+
+    An idle connection can be re-authenticated as any user with COM_CHANGE_USER, which verifies the credentials
+    exactly like a fresh login does but skips TCP (and TLS) setup and the server handshake. Connections are
+    keyed by endpoint only, whoever takes a connection out of the pool must re-authenticate it before use.
+
+    """
+    def __init__(self, max_idle_time=MAX_IDLE_TIME, max_idle_per_endpoint=MAX_IDLE_PER_ENDPOINT):
+        self.max_idle_time = max_idle_time
+        self.max_idle_per_endpoint = max_idle_per_endpoint
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def acquire(self, host, port):
+        """Takes an idle connection to the given endpoint out of the pool
+
+        Args:
+            host (string): The database host
+
+            port (int): The database port
+
+        Returns:
+            Connection: An open pymysql.connections.Connection object, or None if there is no usable one
+
+        """
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get((host, port), [])
+            while idle:
+                conn, released_at = idle.pop()
+                if conn.open and now - released_at < self.max_idle_time:
+                    return conn
+                discard(conn)
+        return None
+
+    def release(self, conn):
+        """Puts a connection which is no longer needed back to the pool, or closes it if the pool is full
+
+        Args:
+            conn (Connection): The pymysql.connections.Connection object
+
+        """
+        if not conn.open:
+            return
+
+        with self._lock:
+            idle = self._idle.setdefault((conn.host, conn.port), [])
+            if len(idle) < self.max_idle_per_endpoint:
+                idle.append((conn, time.time()))
+                return
+
+        close_quietly(conn)
+
+    def clear(self):
+        """Closes every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn, _ in connections:
+                close_quietly(conn)
+
+
+def close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def discard(conn):
+    """Drops a connection without talking to the server, for connections in an unknown state"""
+    try:
+        conn._force_close()
+    except Exception:
+        pass
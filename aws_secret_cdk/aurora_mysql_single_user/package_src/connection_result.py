@@ -0,0 +1,103 @@
+import threading
+
+from pymysql.constants import CR, ER
+
+# Lower and upper bounds of a connect timeout in seconds.
+MIN_CONNECT_TIMEOUT = 1.0
+MAX_CONNECT_TIMEOUT = 5.0
+
+# How many times slower than the observed handshake a connection attempt may be before giving up.
+CONNECT_TIMEOUT_RTT_MULTIPLIER = 20.0
+
+# Weight of the latest handshake time in the moving average.
+RTT_SMOOTHING_FACTOR = 0.3
+
+
+class ConnectionResult(object):
+    """Typed outcome of a database login attempt
+
+    A login attempt either succeeds, or fails in one of the following ways:
+        - AUTH_FAILURE: The server answered but rejected the credentials
+        - NETWORK_FAILURE: The server could not be reached at all
+        - SERVER_GONE: The server was reached but dropped the connection
+        - ERROR: Any other operational error reported by the server
+
+    Network failures are fatal for every other login attempt against the same endpoint.
+
+    """
+    SUCCESS = 'success'
+    AUTH_FAILURE = 'auth_failure'
+    NETWORK_FAILURE = 'network_failure'
+    SERVER_GONE = 'server_gone'
+    ERROR = 'error'
+
+    def __init__(self, status, connection=None, error=None, elapsed=None):
+        self.status = status
+        self.connection = connection
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return self.status == self.SUCCESS
+
+    @property
+    def endpoint_unreachable(self):
+        return self.status == self.NETWORK_FAILURE
+
+    def __repr__(self):
+        return 'ConnectionResult(status=%r, error=%r, elapsed=%r)' % (self.status, self.error, self.elapsed)
+
+
+_NETWORK_FAILURE_CODES = {CR.CR_CONNECTION_ERROR, CR.CR_CONN_HOST_ERROR, CR.CR_UNKNOWN_HOST}
+_SERVER_GONE_CODES = {CR.CR_SERVER_GONE_ERROR, CR.CR_SERVER_LOST, CR.CR_SERVER_LOST_EXTENDED}
+_AUTH_FAILURE_CODES = {ER.ACCESS_DENIED_ERROR, ER.DBACCESS_DENIED_ERROR}
+
+
+def classify_error(error):
+    """Maps a pymysql OperationalError to a ConnectionResult status
+
+    Args:
+        error (OperationalError): The error raised by a login attempt
+
+    Returns:
+        string: One of the ConnectionResult failure statuses
+
+    """
+    code = error.args[0] if error.args else None
+    if code in _AUTH_FAILURE_CODES:
+        return ConnectionResult.AUTH_FAILURE
+    if code in _NETWORK_FAILURE_CODES:
+        return ConnectionResult.NETWORK_FAILURE
+    if code in _SERVER_GONE_CODES:
+        return ConnectionResult.SERVER_GONE
+    return ConnectionResult.ERROR
+
+
+class ConnectTimeoutEstimator(object):
+    """Container wide estimate of how long a login to a given endpoint should take
+
+    Every successful login records its duration (TCP connect, handshake and authentication) as a moving average
+    per endpoint. Later attempts against the same endpoint use a multiple of that average as a connect timeout,
+    hence an endpoint which stops answering is given up on after a fraction of the default timeout.
+
+    """
+    def __init__(self, default_timeout=MAX_CONNECT_TIMEOUT):
+        self.default_timeout = default_timeout
+        self._lock = threading.Lock()
+        self._handshake_times = {}
+
+    def record(self, host, port, elapsed):
+        with self._lock:
+            previous = self._handshake_times.get((host, port))
+            if previous is None:
+                self._handshake_times[(host, port)] = elapsed
+            else:
+                self._handshake_times[(host, port)] = (1 - RTT_SMOOTHING_FACTOR) * previous + RTT_SMOOTHING_FACTOR * elapsed
+
+    def timeout(self, host, port):
+        with self._lock:
+            handshake_time = self._handshake_times.get((host, port))
+        if handshake_time is None:
+            return self.default_timeout
+        return max(MIN_CONNECT_TIMEOUT, min(self.default_timeout, handshake_time * CONNECT_TIMEOUT_RTT_MULTIPLIER))
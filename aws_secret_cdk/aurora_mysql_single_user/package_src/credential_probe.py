@@ -0,0 +1,149 @@
+import logging
+import threading
+
+from connection_result import ConnectionResult
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger()
+
+# Upper bound of connection attempts running at the same time.
+MAX_PROBE_WORKERS = 5
+
+
+class ProbeResult(object):
+    """Outcome of a probing run
+
+    Holds the name, secret dictionary and connection of the winning candidate (all None if nobody won)
+    and the ConnectionResult of every failed attempt keyed by candidate name.
+
+    """
+    def __init__(self):
+        self.name = None
+        self.secret_dict = None
+        self.connection = None
+        self.failures = {}
+        self.unreachable_endpoints = set()
+
+    @property
+    def endpoint_unreachable(self):
+        """True if nobody won and at least one endpoint could not be reached at all"""
+        return self.connection is None and bool(self.unreachable_endpoints)
+
+    def describe_failures(self):
+        return ', '.join('%s: %s' % (name, result.status) for name, result in sorted(self.failures.items()))
+
+
+def endpoint_of(secret_dict):
+    return secret_dict['host'], int(secret_dict.get('port') or 3306)
+
+
+class _ProbeRun(object):
+    """Shared state of a single probing run"""
+    def __init__(self, candidates):
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.result = ProbeResult()
+        self.unfinished = dict((name, endpoint_of(secret_dict)) for name, secret_dict in candidates)
+
+    def report(self, name, secret_dict, connection_result):
+        redundant = False
+        with self.lock:
+            self.unfinished.pop(name, None)
+            if self.finished.is_set():
+                # The result has already been handed over, it must not change anymore.
+                redundant = connection_result.succeeded
+            elif connection_result.succeeded:
+                self.result.name = name
+                self.result.secret_dict = secret_dict
+                self.result.connection = connection_result.connection
+                self.finished.set()
+            else:
+                self.result.failures[name] = connection_result
+                if connection_result.endpoint_unreachable:
+                    self.result.unreachable_endpoints.add(endpoint_of(secret_dict))
+            self._check_finished()
+
+        # Somebody else has already won, this connection is of no use.
+        if redundant:
+            logger.info("Closing redundant connection obtained with %s secret." % name)
+            _close_quietly(connection_result.connection)
+
+    def should_skip(self, name, secret_dict):
+        with self.lock:
+            if self.finished.is_set() or endpoint_of(secret_dict) in self.result.unreachable_endpoints:
+                self.unfinished.pop(name, None)
+                self._check_finished()
+                return True
+            return False
+
+    def _check_finished(self):
+        # Attempts against an unreachable endpoint can only time out, there is no point waiting for them.
+        if all(endpoint in self.result.unreachable_endpoints for endpoint in self.unfinished.values()):
+            self.finished.set()
+
+
+def probe_credentials(candidates, connect, max_workers=MAX_PROBE_WORKERS):
+    """Tries to log into the database with every candidate credential in parallel
+
+    The candidates are attempted concurrently by a bounded pool of worker threads. The first successful login
+    wins and is returned right away. Attempts which have not started yet are cancelled and connections which
+    are obtained after the winner are closed. As soon as an endpoint turns out to be unreachable, attempts
+    against it are abandoned.
+
+    Args:
+        candidates (list): A list of (name, secret_dict) tuples, where name describes the credential in logs
+
+        connect (function): A function which takes a secret dictionary and returns a ConnectionResult
+
+        max_workers (int): Maximum number of concurrent login attempts
+
+    Returns:
+        ProbeResult: The winning candidate, if any, and the failures observed so far
+
+    """
+    if not candidates:
+        return ProbeResult()
+
+    run = _ProbeRun(candidates)
+    tasks = queue.Queue()
+    for candidate in candidates:
+        tasks.put(candidate)
+
+    def worker():
+        while True:
+            try:
+                name, secret_dict = tasks.get_nowait()
+            except queue.Empty:
+                return
+
+            if run.should_skip(name, secret_dict):
+                continue
+
+            logger.info('Attempting to get connection from %s secret.' % name)
+            try:
+                connection_result = connect(secret_dict)
+            except Exception as e:
+                logger.warning('Connection attempt with %s secret failed: %r' % (name, e))
+                connection_result = ConnectionResult(ConnectionResult.ERROR, error=e)
+            run.report(name, secret_dict, connection_result)
+
+    for _ in range(min(max_workers, len(candidates))):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    run.finished.wait()
+
+    with run.lock:
+        return run.result
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
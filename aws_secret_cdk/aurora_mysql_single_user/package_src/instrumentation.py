@@ -0,0 +1,180 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from pymysql.connections import Connection
+
+# Metrics are published to this CloudWatch namespace. Set METRICS_ENABLED to 'false' to turn them off.
+DEFAULT_METRICS_NAMESPACE = 'AwsSecretCdk/SecretRotation'
+
+# CloudWatch embedded metric format accepts up to 100 values per metric in a single document.
+MAX_VALUES_PER_METRIC = 100
+
+
+class MetricsRecorder(object):
+    """Collects timing spans of an invocation and publishes them as CloudWatch embedded metric format documents
+
+    Recording a span costs a couple of clock reads and a list append, hence the recorder is meant to be left on
+    in production. Spans are buffered in memory and written out as JSON lines to stdout once per invocation,
+    where CloudWatch Logs extracts them as metrics without any API calls.
+
+    """
+    def __init__(self, namespace=None, enabled=None):
+        self.namespace = namespace or os.environ.get('METRICS_NAMESPACE', DEFAULT_METRICS_NAMESPACE)
+        if enabled is None:
+            enabled = os.environ.get('METRICS_ENABLED', 'true').lower() != 'false'
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._units = {}
+
+    def record(self, name, seconds):
+        """Records the duration of a named span
+
+        Args:
+            name (string): The span (metric) name
+
+            seconds (float): The span duration in seconds
+
+        """
+        self.record_value(name, seconds * 1000.0, 'Milliseconds')
+
+    def record_value(self, name, value, unit):
+        """Records a value of a named metric which is not a duration
+
+        Args:
+            name (string): The metric name
+
+            value (float): The value
+
+            unit (string): A CloudWatch unit, e.g. Bytes
+
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._spans.setdefault(name, []).append(value)
+            self._units[name] = unit
+
+    @contextmanager
+    def span(self, name):
+        """Context manager which records the time spent inside it, even if it raises"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, time.time() - start)
+
+    def timed(self, name):
+        """Decorator which records every call of the decorated function as a span"""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        """Drops every recorded span and its unit"""
+        with self._lock:
+            self._spans = {}
+            self._units = {}
+
+    def flush(self, dimensions=None, stream=None):
+        """Writes recorded spans as embedded metric format documents and resets the recorder
+
+        Args:
+            dimensions (dict): Dimension names and values attached to every metric, e.g. {'Step': 'setSecret'}
+
+            stream (file): Where to write the documents, stdout by default
+
+        """
+        with self._lock:
+            spans, self._spans = self._spans, {}
+            units, self._units = self._units, {}
+
+        if not self.enabled or not spans:
+            return
+
+        stream = stream or sys.stdout
+        for document in self.documents(spans, dimensions or {}, units):
+            stream.write(json.dumps(document, separators=(',', ':')) + '\n')
+        stream.flush()
+
+    def documents(self, spans, dimensions, units=None):
+        units = units or {}
+        chunk = 0
+        while True:
+            values = dict(
+                (name, durations[chunk * MAX_VALUES_PER_METRIC:(chunk + 1) * MAX_VALUES_PER_METRIC])
+                for name, durations in spans.items()
+            )
+            values = dict((name, chunk_values) for name, chunk_values in values.items() if chunk_values)
+            if not values:
+                return
+
+            document = {
+                '_aws': {
+                    'Timestamp': int(time.time() * 1000),
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [sorted(dimensions.keys())],
+                        'Metrics': [{'Name': name, 'Unit': units.get(name, 'Milliseconds')} for name in sorted(values)]
+                    }]
+                }
+            }
+            document.update(dimensions)
+            document.update(values)
+            yield document
+            chunk += 1
+
+
+# Spans of the current invocation.
+recorder = MetricsRecorder()
+
+
+class InstrumentedClient(object):
+    """Service client wrapper which records a span for every API call made through it"""
+    def __init__(self, service_client, prefix='SecretsManager'):
+        self._service_client = service_client
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        attribute = getattr(self._service_client, name)
+        if name.startswith('_') or name in ('exceptions', 'meta') or not callable(attribute):
+            return attribute
+
+        span_name = '%s.%s' % (self._prefix, name)
+
+        def call(*args, **kwargs):
+            with recorder.span(span_name):
+                return attribute(*args, **kwargs)
+        return call
+
+
+class InstrumentedConnection(Connection):
+    """pymysql connection which records a login split into TCP connect, server handshake and authentication"""
+    _connect_started = None
+
+    def connect(self, sock=None):
+        self._connect_started = time.time()
+        with recorder.span('MySQL.Login'):
+            return Connection.connect(self, sock)
+
+    def _get_server_information(self):
+        recorder.record('MySQL.Connect', time.time() - self._connect_started)
+        with recorder.span('MySQL.Handshake'):
+            return Connection._get_server_information(self)
+
+    def _request_authentication(self):
+        with recorder.span('MySQL.Auth'):
+            return Connection._request_authentication(self)
+
+    def change_user(self, user, password="", database=None):
+        with recorder.span('MySQL.ChangeUser'):
+            return Connection.change_user(self, user, password, database)
@@ -6,12 +6,145 @@ import json
 import logging
 import os
 import pymysql
+import threading
+import time
+import uuid
+
+from botocore.config import Config
+from caching_client import CachingSecretsManagerClient
+from checkpoints import CheckpointStore
+from collections import namedtuple
+from connection_pool import ConnectionPool, discard
+from connection_result import ConnectionResult, ConnectTimeoutEstimator, classify_error
+from credential_probe import endpoint_of, probe_credentials
+from instrumentation import InstrumentedClient, InstrumentedConnection, recorder
+from password_generator import API_GENERATOR, LOCAL_GENERATOR, PasswordPolicy, generate_password
+from preflight import check_login, estimate_rotation_time, resolve
+from profiling import profiler
+from retrying_client import RetryingClient
+from server_profile import ServerProfileCache
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 secrets_manager_endpoint = None
 initial_database_password = None
+password_policy = None
+password_generator = None
+
+# Configuration read from the lambda environment. A change in any of these
+# values forces the runtime context to be rebuilt.
+RuntimeConfig = namedtuple('RuntimeConfig', [
+    'secrets_manager_endpoint',
+    'initial_database_password',
+    'password_policy',
+    'password_generator',
+    'shared_rotation'
+])
+
+
+class RuntimeContext(object):
+    """Objects which are expensive to create and can be reused across warm invocations
+
+    Lambda keeps the module loaded between invocations of the same container, hence a secrets manager
+    client (endpoint resolution, credentials chain, botocore service model loading) is built only once
+    and reused by every rotation step executed by that container.
+
+    Retries are handled by RetryingClient instead of botocore, so that every rotation running in the container
+    shares a single rate limiter and backs off together when secrets manager starts throttling. RetryingClient
+    also retries the connection failures botocore would have retried.
+
+    """
+    def __init__(self, config, service_client=None):
+        self.config = config
+        if service_client is None:
+            service_client = boto3.client(
+                'secretsmanager',
+                endpoint_url=config.secrets_manager_endpoint,
+                config=Config(retries={'max_attempts': 0})
+            )
+        self.service_client = RetryingClient(InstrumentedClient(service_client))
+
+
+_runtime_context = None
+_runtime_context_lock = threading.Lock()
+
+# Login times observed by this container, used to adapt connect timeouts.
+connect_timeouts = ConnectTimeoutEstimator()
+
+# Idle authenticated connections of this container, reused by re-authenticating them.
+connection_pool = ConnectionPool()
+
+# Handshake data of every database server this container connected to.
+server_profiles = ServerProfileCache()
+
+# What earlier attempts of a rotation step found out, so that a retried step can resume from there.
+checkpoints = CheckpointStore()
+
+# Batch rotation settings and per secret statuses.
+DEFAULT_BATCH_CONCURRENCY = 10
+BATCH_ROTATION_MIN_REMAINING_MILLIS = 15000
+ROTATION_SUCCEEDED = 'succeeded'
+ROTATION_FAILED = 'failed'
+ROTATION_SKIPPED = 'skipped'
+
+# Pre-flight check statuses of a secret.
+PREFLIGHT_READY = 'ready'
+PREFLIGHT_NOT_READY = 'not_ready'
+PREFLIGHT_FAILED = 'failed'
+
+# Key of the initial password resolved by with_initial_password, only ever set in memory.
+RESOLVED_INITIAL_PASSWORD_KEY = '_resolved_initial_password'
+
+
+def read_runtime_config():
+    """Reads the rotation lambda configuration from the environment
+
+    Returns:
+        RuntimeConfig: Parsed lambda configuration
+
+    Raises:
+        KeyError: If a required environment variable is not set
+
+        ValueError: If the password policy is not valid
+
+    """
+    return RuntimeConfig(
+        secrets_manager_endpoint=os.environ['SECRETS_MANAGER_ENDPOINT'],
+        initial_database_password=os.environ.get('INITIAL_DATABASE_PASSWORD'),
+        password_policy=PasswordPolicy.from_json(os.environ.get('PASSWORD_POLICY')),
+        password_generator=os.environ.get('PASSWORD_GENERATOR', LOCAL_GENERATOR),
+        shared_rotation=os.environ.get('SHARED_ROTATION', 'false').lower() == 'true'
+    )
+
+
+def get_runtime_context():
+    """Gets the runtime context of this container, creating it lazily
+
+    The context is created on the first invocation and reused afterwards. It is rebuilt only
+    when the configuration read from the environment differs from the one the context was built with.
+
+    Returns:
+        RuntimeContext: The runtime context matching the current configuration
+
+    """
+    global _runtime_context
+
+    config = read_runtime_config()
+    context = _runtime_context
+    if context is not None and context.config == config:
+        return context
+
+    with _runtime_context_lock:
+        if _runtime_context is None or _runtime_context.config != config:
+            logger.info("Creating a new runtime context with secrets manager endpoint %s." % config.secrets_manager_endpoint)
+            _runtime_context = RuntimeContext(config)
+        return _runtime_context
 
 
 def lambda_handler(event, context):
@@ -28,7 +161,10 @@ def lambda_handler(event, context):
         'username': <required: username>,
         'password': <required: password>,
         'dbname': <optional: database name>,
-        'port': <optional: if not specified, default port 3306 will be used>
+        'port': <optional: if not specified, default port 3306 will be used>,
+        'endpoints': <optional: additional endpoints with the same user, see secret_endpoints>,
+        'initial_password_arn': <optional: arn of a secret holding the password the database was created with,
+                                 INITIAL_DATABASE_PASSWORD is used if not specified>
     }
 
     Args:
@@ -37,6 +173,9 @@ def lambda_handler(event, context):
             - ClientRequestToken: The ClientRequestToken of the secret version
             - Step: The rotation step (one of createSecret, setSecret, testSecret, or finishSecret)
 
+            An event with SecretIds instead of SecretId is handled by batch_lambda_handler.
+            An event with DryRun set to true is handled by preflight_lambda_handler.
+
         context (LambdaContext): The Lambda runtime information
 
     Raises:
@@ -47,34 +186,375 @@ def lambda_handler(event, context):
         KeyError: If the secret json does not contain the expected keys
 
     """
-    global secrets_manager_endpoint
-    global initial_database_password
+    # A dry run only checks whether a rotation would succeed
+    if event.get('DryRun'):
+        return preflight_lambda_handler(event, context)
+
+    # Many secrets can be rotated at once with a batch event
+    if 'SecretIds' in event and 'SecretId' not in event:
+        return batch_lambda_handler(event, context)
 
-    secrets_manager_endpoint = os.environ['SECRETS_MANAGER_ENDPOINT']
-    initial_database_password = os.environ['INITIAL_DATABASE_PASSWORD']
+    runtime_context = setup_runtime()
 
     arn = event['SecretId']
     token = event['ClientRequestToken']
     step = event['Step']
 
-    # Setup the client
-    service_client = boto3.client('secretsmanager', endpoint_url=secrets_manager_endpoint)
+    # Setup the client. Reads are memoized for the duration of this invocation only.
+    service_client = CachingSecretsManagerClient(runtime_context.service_client)
+    counters = runtime_context.service_client.counters()
+    try:
+        with profiler.profile(step):
+            run_step(service_client, arn, token, step)
+    finally:
+        retries = counter_deltas(counters, runtime_context.service_client.counters())
+        logger.info("Secrets manager API calls made: %d, avoided: %d, retried: %d, throttled: %d." % (service_client.api_calls_made, service_client.api_calls_avoided, retries['Retries'], retries['Throttles']))
+        recorder.flush({'Step': step})
+
+
+def batch_lambda_handler(event, context):
+    """Secrets Manager RDS MySQL batch rotation handler
+
+    This handler rotates many secrets in a single invocation, e.g. for a mass rotation after an incident. Every
+    secret goes through the createSecret, setSecret, testSecret and finishSecret steps with a newly generated
+    ClientRequestToken. Secrets are rotated concurrently, sharing the secrets manager client and the pool of
+    database connections of this container. Secrets which can not be started before the invocation runs out
+    of time are skipped and can be submitted again.
+
+    Only a shared rotation function (SHARED_ROTATION environment variable set to true) accepts batch events, since
+    the role of a dedicated rotation function may only access its own secret. Batch rotations do not go through the
+    RotateSecret API, hence they do not update LastRotatedDate or the rotation schedule. Secrets which already have
+    a rotation in progress are skipped.
+
+    Args:
+        event (dict): Lambda dictionary of event parameters. These keys must include the following:
+            - SecretIds: A list of secret ARNs or identifiers
+            - MaxConcurrency: <optional: number of secrets rotated at the same time, default 10>
+
+        context (LambdaContext): The Lambda runtime information
+
+    Returns:
+        dict: Per secret results with step timings, the number of succeeded, failed and skipped rotations and the
+        number of retried and throttled secrets manager calls
+
+    Raises:
+        ValueError: If the function is not a shared rotation function
+
+    """
+    runtime_context = setup_runtime()
+    if not runtime_context.config.shared_rotation:
+        logger.error("batchRotation: Batch rotations are only supported by a shared rotation function")
+        raise ValueError("Batch rotations are only supported by a shared rotation function")
+
+    counters = runtime_context.service_client.counters()
+
+    secret_ids = event['SecretIds']
+    max_concurrency = int(event.get('MaxConcurrency', DEFAULT_BATCH_CONCURRENCY))
+
+    # Keep enough idle connections around for every concurrent rotation to reuse one.
+    max_idle_per_endpoint = connection_pool.max_idle_per_endpoint
+    connection_pool.max_idle_per_endpoint = max(max_idle_per_endpoint, max_concurrency)
+
+    try:
+        with profiler.profile('batchRotation'):
+            results = map_concurrently(
+                lambda arn: rotate_secret(runtime_context.service_client, arn, context),
+                secret_ids,
+                max_concurrency
+            )
+    finally:
+        connection_pool.max_idle_per_endpoint = max_idle_per_endpoint
+        recorder.flush({'Step': 'batchRotation'})
+
+    summary = {'Results': results}
+    for status in [ROTATION_SUCCEEDED, ROTATION_FAILED, ROTATION_SKIPPED]:
+        summary[status.capitalize()] = len([result for result in results if result['Status'] == status])
+    summary.update(counter_deltas(counters, runtime_context.service_client.counters()))
+
+    logger.info("batchRotation: %d succeeded, %d failed, %d skipped, %d retried calls, %d throttled calls." % (summary['Succeeded'], summary['Failed'], summary['Skipped'], summary['Retries'], summary['Throttles']))
+    return summary
+
+
+def rotate_secret(service_client, arn, context=None):
+    """Runs every rotation step for a single secret
+
+    Args:
+        service_client (client): The secrets manager service client
+
+        arn (string): The secret ARN or other identifier
+
+        context (LambdaContext): The Lambda runtime information, or None if there is no time limit
+
+    Returns:
+        dict: The rotation status, error (if any) and the time taken by every step
+
+    """
+    token = str(uuid.uuid4())
+    result = {'SecretId': arn, 'ClientRequestToken': token, 'Status': ROTATION_SKIPPED, 'StepTimings': {}}
+
+    if context is not None and context.get_remaining_time_in_millis() < BATCH_ROTATION_MIN_REMAINING_MILLIS:
+        logger.warning("batchRotation: Not enough time left to rotate secret %s." % arn)
+        return result
+
+    # Reads are memoized for the duration of this rotation only.
+    caching_client = CachingSecretsManagerClient(service_client)
+
+    start = time.time()
+    try:
+        metadata = caching_client.describe_secret(SecretId=arn)
+        if "RotationEnabled" in metadata and not metadata['RotationEnabled']:
+            raise ValueError("Secret %s is not enabled for rotation" % arn)
+
+        # A pending version which is not current belongs to a rotation in progress, e.g. a scheduled one
+        versions = metadata.get('VersionIdsToStages', {})
+        pending = [version for version, stages in versions.items() if "AWSPENDING" in stages and "AWSCURRENT" not in stages]
+        if pending:
+            result['Reason'] = "Rotation of version %s is in progress" % pending[0]
+            logger.warning("batchRotation: Skipping secret %s, rotation of version %s is in progress." % (arn, pending[0]))
+            return result
+
+        step_start = time.time()
+        create_secret(caching_client, arn, token)
+        result['StepTimings']['createSecret'] = time.time() - step_start
+
+        for step in ["setSecret", "testSecret", "finishSecret"]:
+            step_start = time.time()
+            run_step(caching_client, arn, token, step)
+            result['StepTimings'][step] = time.time() - step_start
+
+        result['Status'] = ROTATION_SUCCEEDED
+        logger.info("batchRotation: Successfully rotated secret %s." % arn)
+    except Exception as e:
+        result['Status'] = ROTATION_FAILED
+        result['Error'] = '%s: %s' % (type(e).__name__, e)
+        logger.error("batchRotation: Failed to rotate secret %s: %s" % (arn, result['Error']))
+    finally:
+        result['Elapsed'] = time.time() - start
+        result['ApiCallsMade'] = caching_client.api_calls_made
+        result['ApiCallsAvoided'] = caching_client.api_calls_avoided
+
+    return result
+
+
+def preflight_lambda_handler(event, context):
+    """Secrets Manager RDS MySQL rotation pre-flight check handler
+
+    This handler finds out whether rotating a secret would succeed and how long it would take, without changing
+    anything in secrets manager or the database. For every secret the database host is resolved and the AWSCURRENT,
+    AWSPREVIOUS and initial password credentials log in at the same time on new connections, reporting DNS, TCP
+    connect, handshake, authentication and query latencies of each. Additional endpoints of a secret are checked the
+    same way. Only read only queries are run.
+
+    Args:
+        event (dict): Lambda dictionary of event parameters. These keys must include the following:
+            - DryRun: Must be true
+            - SecretId or SecretIds: The secret ARN or identifier, or a list of them
+            - MaxConcurrency: <optional: number of secrets checked at the same time, default 10>
+
+        context (LambdaContext): The Lambda runtime information
+
+    Returns:
+        dict: Per secret reports and the number of ready, not ready and failed secrets
+
+    """
+    runtime_context = setup_runtime()
+
+    secret_ids = event['SecretIds'] if 'SecretIds' in event else [event['SecretId']]
+    max_concurrency = int(event.get('MaxConcurrency', DEFAULT_BATCH_CONCURRENCY))
+
+    try:
+        with profiler.profile('preflight'):
+            results = map_concurrently(
+                lambda arn: preflight_secret(runtime_context.service_client, arn),
+                secret_ids,
+                max_concurrency
+            )
+    finally:
+        recorder.flush({'Step': 'preflight'})
+
+    summary = {'Results': results}
+    for status in [PREFLIGHT_READY, PREFLIGHT_NOT_READY, PREFLIGHT_FAILED]:
+        summary[status.title().replace('_', '')] = len([result for result in results if result['Status'] == status])
+
+    logger.info("preflight: %d ready, %d not ready, %d failed." % (summary['Ready'], summary['NotReady'], summary['Failed']))
+    return summary
+
+
+def preflight_secret(service_client, arn):
+    """Checks whether a secret can be rotated, without changing any state
+
+    Args:
+        service_client (client): The secrets manager service client
+
+        arn (string): The secret ARN or other identifier
+
+    Returns:
+        dict: The pre-flight status, per endpoint and per credential reports and the estimated rotation time
+
+    """
+    result = {'SecretId': arn, 'Status': PREFLIGHT_FAILED, 'Endpoints': {}, 'Credentials': {}}
+
+    # Reads are memoized for the duration of this check only.
+    caching_client = CachingSecretsManagerClient(service_client)
+
+    start = time.time()
+    try:
+        metadata = caching_client.describe_secret(SecretId=arn)
+        result['RotationEnabled'] = metadata.get('RotationEnabled', False)
+
+        # A version left staged as AWSPENDING by an unfinished rotation is resumed by the next rotation
+        result['PendingVersions'] = [version for version, stages in metadata['VersionIdsToStages'].items() if 'AWSPENDING' in stages and 'AWSCURRENT' not in stages]
+
+        current_dict = with_initial_password(caching_client, get_secret_dict(caching_client, arn, "AWSCURRENT"))
+        try:
+            previous_dict = get_secret_dict(caching_client, arn, "AWSPREVIOUS")
+        except caching_client.exceptions.ResourceNotFoundException:
+            previous_dict = None
+        api_call_time = (time.time() - start) / caching_client.api_calls_made
+
+        # Every endpoint of the secret is checked, additional endpoints are named after their host and port
+        candidates = []
+        for endpoint in [None] + list(current_dict.get('endpoints') or []):
+            suffix = ' on %s' % endpoint_label(with_endpoint(current_dict, endpoint)) if endpoint else ''
+            candidates.append(('AWSCURRENT' + suffix, with_endpoint(current_dict, endpoint)))
+            if previous_dict:
+                candidates.append(('AWSPREVIOUS' + suffix, with_endpoint(previous_dict, endpoint)))
+            if initial_password_of(current_dict) is not None:
+                initial_password_dict = dict(with_endpoint(current_dict, endpoint))
+                initial_password_dict['password'] = initial_password_of(current_dict)
+                candidates.append(('AWSCURRENT with initial password' + suffix, initial_password_dict))
+        candidates = unique_credentials(candidates)
+
+        # Resolve every endpoint once, then log in with every credential at the same time
+        endpoints = sorted(set(endpoint_of(secret_dict) for _, secret_dict in candidates))
+        resolutions = dict(zip(endpoints, map_concurrently(lambda endpoint: resolve(*endpoint), endpoints, len(endpoints))))
+        for (host, port), resolution in resolutions.items():
+            result['Endpoints']['%s:%d' % (host, port)] = resolution.report()
+
+        checks = map_concurrently(
+            lambda candidate: check_login(candidate[1], resolutions[endpoint_of(candidate[1])]),
+            candidates,
+            len(candidates)
+        )
+        for (name, _), check in zip(candidates, checks):
+            result['Credentials'][name] = check.report()
+
+        # A rotation succeeds only if some credential logs into every endpoint, endpoints are rotated in parallel
+        fastest = []
+        for endpoint_dict in secret_endpoints(current_dict):
+            succeeded = [check for (_, secret_dict), check in zip(candidates, checks) if check.succeeded and endpoint_of(secret_dict) == endpoint_of(endpoint_dict)]
+            if succeeded:
+                fastest.append(min(succeeded, key=lambda check: check.login_time))
+
+        if len(fastest) == len(secret_endpoints(current_dict)) and result['RotationEnabled']:
+            result['Status'] = PREFLIGHT_READY
+        else:
+            result['Status'] = PREFLIGHT_NOT_READY
+        if fastest:
+            result['EstimatedRotationSeconds'] = max(estimate_rotation_time(api_call_time, check) for check in fastest)
+        logger.info("preflight: Secret %s is %s." % (arn, result['Status']))
+    except Exception as e:
+        result['Error'] = '%s: %s' % (type(e).__name__, e)
+        logger.error("preflight: Failed to check secret %s: %s" % (arn, result['Error']))
+    finally:
+        result['Elapsed'] = time.time() - start
+        result['ApiCallsMade'] = caching_client.api_calls_made
+
+    return result
+
+
+def map_concurrently(function, items, max_workers):
+    """Applies a function to every item on a bounded pool of worker threads
+
+    Args:
+        function (function): A function taking a single item, it must not raise
+
+        items (list): The items to process
+
+        max_workers (int): Maximum number of items processed at the same time
+
+    Returns:
+        list: Function results in the order of the items
+
+    """
+    results = [None] * len(items)
+    tasks = queue.Queue()
+    for index, item in enumerate(items):
+        tasks.put((index, item))
+
+    def worker():
+        while True:
+            try:
+                index, item = tasks.get_nowait()
+            except queue.Empty:
+                return
+            results[index] = function(item)
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, min(max_workers, len(items))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def counter_deltas(before, after):
+    """Computes how much every counter grew between two snapshots
+
+    Args:
+        before (dict): Counter values taken first
+
+        after (dict): Counter values taken later
+
+    Returns:
+        dict: Counter names mapped to their growth
+
+    """
+    return dict((name, after[name] - before.get(name, 0)) for name in after)
+
+
+def setup_runtime():
+    """Gets the runtime context and exposes its configuration through the module globals
+
+    Returns:
+        RuntimeContext: The runtime context matching the current configuration
+
+    """
+    global secrets_manager_endpoint
+    global initial_database_password
+    global password_policy
+    global password_generator
+
+    # Reuse the client and configuration of a warm container
+    runtime_context = get_runtime_context()
+    secrets_manager_endpoint = runtime_context.config.secrets_manager_endpoint
+    initial_database_password = runtime_context.config.initial_database_password
+    password_policy = runtime_context.config.password_policy
+    password_generator = runtime_context.config.password_generator
+    return runtime_context
+
+
+def run_step(service_client, arn, token, step):
+    """Validates the secret version staging and runs the requested rotation step
+
+    Args:
+        service_client (client): The secrets manager service client
+
+        arn (string): The secret ARN or other identifier
+
+        token (string): The ClientRequestToken associated with the secret version
+
+        step (string): The rotation step (one of createSecret, setSecret, testSecret, or finishSecret)
 
+    Raises:
+        ValueError: If the secret is not properly configured for rotation or the step is invalid
+
+    """
     # Make sure the version is staged correctly
     metadata = service_client.describe_secret(SecretId=arn)
-    if "RotationEnabled" in metadata and not metadata['RotationEnabled']:
-        logger.error("Secret %s is not enabled for rotation" % arn)
-        raise ValueError("Secret %s is not enabled for rotation" % arn)
-    versions = metadata['VersionIdsToStages']
-    if token not in versions:
-        logger.error("Secret version %s has no stage for rotation of secret %s." % (token, arn))
-        raise ValueError("Secret version %s has no stage for rotation of secret %s." % (token, arn))
-    if "AWSCURRENT" in versions[token]:
-        logger.info("Secret version %s already set as AWSCURRENT for secret %s." % (token, arn))
+    if not check_version_staging(metadata, arn, token):
         return
-    elif "AWSPENDING" not in versions[token]:
-        logger.error("Secret version %s not set as AWSPENDING for rotation of secret %s." % (token, arn))
-        raise ValueError("Secret version %s not set as AWSPENDING for rotation of secret %s." % (token, arn))
 
     # Call the appropriate step
     if step == "createSecret":
@@ -94,6 +574,40 @@ def lambda_handler(event, context):
         raise ValueError("Invalid step parameter %s for secret %s" % (step, arn))
 
 
+def check_version_staging(metadata, arn, token):
+    """Validates that the secret is enabled for rotation and the version is staged for a rotation step
+
+    Args:
+        metadata (dict): The describe_secret response
+
+        arn (string): The secret ARN or other identifier
+
+        token (string): The ClientRequestToken associated with the secret version
+
+    Returns:
+        bool: True if the step should run, False if the version is already set as AWSCURRENT
+
+    Raises:
+        ValueError: If the secret is not properly configured for rotation
+
+    """
+    if "RotationEnabled" in metadata and not metadata['RotationEnabled']:
+        logger.error("Secret %s is not enabled for rotation" % arn)
+        raise ValueError("Secret %s is not enabled for rotation" % arn)
+    versions = metadata['VersionIdsToStages']
+    if token not in versions:
+        logger.error("Secret version %s has no stage for rotation of secret %s." % (token, arn))
+        raise ValueError("Secret version %s has no stage for rotation of secret %s." % (token, arn))
+    if "AWSCURRENT" in versions[token]:
+        logger.info("Secret version %s already set as AWSCURRENT for secret %s." % (token, arn))
+        return False
+    elif "AWSPENDING" not in versions[token]:
+        logger.error("Secret version %s not set as AWSPENDING for rotation of secret %s." % (token, arn))
+        raise ValueError("Secret version %s not set as AWSPENDING for rotation of secret %s." % (token, arn))
+    return True
+
+
+@recorder.timed('createSecret')
 def create_secret(service_client, arn, token):
     """Generate a new secret
 
@@ -122,20 +636,48 @@ def create_secret(service_client, arn, token):
         logger.info("createSecret: Successfully retrieved secret for %s." % arn)
     except service_client.exceptions.ResourceNotFoundException:
         # Generate a random password
-        passwd = service_client.get_random_password(ExcludeCharacters='/@"\'\\')
-        current_dict['password'] = passwd['RandomPassword']
+        current_dict['password'] = new_password(service_client)
 
         # Put the secret
         service_client.put_secret_value(SecretId=arn, ClientRequestToken=token, SecretString=json.dumps(current_dict), VersionStages=['AWSPENDING'])
         logger.info("createSecret: Successfully put secret for ARN %s and version %s." % (arn, token))
 
 
+def new_password(service_client):
+    """Generates a new password following the configured password policy
+
+    Passwords are generated locally unless the PASSWORD_GENERATOR environment variable is set to 'api', in which
+    case the secrets manager GetRandomPassword API is called with the same policy.
+
+    Args:
+        service_client (client): The secrets manager service client
+
+    Returns:
+        string: The generated password
+
+    Raises:
+        ValueError: If the password generator is unknown or no password can satisfy the policy
+
+    """
+    if password_generator == LOCAL_GENERATOR:
+        return generate_password(password_policy)
+    if password_generator == API_GENERATOR:
+        return service_client.get_random_password(**password_policy._asdict())['RandomPassword']
+    raise ValueError("Unknown password generator %s" % password_generator)
+
+
+@recorder.timed('setSecret')
 def set_secret(service_client, arn, token):
     """Set the pending secret in the database
 
-    This method tries to login to the database with the AWSPENDING secret and returns on success. If that fails, it
-    tries to login with the AWSCURRENT and AWSPREVIOUS secrets. If either one succeeds, it sets the AWSPENDING password
-    as the user password in the database. Else, it throws a ValueError.
+    This method tries to login to the database with the AWSPENDING, AWSCURRENT and AWSPREVIOUS secrets and the initial
+    database password in parallel. If the AWSPENDING secret succeeds, it returns. If any other one succeeds, it sets
+    the AWSPENDING password as the user password in the database. Else, it throws a ValueError.
+
+    A retried attempt first logs in only with the secret an earlier attempt of the same rotation succeeded with
+    (or with AWSPENDING if the earlier attempt already set the password) and falls back to trying all of them.
+
+    If the secret lists additional endpoints, the password is set on every endpoint in parallel.
 
     Args:
         service_client (client): The secrets manager service client
@@ -152,67 +694,99 @@ def set_secret(service_client, arn, token):
         KeyError: If the secret json does not contain the expected keys
 
     """
-    # First try to login with the pending secret, if it succeeds, return
-    logger.info('Attempting to get connection from AWSPENDING stage.')
-    pending_dict = get_secret_dict(service_client, arn, "AWSPENDING", token)
-    conn = get_connection(pending_dict)
-    if conn:
-        conn.close()
-        logger.info("setSecret: AWSPENDING secret is already set as password in MySQL DB for secret arn %s." % arn)
-        return
+    # Gather every credential which may currently be valid. Missing previous stage is not an error.
+    pending_dict = with_initial_password(service_client, get_secret_dict(service_client, arn, "AWSPENDING", token))
+    current_dict = with_initial_password(service_client, get_secret_dict(service_client, arn, "AWSCURRENT"))
+    try:
+        previous_dict = get_secret_dict(service_client, arn, "AWSPREVIOUS")
+    except service_client.exceptions.ResourceNotFoundException:
+        previous_dict = None
 
-    # WARNING - THE CODE BELOW IS NOT ORIGINAL AND IS MODIFIED TO SUPPORT INITIAL PASSWORD LOGIC.
-    # IF ANY BUGS ARE FOUND - REPORT TO laimonas@idenfy.com or laimonas.sutkus@gmail.com THANK YOU.
+    fan_out('setSecret', arn, pending_dict, lambda endpoint: set_endpoint_secret(
+        arn,
+        token,
+        with_endpoint(pending_dict, endpoint),
+        with_endpoint(current_dict, endpoint),
+        with_endpoint(previous_dict, endpoint)
+    ))
+
+
+def set_endpoint_secret(arn, token, pending_dict, current_dict, previous_dict):
+    """Set the pending secret in a single database endpoint, see set_secret
+
+    Args:
+        arn (string): The secret ARN or other identifier
+
+        token (string): The ClientRequestToken associated with the secret version
+
+        pending_dict (dict): The AWSPENDING secret dictionary
+
+        current_dict (dict): The AWSCURRENT secret dictionary
+
+        previous_dict (dict): The AWSPREVIOUS secret dictionary, or None if there is no such version
+
+    Raises:
+        ValueError: If no valid credentials are found to login to the database
 
-    # Now try the current password
-    logger.info('Attempting to get connection from AWSCURRENT stage.')
-    conn = get_connection(get_secret_dict(service_client, arn, "AWSCURRENT"))
+    """
+    candidates = login_candidates(pending_dict, current_dict, previous_dict)
+    endpoint = endpoint_label(pending_dict)
+    name, conn = None, None
+
+    # A retried attempt goes straight to the credential which worked for an earlier attempt of this rotation
+    known_good = known_good_candidate(candidates, arn, token, endpoint)
+    if known_good:
+        result = connect(known_good[1])
+        if result.succeeded:
+            name, conn = known_good[0], result.connection
+            logger.info("setSecret: Resuming with %s secret known from an earlier attempt for secret arn %s." % (name, arn))
+
+    # Otherwise try every credential in parallel, the first successful login wins
     if not conn:
-        # If both current and pending do not work, try previous
-        try:
-            logger.info('Attempting to get connection from AWSPREVIOUS stage.')
-            conn = get_connection(get_secret_dict(service_client, arn, "AWSPREVIOUS"))
-            assert conn
-        except (service_client.exceptions.ResourceNotFoundException, AssertionError):
-            # If previous stage does not exist. Try the initial password with AWSPENDING.
-            logger.info('Attempting to get connection from AWSPENDING stage with initial password.')
-            initial_password_dict = get_secret_dict(service_client, arn, "AWSPENDING", token)
-            initial_password_dict['password'] = initial_database_password
-            conn = get_connection(initial_password_dict)
-
-            # If previous stage does not exist. Try the initial password with AWSCURRENT.
-            if not conn:
-                logger.info('Attempting to get connection from AWSCURRENT stage with initial password.')
-                initial_password_dict = get_secret_dict(service_client, arn, "AWSCURRENT")
-                initial_password_dict['password'] = initial_database_password
-                conn = get_connection(initial_password_dict)
+        probe = probe_credentials(candidates, connect)
+        name, conn = probe.name, probe.connection
 
-    # WARNING - THE CODE ABOVE IS NOT ORIGINAL AND IS MODIFIED TO SUPPORT INITIAL PASSWORD LOGIC.
-    # IF ANY BUGS ARE FOUND - REPORT TO laimonas@idenfy.com or laimonas.sutkus@gmail.com THANK YOU.
+    if conn:
+        checkpoints.save(arn, token, **{checkpoint_key('credential', endpoint): name})
+
+    # If the pending secret already works, there is nothing to do
+    if name == 'AWSPENDING':
+        release_connection(conn)
+        logger.info("setSecret: AWSPENDING secret is already set as password in MySQL DB for secret arn %s." % arn)
+        return
+
+    # Do not mistake an unreachable database for wrong credentials
+    if not conn and probe.endpoint_unreachable:
+        logger.error("setSecret: Unable to reach MySQL DB for secret arn %s: %s" % (arn, probe.describe_failures()))
+        raise ValueError("Unable to reach MySQL DB for secret arn %s" % arn)
 
     # If we still don't have a connection, raise a ValueError
     if not conn:
         logger.error("setSecret: Unable to log into database with previous, current, or pending secret of secret arn %s" % arn)
         raise ValueError("Unable to log into database with previous, current, or pending secret of secret arn %s" % arn)
 
+    logger.info("setSecret: Logged into MySQL DB with %s secret for secret arn %s." % (name, arn))
+
     # Now set the password to the pending password
     try:
+        # The server version is known from the handshake, no need to query it
+        password_option = get_password_option(server_profiles.record(conn).version)
         with conn.cursor() as cur:
-            cur.execute("SELECT VERSION()")
-            ver = cur.fetchone()
-            password_option = get_password_option(ver[0])
             cur.execute("SET PASSWORD = " + password_option, pending_dict['password'])
             conn.commit()
+            checkpoints.save(arn, token, **{checkpoint_key('password_set', endpoint): True})
             logger.info("setSecret: Successfully set password for user %s in MySQL DB for secret arn %s." % (pending_dict['username'], arn))
     finally:
-        conn.close()
+        release_connection(conn)
 
 
+@recorder.timed('testSecret')
 def test_secret(service_client, arn, token):
     """Test the pending secret against the database
 
     This method tries to log into the database with the secrets staged with AWSPENDING and runs
-    a permissions check to ensure the user has the corrrect permissions.
+    a permissions check to ensure the user has the corrrect permissions. If the secret lists additional
+    endpoints, every endpoint is tested in parallel.
 
     Args:
         service_client (client): The secrets manager service client
@@ -229,9 +803,24 @@ def test_secret(service_client, arn, token):
         KeyError: If the secret json does not contain the expected keys
 
     """
-    # Try to login with the pending secret, if it succeeds, return
     logger.info('Testing secret with AWSPENDING stage...')
     secret_dict = get_secret_dict(service_client, arn, "AWSPENDING", token)
+    fan_out('testSecret', arn, secret_dict, lambda endpoint: test_endpoint_secret(arn, with_endpoint(secret_dict, endpoint)))
+
+
+def test_endpoint_secret(arn, secret_dict):
+    """Test the pending secret against a single database endpoint, see test_secret
+
+    Args:
+        arn (string): The secret ARN or other identifier
+
+        secret_dict (dict): The AWSPENDING secret dictionary
+
+    Raises:
+        ValueError: If the pending secret is not able to login to the database
+
+    """
+    # Try to login with the pending secret, if it succeeds, return
     conn = get_connection(secret_dict)
 
     if conn:
@@ -242,7 +831,7 @@ def test_secret(service_client, arn, token):
                 cur.execute("SELECT NOW()")
                 conn.commit()
         finally:
-            conn.close()
+            release_connection(conn)
 
         logger.info("testSecret: Successfully signed into MySQL DB with AWSPENDING secret in %s." % arn)
         return
@@ -251,6 +840,7 @@ def test_secret(service_client, arn, token):
         raise ValueError("Unable to log into database with pending secret of secret ARN %s" % arn)
 
 
+@recorder.timed('finishSecret')
 def finish_secret(service_client, arn, token):
     """Finish the rotation by marking the pending secret as current
 
@@ -272,6 +862,7 @@ def finish_secret(service_client, arn, token):
             if version == token:
                 # The correct version is already marked as current, return
                 logger.info("finishSecret: Version %s already marked as AWSCURRENT for %s" % (version, arn))
+                checkpoints.discard(arn, token)
                 return
             current_version = version
             break
@@ -280,6 +871,9 @@ def finish_secret(service_client, arn, token):
     service_client.update_secret_version_stage(SecretId=arn, VersionStage="AWSCURRENT", MoveToVersionId=token, RemoveFromVersionId=current_version)
     logger.info("finishSecret: Successfully set AWSCURRENT stage to version %s for secret %s." % (token, arn))
 
+    # The rotation is over, a checkpoint of it is no longer needed
+    checkpoints.discard(arn, token)
+
 
 def get_connection(secret_dict):
     """Gets a connection to MySQL DB from a secret dictionary
@@ -296,17 +890,377 @@ def get_connection(secret_dict):
     Raises:
         KeyError: If the secret json does not contain the expected keys
 
+    """
+    return connect(secret_dict).connection
+
+
+def connect(secret_dict):
+    """Tries to log into MySQL DB with a secret dictionary and classifies the outcome
+
+    An idle pooled connection to the same endpoint is re-authenticated instead of opening a new one. Otherwise
+    the connect timeout adapts to the login times previously observed by this container for the same endpoint,
+    hence an endpoint which stopped answering is given up on quickly. A server public key fetched by an earlier
+    login to the same endpoint is reused, saving a round trip of a caching_sha2_password full authentication. A
+    login rejected with a cached key is retried once without it, since the endpoint may be served by another server.
+
+    Args:
+        secret_dict (dict): The Secret Dictionary
+
+    Returns:
+        ConnectionResult: The outcome of the attempt holding a pymysql.connections.Connection object on success
+
+    Raises:
+        KeyError: If the secret json does not contain the expected keys
+
     """
     # Parse and validate the secret JSON string
     port = int(secret_dict['port']) if 'port' in secret_dict else 3306
     dbname = secret_dict['dbname'] if 'dbname' in secret_dict else None
+    host = secret_dict['host']
+
+    # Prefer re-authenticating an idle connection over opening a new one
+    pooled = connection_pool.acquire(host, port)
+    if pooled is not None:
+        result = change_user(pooled, secret_dict['username'], secret_dict['password'], dbname)
+        if result.succeeded or result.status == ConnectionResult.AUTH_FAILURE:
+            return result
+
+    connect_timeout = connect_timeouts.timeout(host, port)
+    public_key = server_profiles.public_key(host, port)
 
     # Try to obtain a connection to the db
+    start = time.time()
+    while True:
+        try:
+            conn = InstrumentedConnection(host, user=secret_dict['username'], passwd=secret_dict['password'], port=port, db=dbname, connect_timeout=connect_timeout, server_public_key=public_key)
+            break
+        except pymysql.OperationalError as e:
+            status = classify_error(e)
+            if status == ConnectionResult.AUTH_FAILURE and public_key is not None:
+                # The key may belong to another server, e.g. after a failover, retry once fetching the current one
+                logger.info("Login to %s:%d as %s with a cached server public key failed, retrying without it." % (host, port, secret_dict['username']))
+                server_profiles.forget_public_key(host, port)
+                public_key = None
+                continue
+
+            elapsed = time.time() - start
+            logger.info("Login to %s:%d as %s failed with %s after %.3fs: %s" % (host, port, secret_dict['username'], status, elapsed, e))
+            return ConnectionResult(status, error=e, elapsed=elapsed)
+
+    elapsed = time.time() - start
+    connect_timeouts.record(host, port, elapsed)
+    server_profiles.record(conn)
+    return ConnectionResult(ConnectionResult.SUCCESS, connection=conn, elapsed=elapsed)
+
+
+def change_user(conn, username, password, dbname):
+    """Re-authenticates an open connection as the given user with COM_CHANGE_USER
+
+    The server checks the credentials exactly like on a new login, but no new socket, handshake or TLS session
+    is needed. A connection which fails to re-authenticate is dropped.
+
+    Args:
+        conn (Connection): An open pymysql.connections.Connection object
+
+        username (string): The user to log in as
+
+        password (string): The password to log in with
+
+        dbname (string): The database to use, or None
+
+    Returns:
+        ConnectionResult: The outcome of the attempt holding the re-authenticated connection on success
+
+    """
+    start = time.time()
     try:
-        conn = pymysql.connect(secret_dict['host'], user=secret_dict['username'], passwd=secret_dict['password'], port=port, db=dbname, connect_timeout=5)
-        return conn
-    except pymysql.OperationalError:
-        return None
+        conn.change_user(username, password, dbname)
+    except pymysql.MySQLError as e:
+        discard(conn)
+        elapsed = time.time() - start
+        status = classify_error(e) if isinstance(e, pymysql.OperationalError) else ConnectionResult.ERROR
+        logger.info("Re-authentication on %s:%d as %s failed with %s after %.3fs: %s" % (conn.host, conn.port, username, status, elapsed, e))
+        return ConnectionResult(status, error=e, elapsed=elapsed)
+
+    return ConnectionResult(ConnectionResult.SUCCESS, connection=conn, elapsed=time.time() - start)
+
+
+def login_candidates(pending_dict, current_dict, previous_dict):
+    """Lists every credential which may currently be valid for the database user, ordered by priority
+
+    Args:
+        pending_dict (dict): The AWSPENDING secret dictionary
+
+        current_dict (dict): The AWSCURRENT secret dictionary
+
+        previous_dict (dict): The AWSPREVIOUS secret dictionary, or None if there is no such version
+
+    Returns:
+        list: A list of (name, secret_dict) tuples with distinct connection details and credentials
+
+    """
+    candidates = [('AWSPENDING', pending_dict), ('AWSCURRENT', current_dict)]
+    if previous_dict:
+        candidates.append(('AWSPREVIOUS', previous_dict))
+
+    # WARNING - THE CODE BELOW IS NOT ORIGINAL AND IS MODIFIED TO SUPPORT INITIAL PASSWORD LOGIC.
+    # IF ANY BUGS ARE FOUND - REPORT TO laimonas@idenfy.com or laimonas.sutkus@gmail.com THANK YOU.
+
+    # The initial password is tried with both AWSPENDING and AWSCURRENT connection details.
+    for stage, secret_dict in [('AWSPENDING', pending_dict), ('AWSCURRENT', current_dict)]:
+        initial_password = initial_password_of(secret_dict)
+        if initial_password is None:
+            continue
+        initial_password_dict = dict(secret_dict)
+        initial_password_dict['password'] = initial_password
+        candidates.append(('%s with initial password' % stage, initial_password_dict))
+
+    # WARNING - THE CODE ABOVE IS NOT ORIGINAL AND IS MODIFIED TO SUPPORT INITIAL PASSWORD LOGIC.
+    # IF ANY BUGS ARE FOUND - REPORT TO laimonas@idenfy.com or laimonas.sutkus@gmail.com THANK YOU.
+
+    return unique_credentials(candidates)
+
+
+def initial_password_of(secret_dict):
+    """Gets the password the database of a secret was created with
+
+    A rotation lambda function shared by many secrets can not hold the initial password of every database in its
+    environment, hence a secret may refer to a secret holding the initial password of its own database, see
+    with_initial_password.
+
+    Args:
+        secret_dict (dict): The Secret Dictionary, passed through with_initial_password if it refers to an initial
+        password secret
+
+    Returns:
+        string: The initial password, INITIAL_DATABASE_PASSWORD if the secret does not refer to one, or None if it
+        is not known
+
+    """
+    return secret_dict.get(RESOLVED_INITIAL_PASSWORD_KEY, initial_database_password)
+
+
+def with_initial_password(service_client, secret_dict):
+    """Resolves the initial password a secret dictionary refers to
+
+    The initial password is kept in a separate secret which only the rotation lambda function can read, instead of
+    the secret itself, hence it is never handed to the consumers of the secret. The returned dictionary holds it in
+    memory only and must never be put as a secret value.
+
+    Args:
+        service_client (client): The secrets manager service client
+
+        secret_dict (dict): The Secret Dictionary
+
+    Returns:
+        dict: A copy of the Secret Dictionary with the initial password, or the Secret Dictionary itself if it does
+        not refer to one
+
+    Raises:
+        ResourceNotFoundException: If the initial password secret does not exist
+
+    """
+    if 'initial_password_arn' not in secret_dict:
+        return secret_dict
+
+    secret = service_client.get_secret_value(SecretId=secret_dict['initial_password_arn'], VersionStage="AWSCURRENT")
+    resolved_dict = dict(secret_dict)
+    resolved_dict[RESOLVED_INITIAL_PASSWORD_KEY] = secret['SecretString']
+    return resolved_dict
+
+
+def known_good_candidate(candidates, arn, token, endpoint):
+    """Finds the candidate an earlier attempt of the same rotation already logged in with
+
+    Args:
+        candidates (list): A list of (name, secret_dict) tuples
+
+        arn (string): The secret ARN or other identifier
+
+        token (string): The ClientRequestToken associated with the secret version
+
+        endpoint (string): The endpoint the candidates log into, see endpoint_label
+
+    Returns:
+        tuple: The (name, secret_dict) candidate, AWSPENDING if the password was already set, or None
+
+    """
+    checkpoint = checkpoints.load(arn, token)
+    if checkpoint.get(checkpoint_key('password_set', endpoint)):
+        known_good = 'AWSPENDING'
+    else:
+        known_good = checkpoint.get(checkpoint_key('credential', endpoint))
+    for candidate in candidates:
+        if candidate[0] == known_good:
+            return candidate
+    return None
+
+
+def checkpoint_key(name, endpoint):
+    """Gets the checkpoint key of a value recorded separately for every endpoint of a secret"""
+    return '%s@%s' % (name, endpoint)
+
+
+def secret_endpoints(secret_dict):
+    """Lists the secret dictionary of every database endpoint the secret applies to
+
+    Besides the host, a secret may list additional endpoints where the same user has to have the same password,
+    e.g. self-managed replicas which do not replicate the mysql system schema:
+        'endpoints': [
+            {
+                'host': <required: endpoint host name>,
+                'port': <optional: if not specified, the port of the secret is used>,
+                'dbname': <optional: if not specified, the database name of the secret is used>
+            },
+            ...
+        ]
+
+    Args:
+        secret_dict (dict): The Secret Dictionary
+
+    Returns:
+        list: The secret dictionary itself followed by a copy of it for every additional endpoint
+
+    Raises:
+        KeyError: If an additional endpoint does not contain the host key
+
+    """
+    return [secret_dict] + [with_endpoint(secret_dict, endpoint) for endpoint in secret_dict.get('endpoints') or []]
+
+
+def with_endpoint(secret_dict, endpoint):
+    """Copies a secret dictionary replacing its connection details with the ones of an additional endpoint
+
+    Args:
+        secret_dict (dict): The Secret Dictionary, or None
+
+        endpoint (dict): An additional endpoint listed by the secret, or None for the host of the secret itself
+
+    Returns:
+        SecretDictionary: Secret dictionary of the endpoint, without additional endpoints
+
+    Raises:
+        KeyError: If the endpoint does not contain the host key
+
+    """
+    if secret_dict is None or endpoint is None:
+        return secret_dict
+    if 'host' not in endpoint:
+        raise KeyError("host key is missing from an endpoint of secret JSON")
+
+    endpoint_dict = dict((key, value) for key, value in secret_dict.items() if key != 'endpoints')
+    for key in ['host', 'port', 'dbname']:
+        if key in endpoint:
+            endpoint_dict[key] = endpoint[key]
+    return endpoint_dict
+
+
+def endpoint_label(secret_dict):
+    """Describes the endpoint of a secret dictionary as host:port"""
+    return '%s:%d' % endpoint_of(secret_dict)
+
+
+def fan_out(step, arn, secret_dict, function):
+    """Runs a rotation step against every database endpoint of a secret in parallel
+
+    A secret without additional endpoints runs the step against its host directly. Otherwise the step runs against
+    every endpoint at the same time and fails if it failed on any of them, after every endpoint is done. A retried
+    step is harmless for endpoints where it already succeeded.
+
+    Args:
+        step (string): The rotation step, for logging
+
+        arn (string): The secret ARN or other identifier
+
+        secret_dict (dict): The Secret Dictionary listing the endpoints
+
+        function (function): Runs the step against a single endpoint, it takes an additional endpoint of the secret or
+        None for the host of the secret itself
+
+    Raises:
+        ValueError: If the step failed on any endpoint
+
+    """
+    endpoints = secret_dict.get('endpoints') or []
+    if not endpoints:
+        function(None)
+        return
+
+    def run(endpoint):
+        start = time.time()
+        try:
+            function(endpoint)
+            error = None
+        except Exception as e:
+            error = e
+        return endpoint_label(with_endpoint(secret_dict, endpoint)), time.time() - start, error
+
+    results = map_concurrently(run, [None] + list(endpoints), len(endpoints) + 1)
+    report_endpoints(step, arn, results)
+
+
+def report_endpoints(step, arn, results):
+    """Logs the outcome of a rotation step on every endpoint of a secret
+
+    Args:
+        step (string): The rotation step
+
+        arn (string): The secret ARN or other identifier
+
+        results (list): A list of (endpoint label, seconds taken, error or None) tuples
+
+    Raises:
+        ValueError: If the step failed on any endpoint
+
+    """
+    failed = []
+    for endpoint, elapsed, error in results:
+        if error is None:
+            logger.info("%s: Succeeded on %s in %.3fs for secret %s." % (step, endpoint, elapsed, arn))
+        else:
+            logger.error("%s: Failed on %s after %.3fs for secret %s: %s: %s" % (step, endpoint, elapsed, arn, type(error).__name__, error))
+            failed.append(endpoint)
+
+    if failed:
+        raise ValueError("%s failed on %d of %d endpoints (%s) of secret %s" % (step, len(failed), len(results), ', '.join(failed), arn))
+
+
+def release_connection(conn):
+    """Returns a connection which is no longer needed to the container wide pool
+
+    Args:
+        conn (Connection): The pymysql.connections.Connection object
+
+    """
+    connection_pool.release(conn)
+
+
+def unique_credentials(candidates):
+    """Removes candidates which would log into the database exactly the same way as an earlier candidate
+
+    Args:
+        candidates (list): A list of (name, secret_dict) tuples ordered by priority
+
+    Returns:
+        list: Candidates with distinct connection details and credentials
+
+    """
+    seen = set()
+    unique = []
+    for name, secret_dict in candidates:
+        key = (
+            secret_dict['host'],
+            secret_dict.get('port'),
+            secret_dict['username'],
+            secret_dict['password'],
+            secret_dict.get('dbname')
+        )
+        if key in seen:
+            logger.info("Skipping %s secret as its credentials were already queued for a login attempt." % name)
+            continue
+        seen.add(key)
+        unique.append((name, secret_dict))
+    return unique
 
 
 def get_secret_dict(service_client, arn, stage, token=None):
@@ -0,0 +1,284 @@
+import json
+import logging
+
+import lambda_function
+
+from caching_client import CachingSecretsManagerClient
+from instrumentation import recorder
+from profiling import profiler
+
+# Alternating users rotation. Set the lambda function handler to multiuser_lambda_function.lambda_handler to use it.
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# The rotation alternates between a user and its clone, which is the user name with this suffix.
+CLONE_SUFFIX = '_clone'
+
+# Longest user name MySQL 5.7 and later accept.
+MAX_USERNAME_LENGTH = 32
+
+
+def lambda_handler(event, context):
+    """Secrets Manager RDS MySQL Multi-User Handler
+
+    This handler uses the alternating users rotation scheme to rotate an RDS MySQL user credential. During the first
+    rotation, this scheme logs into the database as the master user, creates a clone of the user with the same
+    grants and sets its password. Every rotation after that alternates between the user and its clone, setting the
+    password of the one which is not AWSCURRENT. The AWSCURRENT user and its password are never touched by a
+    rotation, hence applications keep logging in with it and their open connections keep working while they move
+    to the new AWSCURRENT user.
+
+    The Secret SecretString is expected to be a JSON string with the following format:
+    {
+        'engine': <required: must be set to 'mysql'>,
+        'host': <required: instance host name>,
+        'username': <required: username>,
+        'password': <required: password>,
+        'dbname': <optional: database name>,
+        'port': <optional: if not specified, default port 3306 will be used>,
+        'endpoints': <optional: additional endpoints with the same user, see lambda_function.secret_endpoints>,
+        'masterarn': <required: the arn of the master secret used to create the clone user and change passwords>
+    }
+
+    The master secret has the format of a single user secret, with the same host.
+
+    Args:
+        event (dict): Lambda dictionary of event parameters. These keys must include the following:
+            - SecretId: The secret ARN or identifier
+            - ClientRequestToken: The ClientRequestToken of the secret version
+            - Step: The rotation step (one of createSecret, setSecret, testSecret, or finishSecret)
+
+        context (LambdaContext): The Lambda runtime information
+
+    Raises:
+        ResourceNotFoundException: If the secret with the specified arn and stage does not exist
+
+        ValueError: If the secret is not properly configured for rotation, or the event is a batch or dry run event
+
+        KeyError: If the secret json does not contain the expected keys
+
+    """
+    # Batch rotations and pre-flight checks run single user rotation steps
+    if event.get('DryRun') or ('SecretIds' in event and 'SecretId' not in event):
+        raise ValueError("Batch rotations and dry runs are not supported by the multi-user rotation handler")
+
+    runtime_context = lambda_function.setup_runtime()
+
+    arn = event['SecretId']
+    token = event['ClientRequestToken']
+    step = event['Step']
+
+    # Setup the client. Reads are memoized for the duration of this invocation only.
+    service_client = CachingSecretsManagerClient(runtime_context.service_client)
+    counters = runtime_context.service_client.counters()
+    try:
+        with profiler.profile(step):
+            run_step(service_client, arn, token, step)
+    finally:
+        retries = lambda_function.counter_deltas(counters, runtime_context.service_client.counters())
+        logger.info("Secrets manager API calls made: %d, avoided: %d, retried: %d, throttled: %d." % (service_client.api_calls_made, service_client.api_calls_avoided, retries['Retries'], retries['Throttles']))
+        recorder.flush({'Step': step})
+
+
+def run_step(service_client, arn, token, step):
+    """Validates the secret version staging and runs the requested rotation step
+
+    Testing and finishing a rotation is the same for both rotation schemes.
+
+    Args:
+        service_client (client): The secrets manager service client
+
+        arn (string): The secret ARN or other identifier
+
+        token (string): The ClientRequestToken associated with the secret version
+
+        step (string): The rotation step (one of createSecret, setSecret, testSecret, or finishSecret)
+
+    Raises:
+        ValueError: If the secret is not properly configured for rotation or the step is invalid
+
+    """
+    # Make sure the version is staged correctly
+    metadata = service_client.describe_secret(SecretId=arn)
+    if not lambda_function.check_version_staging(metadata, arn, token):
+        return
+
+    steps = {
+        'createSecret': create_secret,
+        'setSecret': set_secret,
+        'testSecret': lambda_function.test_secret,
+        'finishSecret': lambda_function.finish_secret
+    }
+    if step not in steps:
+        logger.error("lambda_handler: Invalid step parameter %s for secret %s" % (step, arn))
+        raise ValueError("Invalid step parameter %s for secret %s" % (step, arn))
+
+    steps[step](service_client, arn, token)
+
+
+@recorder.timed('createSecret')
+def create_secret(service_client, arn, token):
+    """Generate a new secret for the other user
+
+    This method first checks for the existence of a secret for the passed in token. If one does not exist, it will
+    generate a new password for the user which is not AWSCURRENT and put it with the passed in token.
+
+    Args:
+        service_client (client): The secrets manager service client
+
+        arn (string): The secret ARN or other identifier
+
+        token (string): The ClientRequestToken associated with the secret version
+
+    Raises:
+        ValueError: If the current secret is not valid JSON or the user name is too long to be cloned
+
+        KeyError: If the secret json does not contain the expected keys
+
+    """
+    # Make sure the current secret exists
+    current_dict = lambda_function.get_secret_dict(service_client, arn, "AWSCURRENT")
+
+    # Now try to get the secret version, if that fails, put a new secret
+    try:
+        lambda_function.get_secret_dict(service_client, arn, "AWSPENDING", token)
+        logger.info("createSecret: Successfully retrieved secret for %s." % arn)
+    except service_client.exceptions.ResourceNotFoundException:
+        # Switch to the other user and generate a random password for it
+        current_dict['username'] = get_alt_username(current_dict['username'])
+        current_dict['password'] = lambda_function.new_password(service_client)
+
+        # Put the secret
+        service_client.put_secret_value(SecretId=arn, ClientRequestToken=token, SecretString=json.dumps(current_dict), VersionStages=['AWSPENDING'])
+        logger.info("createSecret: Successfully put secret for ARN %s and version %s." % (arn, token))
+
+
+@recorder.timed('setSecret')
+def set_secret(service_client, arn, token):
+    """Set the pending secret in the database
+
+    This method logs into the database as the master user, creates the AWSPENDING user if it does not exist yet,
+    grants it everything the AWSCURRENT user is granted and sets its password. If the AWSPENDING secret already logs
+    in, there is nothing to do. If the secret lists additional endpoints, the password is set on every endpoint in
+    parallel.
+
+    Args:
+        service_client (client): The secrets manager service client
+
+        arn (string): The secret ARN or other identifier
+
+        token (string): The ClientRequestToken associated with the secret version
+
+    Raises:
+        ResourceNotFoundException: If the secret with the specified arn and stage does not exist
+
+        ValueError: If the secrets do not belong together or the master secret is not able to log into the database
+
+        KeyError: If the secret json does not contain the expected keys
+
+    """
+    pending_dict = lambda_function.get_secret_dict(service_client, arn, "AWSPENDING", token)
+    current_dict = lambda_function.get_secret_dict(service_client, arn, "AWSCURRENT")
+
+    # Make sure the pending secret is the other user of the same database
+    if get_alt_username(current_dict['username']) != pending_dict['username']:
+        logger.error("setSecret: Attempting to modify user %s other than current user or clone %s" % (pending_dict['username'], current_dict['username']))
+        raise ValueError("Attempting to modify user %s other than current user or clone %s" % (pending_dict['username'], current_dict['username']))
+    if current_dict['host'] != pending_dict['host']:
+        logger.error("setSecret: Attempting to modify user for host %s other than current host %s" % (pending_dict['host'], current_dict['host']))
+        raise ValueError("Attempting to modify user for host %s other than current host %s" % (pending_dict['host'], current_dict['host']))
+
+    # Now get the master secret and make sure it is a secret of the same database
+    if 'masterarn' not in current_dict:
+        raise KeyError("masterarn key is missing from secret JSON")
+    master_dict = lambda_function.get_secret_dict(service_client, current_dict['masterarn'], "AWSCURRENT")
+    if current_dict['host'] != master_dict['host']:
+        logger.error("setSecret: Current database host %s is not the same host as master %s" % (current_dict['host'], master_dict['host']))
+        raise ValueError("Current database host %s is not the same host as master %s" % (current_dict['host'], master_dict['host']))
+
+    lambda_function.fan_out('setSecret', arn, pending_dict, lambda endpoint: set_endpoint_secret(
+        arn,
+        lambda_function.with_endpoint(pending_dict, endpoint),
+        lambda_function.with_endpoint(current_dict, endpoint),
+        lambda_function.with_endpoint(master_dict, endpoint)
+    ))
+
+
+def set_endpoint_secret(arn, pending_dict, current_dict, master_dict):
+    """Set the pending secret in a single database endpoint, see set_secret
+
+    Args:
+        arn (string): The secret ARN or other identifier
+
+        pending_dict (dict): The AWSPENDING secret dictionary
+
+        current_dict (dict): The AWSCURRENT secret dictionary
+
+        master_dict (dict): The AWSCURRENT master secret dictionary
+
+    Raises:
+        ValueError: If the master secret is not able to log into the database
+
+    """
+    # If the pending secret already works, there is nothing to do
+    result = lambda_function.connect(pending_dict)
+    if result.succeeded:
+        lambda_function.release_connection(result.connection)
+        logger.info("setSecret: AWSPENDING secret is already set as password in MySQL DB for secret arn %s." % arn)
+        return
+
+    # Log in as the master user, the current user keeps its password and its connections
+    result = lambda_function.connect(master_dict)
+    if not result.succeeded:
+        logger.error("setSecret: Unable to log into database with master secret of secret arn %s: %s" % (arn, result.status))
+        raise ValueError("Unable to log into database with master secret of secret arn %s" % arn)
+
+    conn = result.connection
+    try:
+        # The server version is known from the handshake, no need to query it
+        password_option = lambda_function.get_password_option(lambda_function.server_profiles.record(conn).version)
+        with conn.cursor() as cur:
+            # Check if the user exists, if not create it
+            cur.execute("SELECT User FROM mysql.user WHERE User = %s", pending_dict['username'])
+            if cur.rowcount == 0:
+                cur.execute("CREATE USER %s IDENTIFIED BY %s", (pending_dict['username'], pending_dict['password']))
+                logger.info("setSecret: Created user %s in MySQL DB for secret arn %s." % (pending_dict['username'], arn))
+
+            # Grant the pending user everything the current user is granted, so that either can be used
+            cur.execute("SHOW GRANTS FOR %s", current_dict['username'])
+            for row in cur.fetchall():
+                grant, grantee = row[0].rsplit(' TO ', 1)
+                # Keep the options which follow the grantee, e.g. WITH GRANT OPTION
+                options = ''.join(grantee.partition(' WITH ')[1:])
+                # % is a placeholder character for pymysql
+                cur.execute(grant.replace('%', '%%') + " TO %s" + options.replace('%', '%%'), pending_dict['username'])
+
+            # Set the password for the pending user
+            cur.execute("SET PASSWORD FOR %s = " + password_option, (pending_dict['username'], pending_dict['password']))
+            conn.commit()
+            logger.info("setSecret: Successfully set password for user %s in MySQL DB for secret arn %s." % (pending_dict['username'], arn))
+    finally:
+        lambda_function.release_connection(conn)
+
+
+def get_alt_username(current_username):
+    """Gets the other user of the alternating users rotation
+
+    Args:
+        current_username (string): The AWSCURRENT user name
+
+    Returns:
+        string: The user name with the clone suffix appended, or removed if it already ends with it
+
+    Raises:
+        ValueError: If the user name of the clone would be too long
+
+    """
+    if current_username.endswith(CLONE_SUFFIX):
+        return current_username[:-len(CLONE_SUFFIX)]
+
+    new_username = current_username + CLONE_SUFFIX
+    if len(new_username) > MAX_USERNAME_LENGTH:
+        raise ValueError("Unable to clone user %s, user name with %s appended would exceed %d characters" % (current_username, CLONE_SUFFIX, MAX_USERNAME_LENGTH))
+    return new_username
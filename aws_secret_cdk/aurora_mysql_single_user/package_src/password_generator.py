@@ -0,0 +1,140 @@
+import json
+import string
+
+from collections import namedtuple
+
+try:
+    from secrets import SystemRandom
+except ImportError:
+    from random import SystemRandom
+
+# Characters which are never part of a generated password, matching the ones the rotation always excluded.
+DEFAULT_EXCLUDE_CHARACTERS = '/@"\'\\'
+
+DEFAULT_PASSWORD_LENGTH = 32
+
+# Password generators selectable with the PASSWORD_GENERATOR environment variable.
+LOCAL_GENERATOR = 'local'
+API_GENERATOR = 'api'
+
+# Same punctuation characters as secrets manager GetRandomPassword uses.
+PUNCTUATION = string.punctuation
+
+_random = SystemRandom()
+
+_PasswordPolicy = namedtuple('PasswordPolicy', [
+    'PasswordLength',
+    'ExcludeCharacters',
+    'ExcludeNumbers',
+    'ExcludePunctuation',
+    'ExcludeUppercase',
+    'ExcludeLowercase',
+    'IncludeSpace',
+    'RequireEachIncludedType',
+])
+
+
+class PasswordPolicy(_PasswordPolicy):
+    """Rules for generated passwords
+
+    Field names match the parameters of secrets manager GetRandomPassword, hence the same policy can be applied
+    locally or passed to the API as keyword arguments.
+
+    """
+    __slots__ = ()
+
+    def __new__(
+            cls,
+            PasswordLength=DEFAULT_PASSWORD_LENGTH,
+            ExcludeCharacters=DEFAULT_EXCLUDE_CHARACTERS,
+            ExcludeNumbers=False,
+            ExcludePunctuation=False,
+            ExcludeUppercase=False,
+            ExcludeLowercase=False,
+            IncludeSpace=False,
+            RequireEachIncludedType=True):
+        return super(PasswordPolicy, cls).__new__(
+            cls,
+            int(PasswordLength),
+            ExcludeCharacters,
+            bool(ExcludeNumbers),
+            bool(ExcludePunctuation),
+            bool(ExcludeUppercase),
+            bool(ExcludeLowercase),
+            bool(IncludeSpace),
+            bool(RequireEachIncludedType)
+        )
+
+    @classmethod
+    def from_json(cls, value):
+        """Parses a policy from a JSON object with GetRandomPassword parameter names
+
+        Args:
+            value (string): The JSON object, missing keys take their default values. Empty means the default policy
+
+        Returns:
+            PasswordPolicy: The parsed policy
+
+        Raises:
+            ValueError: If the value is not a JSON object or contains unknown keys
+
+        """
+        if not value:
+            return cls()
+        parameters = json.loads(value)
+        if not isinstance(parameters, dict):
+            raise ValueError("Password policy must be a JSON object")
+        unknown = set(parameters) - set(cls._fields)
+        if unknown:
+            raise ValueError("Unknown password policy parameters: %s" % ', '.join(sorted(unknown)))
+        return cls(**parameters)
+
+    def character_classes(self):
+        """Character classes a password may be built of, with excluded characters removed
+
+        Returns:
+            list: Strings of allowed characters, one per included class
+
+        """
+        classes = []
+        if not self.ExcludeLowercase:
+            classes.append(string.ascii_lowercase)
+        if not self.ExcludeUppercase:
+            classes.append(string.ascii_uppercase)
+        if not self.ExcludeNumbers:
+            classes.append(string.digits)
+        if not self.ExcludePunctuation:
+            classes.append(PUNCTUATION)
+        if self.IncludeSpace:
+            classes.append(' ')
+
+        classes = [''.join(c for c in characters if c not in self.ExcludeCharacters) for characters in classes]
+        return [characters for characters in classes if characters]
+
+
+def generate_password(policy):
+    """Generates a password locally with a cryptographically secure random number generator
+
+    Args:
+        policy (PasswordPolicy): The rules the password has to follow
+
+    Returns:
+        string: The generated password
+
+    Raises:
+        ValueError: If no password can satisfy the policy
+
+    """
+    classes = policy.character_classes()
+    if not classes:
+        raise ValueError("Password policy excludes every character")
+
+    required = classes if policy.RequireEachIncludedType else []
+    if policy.PasswordLength < max(1, len(required)):
+        raise ValueError("Password length %d is too short for the password policy" % policy.PasswordLength)
+
+    alphabet = ''.join(classes)
+    characters = [_random.choice(characters) for characters in required]
+    characters += [_random.choice(alphabet) for _ in range(policy.PasswordLength - len(characters))]
+    _random.shuffle(characters)
+    return ''.join(characters)
@@ -0,0 +1,205 @@
+import logging
+import socket
+import time
+
+from connection_result import MAX_CONNECT_TIMEOUT, ConnectionResult, classify_error
+from pymysql import MySQLError, OperationalError
+from pymysql.connections import Connection
+from server_profile import ServerProfile
+
+logger = logging.getLogger()
+
+# Phases of a login attempt, in the order they happen.
+DNS_PHASE = 'Dns'
+TCP_PHASE = 'Tcp'
+HANDSHAKE_PHASE = 'Handshake'
+AUTH_PHASE = 'Auth'
+QUERY_PHASE = 'Query'
+
+# Seconds a pre-flight check waits for the database in any single phase. Unlike a rotation, a pre-flight check
+# does not give up early on a slow endpoint, finding slow endpoints is what it is for.
+PREFLIGHT_TIMEOUT = MAX_CONNECT_TIMEOUT
+
+# What a full rotation does, used to estimate its duration from the latencies a pre-flight check observes.
+ROTATION_API_CALLS = 12
+ROTATION_LOGINS = 2
+ROTATION_QUERIES = 4
+
+
+class EndpointResolution(object):
+    """Addresses a database host name resolved to and the time it took"""
+    def __init__(self, host, port, addresses=None, elapsed=None, error=None):
+        self.host = host
+        self.port = port
+        self.addresses = addresses or []
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def resolved(self):
+        return bool(self.addresses)
+
+    def report(self):
+        report = {'Addresses': self.addresses, 'Timings': {DNS_PHASE: self.elapsed}}
+        if self.error is not None:
+            report['Error'] = '%s: %s' % (type(self.error).__name__, self.error)
+        return report
+
+
+class LoginCheck(object):
+    """Outcome of a pre-flight login attempt with per phase latencies in seconds"""
+    def __init__(self):
+        self.status = None
+        self.phase = None
+        self.error = None
+        self.server_version = None
+        self.timings = {}
+
+    @property
+    def succeeded(self):
+        return self.status == ConnectionResult.SUCCESS
+
+    @property
+    def login_time(self):
+        """Seconds from resolving the host name to a logged in session, None if the login failed"""
+        if not self.succeeded:
+            return None
+        return sum(self.timings.get(phase, 0.0) for phase in [DNS_PHASE, TCP_PHASE, HANDSHAKE_PHASE, AUTH_PHASE])
+
+    def report(self):
+        report = {'Status': self.status, 'Timings': self.timings}
+        if self.server_version is not None:
+            report['ServerVersion'] = self.server_version
+        if self.error is not None:
+            report['FailedPhase'] = self.phase
+            report['Error'] = '%s: %s' % (type(self.error).__name__, self.error)
+        return report
+
+
+class PreflightConnection(Connection):
+    """pymysql connection which times the server handshake and authentication of a login separately"""
+    check = None
+
+    def _get_server_information(self):
+        self.check.phase = HANDSHAKE_PHASE
+        start = time.time()
+        Connection._get_server_information(self)
+        self.check.timings[HANDSHAKE_PHASE] = time.time() - start
+
+    def _request_authentication(self):
+        self.check.phase = AUTH_PHASE
+        start = time.time()
+        Connection._request_authentication(self)
+        self.check.timings[AUTH_PHASE] = time.time() - start
+
+
+def resolve(host, port):
+    """Resolves a database host name
+
+    Args:
+        host (string): The database host name
+
+        port (int): The database port
+
+    Returns:
+        EndpointResolution: The resolved addresses, or the error if the name could not be resolved
+
+    """
+    start = time.time()
+    try:
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    except socket.error as e:
+        logger.info("preflight: Unable to resolve %s: %s" % (host, e))
+        return EndpointResolution(host, port, elapsed=time.time() - start, error=e)
+
+    addresses = []
+    for info in infos:
+        if info[4][0] not in addresses:
+            addresses.append(info[4][0])
+    return EndpointResolution(host, port, addresses, elapsed=time.time() - start)
+
+
+def check_login(secret_dict, resolution, timeout=PREFLIGHT_TIMEOUT):
+    """Logs into the database and runs a trivial query, timing every phase
+
+    The connection is opened to the first resolved address and closed afterwards, nothing is written.
+
+    Args:
+        secret_dict (dict): The Secret Dictionary
+
+        resolution (EndpointResolution): The resolved host of the secret
+
+        timeout (float): Seconds to wait for the database in any single phase
+
+    Returns:
+        LoginCheck: The outcome of the attempt
+
+    """
+    check = LoginCheck()
+    check.timings[DNS_PHASE] = resolution.elapsed
+    if not resolution.resolved:
+        check.status, check.phase, check.error = ConnectionResult.NETWORK_FAILURE, DNS_PHASE, resolution.error
+        return check
+
+    conn = None
+    try:
+        check.phase = TCP_PHASE
+        start = time.time()
+        sock = socket.create_connection((resolution.addresses[0], resolution.port), timeout)
+        check.timings[TCP_PHASE] = time.time() - start
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        conn = PreflightConnection(
+            resolution.host,
+            user=secret_dict['username'],
+            passwd=secret_dict['password'],
+            port=resolution.port,
+            db=secret_dict.get('dbname'),
+            connect_timeout=timeout,
+            defer_connect=True
+        )
+        conn.check = check
+        conn.connect(sock)
+        check.server_version = ServerProfile.from_connection(conn).version
+
+        check.phase = QUERY_PHASE
+        start = time.time()
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        check.timings[QUERY_PHASE] = time.time() - start
+        check.status = ConnectionResult.SUCCESS
+    except socket.error as e:
+        check.status, check.error = ConnectionResult.NETWORK_FAILURE, e
+    except OperationalError as e:
+        check.status, check.error = classify_error(e), e
+    except MySQLError as e:
+        check.status, check.error = ConnectionResult.ERROR, e
+    finally:
+        if conn is not None and conn.open:
+            try:
+                conn.close()
+            except MySQLError:
+                pass
+
+    if check.error is not None:
+        logger.info("preflight: Login to %s:%d as %s failed in %s phase with %s: %s" % (resolution.host, resolution.port, secret_dict['username'], check.phase, check.status, check.error))
+    return check
+
+
+def estimate_rotation_time(api_call_time, login_check):
+    """Estimates how long a full rotation of a secret takes from latencies observed by a pre-flight check
+
+    Args:
+        api_call_time (float): Average seconds per secrets manager API call
+
+        login_check (LoginCheck): A successful login check against the database of the secret
+
+    Returns:
+        float: Estimated seconds, excluding password generation and lambda cold start
+
+    """
+    return (
+        ROTATION_API_CALLS * api_call_time
+        + ROTATION_LOGINS * login_check.login_time
+        + ROTATION_QUERIES * login_check.timings[QUERY_PHASE]
+    )
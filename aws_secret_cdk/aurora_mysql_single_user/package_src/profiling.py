@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from instrumentation import recorder
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 has no tracemalloc, only the peak resident set size is reported there.
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger()
+
+# Number of functions listed in a cProfile dump, ordered by cumulative time.
+CPROFILE_TOP_FUNCTIONS = 25
+
+
+class InvocationProfiler(object):
+    """Opt-in resource profiling of rotation steps, meant to right-size the lambda function memory and timeout
+
+    Enabled with the PROFILING_ENABLED environment variable. Every profiled invocation records its wall time, CPU time
+    (of every thread of the process), peak memory traced by tracemalloc and peak resident set size of the process as
+    metrics of the same invocation. Tracing memory allocations slows the code down, hence profiling is off by default.
+
+    With PROFILING_CPROFILE also set, every invocation runs under cProfile and whenever an invocation is the slowest
+    one this container has seen so far, its top functions by cumulative time are written to the logs as a single
+    JSON line. cProfile only sees the thread which runs the handler, not the threads logging in concurrently.
+
+    """
+    def __init__(self, enabled=None, cprofile=None):
+        if enabled is None:
+            enabled = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+        if cprofile is None:
+            cprofile = os.environ.get('PROFILING_CPROFILE', 'false').lower() == 'true'
+        self.enabled = enabled
+        self.cprofile = enabled and cprofile
+        self.slowest = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, name):
+        """Context manager which profiles the code inside it
+
+        Args:
+            name (string): What is profiled, e.g. the rotation step
+
+        """
+        if not self.enabled:
+            yield
+            return
+
+        profiler = None
+        if self.cprofile:
+            import cProfile
+            profiler = cProfile.Profile()
+
+        tracing = tracemalloc is not None and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+
+        start, cpu_start = time.time(), _cpu_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall_time, cpu_time = time.time() - start, _cpu_time() - cpu_start
+            peak_traced = None
+            if tracing:
+                peak_traced = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            self._report(name, wall_time, cpu_time, peak_traced, profiler)
+
+    def _report(self, name, wall_time, cpu_time, peak_traced, profiler):
+        recorder.record('Profile.WallTime', wall_time)
+        recorder.record('Profile.CpuTime', cpu_time)
+        if peak_traced is not None:
+            recorder.record_value('Profile.PeakTracedMemory', peak_traced, 'Bytes')
+        max_rss = _max_rss_kilobytes()
+        if max_rss is not None:
+            recorder.record_value('Profile.MaxRss', max_rss, 'Kilobytes')
+
+        logger.info("profile: %s took %.3fs wall time, %.3fs CPU time, %s peak traced memory, %s max RSS." % (
+            name,
+            wall_time,
+            cpu_time,
+            '%d bytes' % peak_traced if peak_traced is not None else 'unknown',
+            '%d KB' % max_rss if max_rss is not None else 'unknown'
+        ))
+
+        if profiler is None:
+            return
+        with self._lock:
+            if wall_time <= self.slowest:
+                return
+            self.slowest = wall_time
+        logger.info(json.dumps({'Profile': name, 'WallTime': wall_time, 'Functions': top_functions(profiler)}, separators=(',', ':')))
+
+
+def top_functions(profiler, limit=CPROFILE_TOP_FUNCTIONS):
+    """Summarizes a cProfile run in a compact form
+
+    Args:
+        profiler (Profile): A cProfile profiler which is done profiling
+
+        limit (int): Maximum number of functions listed
+
+    Returns:
+        list: [function, calls, own milliseconds, cumulative milliseconds] lists ordered by cumulative time
+
+    """
+    import pstats
+
+    functions = []
+    for (filename, line, function), (_, calls, own_time, cumulative_time, _) in pstats.Stats(profiler).stats.items():
+        if filename == '~':
+            location = function
+        else:
+            location = '%s:%d(%s)' % (_short_path(filename), line, function)
+        functions.append([location, calls, round(own_time * 1000.0, 3), round(cumulative_time * 1000.0, 3)])
+
+    functions.sort(key=lambda function: function[3], reverse=True)
+    return functions[:limit]
+
+
+def _short_path(filename):
+    # Files of the deployment package are listed relative to it, anything else by its name only.
+    root = os.environ.get('LAMBDA_TASK_ROOT')
+    if root and filename.startswith(root + os.sep):
+        return filename[len(root) + 1:]
+    return os.path.basename(filename)
+
+
+def _cpu_time():
+    # CPU time of every thread of the process. Python 2 only has os.times, which ticks in 10ms steps.
+    if hasattr(time, 'process_time'):
+        return time.process_time()
+    times = os.times()
+    return times[0] + times[1]
+
+
+def _max_rss_kilobytes():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# Profiler of this container.
+profiler = InvocationProfiler()
@@ -7,14 +7,6 @@ from .err import OperationalError
 from .util import byte2int, int2byte
 
 
-try:
-    from cryptography.hazmat.backends import default_backend
-    from cryptography.hazmat.primitives import serialization, hashes
-    from cryptography.hazmat.primitives.asymmetric import padding
-    _have_cryptography = True
-except ImportError:
-    _have_cryptography = False
-
 from functools import partial
 import hashlib
 import io
@@ -24,6 +16,25 @@ import warnings
 
 DEBUG = False
 SCRAMBLE_LENGTH = 20
+
+# cryptography is only needed for RSA encrypted passwords (sha256_password and
+# caching_sha2_password full auth over an insecure connection), hence it is
+# imported on first use rather than on every cold start.
+_cryptography = None
+
+
+def _load_cryptography():
+    """Import cryptography on first use. Returns None if it is not available."""
+    global _cryptography
+    if _cryptography is None:
+        try:
+            from cryptography.hazmat.backends import default_backend
+            from cryptography.hazmat.primitives import serialization, hashes
+            from cryptography.hazmat.primitives.asymmetric import padding
+            _cryptography = (default_backend, serialization, hashes, padding)
+        except ImportError:
+            _cryptography = False
+    return _cryptography or None
 sha1_new = partial(hashlib.new, 'sha1')
 
 
@@ -138,8 +149,10 @@ def sha2_rsa_encrypt(password, salt, public_key):
 
     Used for sha256_password and caching_sha2_password.
     """
-    if not _have_cryptography:
+    cryptography = _load_cryptography()
+    if cryptography is None:
         raise RuntimeError("cryptography is required for sha256_password or caching_sha2_password")
+    default_backend, serialization, hashes, padding = cryptography
     message = _xor_password(password + b'\0', salt)
     rsa_key = serialization.load_pem_public_key(public_key, default_backend())
     return rsa_key.encrypt(
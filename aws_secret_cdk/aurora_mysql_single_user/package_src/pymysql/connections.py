@@ -20,7 +20,6 @@ from .charset import charset_by_name, charset_by_id
 from .constants import CLIENT, COMMAND, CR, FIELD_TYPE, SERVER_STATUS
 from . import converters
 from .cursors import Cursor
-from .optionfile import Parser
 from .protocol import (
     dump_packet, MysqlPacket, FieldDescriptorPacket, OKPacketWrapper,
     EOFPacketWrapper, LoadLocalPacketWrapper
@@ -28,20 +27,36 @@ from .protocol import (
 from .util import byte2int, int2byte
 from . import err, VERSION_STRING
 
-try:
-    import ssl
-    SSL_ENABLED = True
-except ImportError:
-    ssl = None
-    SSL_ENABLED = False
-
-try:
-    import getpass
-    DEFAULT_USER = getpass.getuser()
-    del getpass
-except (ImportError, KeyError):
-    # KeyError occurs when there's no entry in OS database for a current user.
-    DEFAULT_USER = None
+# Rarely used modules (ssl, getpass, configparser) are imported on first use
+# to keep the import of this module, i.e. a lambda cold start, cheap.
+ssl = None
+SSL_ENABLED = True  # Turns False on first use if the ssl module is missing.
+
+_default_user = []
+
+
+def _load_ssl():
+    """Import the ssl module on first use. Returns False if it is not available."""
+    global ssl, SSL_ENABLED
+    if ssl is None and SSL_ENABLED:
+        try:
+            import ssl as _ssl
+            ssl = _ssl
+        except ImportError:
+            SSL_ENABLED = False
+    return SSL_ENABLED
+
+
+def _get_default_user():
+    """Name of the current OS user, looked up on first use."""
+    if not _default_user:
+        try:
+            import getpass
+            _default_user.append(getpass.getuser())
+        except (ImportError, KeyError):
+            # KeyError occurs when there's no entry in OS database for a current user.
+            _default_user.append(None)
+    return _default_user[0]
 
 DEBUG = False
 
@@ -217,6 +232,7 @@ class Connection(object):
             if not read_default_group:
                 read_default_group = "client"
 
+            from .optionfile import Parser
             cfg = Parser()
             cfg.read(os.path.expanduser(read_default_file))
 
@@ -246,7 +262,7 @@ class Connection(object):
 
         self.ssl = False
         if ssl:
-            if not SSL_ENABLED:
+            if not _load_ssl():
                 raise NotImplementedError("ssl module not found")
             self.ssl = True
             client_flag |= CLIENT.SSL
@@ -254,7 +270,7 @@ class Connection(object):
 
         self.host = host or "localhost"
         self.port = port or 3306
-        self.user = user or DEFAULT_USER
+        self.user = user or _get_default_user()
         self.password = password or b""
         if isinstance(self.password, text_type):
             self.password = self.password.encode('latin1')
@@ -552,6 +568,62 @@ class Connection(object):
             else:
                 raise
 
+    def change_user(self, user, password="", database=None):
+        """
+        Re-authenticate this connection as another user (COM_CHANGE_USER).
+
+        The server verifies the credentials exactly like on a fresh connection,
+        hence this is a cheap way to check a password without opening a new
+        socket. The session state is reset and session settings requested on
+        construction are applied again.
+
+        :param user: Username to log in as
+        :param password: Password to use.
+        :param database: Database to use, None to not use a particular one.
+        :raise OperationalError: If the server rejects the credentials. The
+            connection may be closed by the server afterwards, check ``open``.
+        """
+        if not self._sock:
+            raise err.InterfaceError("(0, '')")
+
+        if isinstance(user, text_type):
+            user = user.encode(self.encoding)
+        if isinstance(password, text_type):
+            password = password.encode('latin1')
+        if isinstance(database, text_type):
+            database = database.encode(self.encoding)
+
+        previous = (self.user, self.password, self.db)
+        self.user = user
+        self.password = password or b""
+        self.db = database
+
+        try:
+            plugin_name, authresp = self._initial_auth_response()
+
+            # https://dev.mysql.com/doc/internals/en/com-change-user.html
+            data = self.user + b'\0'
+            if self.server_capabilities & CLIENT.SECURE_CONNECTION:
+                data += struct.pack('B', len(authresp)) + authresp
+            else:  # pragma: no cover - not testing against servers without secure auth (>=5.0)
+                data += authresp + b'\0'
+            data += (self.db or b'') + b'\0'
+            data += struct.pack('<H', charset_by_name(self.charset).id)
+            if self.server_capabilities & CLIENT.PLUGIN_AUTH:
+                data += (plugin_name or b'') + b'\0'
+            if self.server_capabilities & CLIENT.CONNECT_ATTRS:
+                data += self._encode_connect_attrs()
+
+            self._execute_command(COMMAND.COM_CHANGE_USER, data)
+            auth_packet = self._finish_authentication(self._read_packet())
+        except BaseException:
+            self.user, self.password, self.db = previous
+            raise
+
+        if auth_packet.is_ok_packet():
+            self.server_status = OKPacketWrapper(auth_packet).server_status
+        self._init_session()
+
     def set_charset(self, charset):
         # Make sure charset is supported.
         encoding = charset_by_name(charset).encoding
@@ -597,19 +669,7 @@ class Connection(object):
 
             self._get_server_information()
             self._request_authentication()
-
-            if self.sql_mode is not None:
-                c = self.cursor()
-                c.execute("SET sql_mode=%s", (self.sql_mode,))
-
-            if self.init_command is not None:
-                c = self.cursor()
-                c.execute(self.init_command)
-                c.close()
-                self.commit()
-
-            if self.autocommit_mode is not None:
-                self.autocommit(self.autocommit_mode)
+            self._init_session()
         except BaseException as e:
             self._rfile = None
             if sock is not None:
@@ -634,6 +694,21 @@ class Connection(object):
             # So just reraise it.
             raise
 
+    def _init_session(self):
+        """Applies session settings requested on construction"""
+        if self.sql_mode is not None:
+            c = self.cursor()
+            c.execute("SET sql_mode=%s", (self.sql_mode,))
+
+        if self.init_command is not None:
+            c = self.cursor()
+            c.execute(self.init_command)
+            c.close()
+            self.commit()
+
+        if self.autocommit_mode is not None:
+            self.autocommit(self.autocommit_mode)
+
     def write_packet(self, payload):
         """Writes an entire "mysql packet" in its entirety to the network
         addings its length and sequence number.
@@ -806,6 +881,32 @@ class Connection(object):
 
         data = data_init + self.user + b'\0'
 
+        plugin_name, authresp = self._initial_auth_response()
+
+        if self.server_capabilities & CLIENT.PLUGIN_AUTH_LENENC_CLIENT_DATA:
+            data += lenenc_int(len(authresp)) + authresp
+        elif self.server_capabilities & CLIENT.SECURE_CONNECTION:
+            data += struct.pack('B', len(authresp)) + authresp
+        else:  # pragma: no cover - not testing against servers without secure auth (>=5.0)
+            data += authresp + b'\0'
+
+        if self.db and self.server_capabilities & CLIENT.CONNECT_WITH_DB:
+            if isinstance(self.db, text_type):
+                self.db = self.db.encode(self.encoding)
+            data += self.db + b'\0'
+
+        if self.server_capabilities & CLIENT.PLUGIN_AUTH:
+            data += (plugin_name or b'') + b'\0'
+
+        if self.server_capabilities & CLIENT.CONNECT_ATTRS:
+            data += self._encode_connect_attrs()
+
+        self.write_packet(data)
+        auth_packet = self._read_packet()
+        self._finish_authentication(auth_packet)
+
+    def _initial_auth_response(self):
+        """Plugin name and auth response sent along with the user name, before the server asks for anything"""
         authresp = b''
         plugin_name = None
 
@@ -833,33 +934,19 @@ class Connection(object):
             else:
                 authresp = b'\0'  # empty password
 
-        if self.server_capabilities & CLIENT.PLUGIN_AUTH_LENENC_CLIENT_DATA:
-            data += lenenc_int(len(authresp)) + authresp
-        elif self.server_capabilities & CLIENT.SECURE_CONNECTION:
-            data += struct.pack('B', len(authresp)) + authresp
-        else:  # pragma: no cover - not testing against servers without secure auth (>=5.0)
-            data += authresp + b'\0'
-
-        if self.db and self.server_capabilities & CLIENT.CONNECT_WITH_DB:
-            if isinstance(self.db, text_type):
-                self.db = self.db.encode(self.encoding)
-            data += self.db + b'\0'
-
-        if self.server_capabilities & CLIENT.PLUGIN_AUTH:
-            data += (plugin_name or b'') + b'\0'
+        return plugin_name, authresp
 
-        if self.server_capabilities & CLIENT.CONNECT_ATTRS:
-            connect_attrs = b''
-            for k, v in self._connect_attrs.items():
-                k = k.encode('utf-8')
-                connect_attrs += struct.pack('B', len(k)) + k
-                v = v.encode('utf-8')
-                connect_attrs += struct.pack('B', len(v)) + v
-            data += struct.pack('B', len(connect_attrs)) + connect_attrs
-
-        self.write_packet(data)
-        auth_packet = self._read_packet()
+    def _encode_connect_attrs(self):
+        connect_attrs = b''
+        for k, v in self._connect_attrs.items():
+            k = k.encode('utf-8')
+            connect_attrs += struct.pack('B', len(k)) + k
+            v = v.encode('utf-8')
+            connect_attrs += struct.pack('B', len(v)) + v
+        return struct.pack('B', len(connect_attrs)) + connect_attrs
 
+    def _finish_authentication(self, auth_packet):
+        """Follows up the first server response to an auth request until the final OK packet"""
         # if authentication method isn't accepted the first byte
         # will have the octet 254
         if auth_packet.is_auth_switch_request():
@@ -886,6 +973,7 @@ class Connection(object):
                 raise err.OperationalError("Received extra packet for auth method %r", self._auth_plugin_name)
 
         if DEBUG: print("Succeed to auth")
+        return auth_packet
 
     def _process_auth(self, plugin_name, auth_packet):
         handler = self._get_auth_plugin_handler(plugin_name)
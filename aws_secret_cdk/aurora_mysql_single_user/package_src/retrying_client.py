@@ -0,0 +1,216 @@
+import collections
+import logging
+import random
+import threading
+import time
+
+from botocore.exceptions import ConnectionClosedError, ConnectTimeoutError, EndpointConnectionError, ReadTimeoutError
+from instrumentation import recorder
+
+logger = logging.getLogger()
+
+# Error codes with which AWS APIs report a request rate above the account or API quota.
+THROTTLING_ERROR_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'SlowDown',
+])
+
+# Error codes of failures which are transient on the service side and safe to retry.
+TRANSIENT_ERROR_CODES = frozenset([
+    'InternalServiceError',
+    'InternalFailure',
+    'ServiceUnavailable',
+    'RequestTimeout',
+    'RequestTimeoutException',
+])
+
+# Failures to reach the service or to read its response. Botocore retries are turned off, hence they are retried here.
+CONNECTION_ERRORS = (
+    EndpointConnectionError,
+    ConnectionClosedError,
+    ReadTimeoutError,
+    ConnectTimeoutError,
+)
+
+# Total number of attempts of a single API call, including the first one.
+MAX_ATTEMPTS = 6
+
+# Backoff before the n-th retry is drawn uniformly from [0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** n)] seconds.
+BASE_BACKOFF = 0.2
+MAX_BACKOFF = 5.0
+
+# Bounds (requests per second) of the client side rate once throttling has been observed.
+MIN_REQUEST_RATE = 1.0
+MAX_REQUEST_RATE = 100.0
+
+# Multiplicative decrease of the request rate on throttling and its additive increase per second of successes.
+RATE_DECREASE_FACTOR = 0.7
+RATE_INCREASE_PER_SECOND = 10.0
+
+# Throttled calls within this many seconds after a rate decrease were sent at the old rate and are not acted on.
+RATE_DECREASE_COOLDOWN = 1.0
+
+
+def error_code(error):
+    """Extracts the AWS error code from a botocore ClientError
+
+    Args:
+        error (Exception): The raised exception
+
+    Returns:
+        string: The error code, or None if the exception does not carry a service response
+
+    """
+    response = getattr(error, 'response', None)
+    if not isinstance(response, dict):
+        return None
+    return response.get('Error', {}).get('Code')
+
+
+class AdaptiveRateLimiter(object):
+    """Container wide token bucket which slows API calls down once the service starts throttling them
+
+    As long as no call is throttled the limiter lets every call through. The first throttled call turns the
+    token bucket on with a rate below the rate at which calls were actually sent. Further throttling lowers the
+    rate again (at most once per RATE_DECREASE_COOLDOWN), while successful calls raise it additively, so
+    concurrent rotations settle just below the quota instead of every one of them retrying on its own. Once
+    the rate climbs back to MAX_REQUEST_RATE the bucket is turned off again.
+
+    """
+    def __init__(self, min_rate=MIN_REQUEST_RATE, max_rate=MAX_REQUEST_RATE):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = None
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._refilled_at = time.time()
+        self._decreased_at = None
+        self._sent = collections.deque()
+
+    @property
+    def limiting(self):
+        return self.rate is not None
+
+    def acquire(self):
+        """Blocks until a call may be sent"""
+        with self._lock:
+            now = time.time()
+            self._record_send(now)
+            if self.rate is None:
+                return
+
+            self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            # Reserve a token even if it is not there yet, waiting callers are served in order.
+            self._tokens -= 1.0
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            with recorder.span('SecretsManager.RateLimited'):
+                time.sleep(wait)
+
+    def on_throttle(self):
+        """Lowers the allowed request rate after a throttled call"""
+        with self._lock:
+            now = time.time()
+            if self.rate is not None and now - self._decreased_at < RATE_DECREASE_COOLDOWN:
+                return
+            self._decreased_at = now
+            sent_rate = self._sent_rate(now)
+            current = sent_rate if self.rate is None else min(self.rate, sent_rate)
+            self.rate = max(self.min_rate, current * RATE_DECREASE_FACTOR)
+            self._tokens = min(self._tokens, 0.0)
+            logger.warning("Secrets manager calls are throttled, limiting them to %.1f per second." % self.rate)
+
+    def on_success(self):
+        """Raises the allowed request rate after a successful call"""
+        with self._lock:
+            if self.rate is None:
+                return
+            self.rate += RATE_INCREASE_PER_SECOND / self.rate
+            if self.rate >= self.max_rate:
+                logger.info("Secrets manager calls are no longer throttled, removing the rate limit.")
+                self.rate = None
+
+    def _record_send(self, now):
+        self._sent.append(now)
+        while self._sent and now - self._sent[0] > 1.0:
+            self._sent.popleft()
+
+    def _sent_rate(self, now):
+        # Calls sent within the last second.
+        while self._sent and now - self._sent[0] > 1.0:
+            self._sent.popleft()
+        return max(self.min_rate, float(len(self._sent)))
+
+
+class RetryingClient(object):
+    """Service client wrapper which retries throttled, transient and connection failures with jittered exponential backoff
+
+    Every call goes through a shared AdaptiveRateLimiter, hence all rotations of a container back off together.
+    Counters of retried and throttled calls are cumulative for the lifetime of the wrapper.
+
+    """
+    def __init__(self, service_client, rate_limiter=None, max_attempts=MAX_ATTEMPTS):
+        self._service_client = service_client
+        self._lock = threading.Lock()
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.max_attempts = max_attempts
+        self.retries = 0
+        self.throttles = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self._service_client, name)
+        if name.startswith('_') or name in ('exceptions', 'meta') or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            return self._call(name, attribute, *args, **kwargs)
+        return call
+
+    def counters(self):
+        """Snapshot of the retry counters
+
+        Returns:
+            dict: Number of retried calls and number of throttled calls
+
+        """
+        with self._lock:
+            return {'Retries': self.retries, 'Throttles': self.throttles}
+
+    def _call(self, name, function, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            self.rate_limiter.acquire()
+            try:
+                response = function(*args, **kwargs)
+            except Exception as e:
+                code = error_code(e) or type(e).__name__
+                throttled = code in THROTTLING_ERROR_CODES
+                if throttled:
+                    self.rate_limiter.on_throttle()
+                if not throttled and code not in TRANSIENT_ERROR_CODES and not isinstance(e, CONNECTION_ERRORS):
+                    raise
+                if attempt >= self.max_attempts:
+                    logger.error("%s failed with %s after %d attempts." % (name, code, attempt))
+                    raise
+
+                with self._lock:
+                    self.retries += 1
+                    if throttled:
+                        self.throttles += 1
+
+                backoff = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (attempt - 1)))
+                logger.warning("%s failed with %s, retrying in %.2f seconds (attempt %d of %d)." % (name, code, backoff, attempt, self.max_attempts))
+                with recorder.span('SecretsManager.Backoff'):
+                    time.sleep(backoff)
+                continue
+
+            self.rate_limiter.on_success()
+            return response
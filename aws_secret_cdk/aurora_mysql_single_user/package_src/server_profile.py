@@ -0,0 +1,123 @@
+import threading
+
+from collections import namedtuple
+from pymysql.constants import CLIENT
+
+# MariaDB prefixes the version it announces in the handshake with this, for the sake of old MySQL clients.
+MARIADB_VERSION_PREFIX = '5.5.5-'
+
+_ServerProfile = namedtuple('ServerProfile', [
+    'version',
+    'capabilities',
+    'auth_plugin',
+    'public_key'
+])
+
+
+class ServerProfile(_ServerProfile):
+    """What a database server announced about itself in the handshake of a connection
+
+    Holds the server version, the capability flags, the default authentication plugin and, once a
+    caching_sha2_password or sha256_password login had to fetch it, the RSA public key of the server.
+
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_connection(cls, conn):
+        """Builds a profile from the handshake data an open connection has already parsed
+
+        Args:
+            conn (Connection): A pymysql.connections.Connection or AsyncConnection object
+
+        Returns:
+            ServerProfile: The server profile
+
+        """
+        version = conn.server_version
+        if version.startswith(MARIADB_VERSION_PREFIX) and 'MariaDB' in version:
+            version = version[len(MARIADB_VERSION_PREFIX):]
+        return cls(version, conn.server_capabilities, conn._auth_plugin_name, conn.server_public_key)
+
+    @property
+    def supports_plugin_auth(self):
+        return bool(self.capabilities & CLIENT.PLUGIN_AUTH)
+
+
+class ServerProfileCache(object):
+    """Container wide server profiles keyed by endpoint
+
+    A profile is recorded from the handshake of the first connection to an endpoint and kept for the life of the
+    container, hence no query is needed to find out the server version and every later login against the same
+    endpoint reuses the server public key instead of asking for it again.
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles = {}
+
+    def get(self, host, port):
+        """Gets the profile of an endpoint
+
+        Args:
+            host (string): The database host
+
+            port (int): The database port
+
+        Returns:
+            ServerProfile: The profile, or None if nothing connected to the endpoint yet
+
+        """
+        with self._lock:
+            return self._profiles.get((host, port))
+
+    def record(self, conn):
+        """Records or refreshes the profile of the endpoint an open connection is connected to
+
+        A server public key learned by an earlier connection is kept if the connection did not need one.
+
+        Args:
+            conn (Connection): A pymysql.connections.Connection or AsyncConnection object
+
+        Returns:
+            ServerProfile: The profile of the endpoint
+
+        """
+        profile = ServerProfile.from_connection(conn)
+        with self._lock:
+            known = self._profiles.get((conn.host, conn.port))
+            if known is not None and profile.public_key is None:
+                profile = profile._replace(public_key=known.public_key)
+            self._profiles[(conn.host, conn.port)] = profile
+        return profile
+
+    def public_key(self, host, port):
+        """Gets the server public key of an endpoint, if a login already fetched it
+
+        Args:
+            host (string): The database host
+
+            port (int): The database port
+
+        Returns:
+            bytes: The PEM encoded public key, or None
+
+        """
+        profile = self.get(host, port)
+        return profile.public_key if profile is not None else None
+
+    def forget_public_key(self, host, port):
+        """Drops the server public key of an endpoint, e.g. after a login with it was rejected
+
+        The server may have been given a new key pair, the next login fetches the key again.
+
+        Args:
+            host (string): The database host
+
+            port (int): The database port
+
+        """
+        with self._lock:
+            profile = self._profiles.get((host, port))
+            if profile is not None and profile.public_key is not None:
+                self._profiles[(host, port)] = profile._replace(public_key=None)
@@ -0,0 +1,48 @@
+import os
+import weakref
+
+from typing import Dict
+from aws_cdk import core
+from aws_cdk.aws_lambda import Code, Runtime
+from aws_secret_cdk.aurora_mysql_single_user.deployment_package import cached_deployment_package
+
+
+class RotationCode:
+    """
+    Process wide cache of the rotation lambda function code asset.
+
+    Every rotation lambda function of a stack shares a single code asset, hence the CDK fingerprints and stages
+    the deployment package once per stack instead of once per secret. A code asset can only be bound to one
+    stack, so there is one per stack. Code assets are keyed by the signature of the deployment package, which
+    changes with the target runtime and whenever the source directory contents change.
+
+    Stacks are only referenced weakly, so the cache itself never keeps the stacks (and apps) of earlier syntheses
+    alive in long running processes such as test suites.
+    """
+    LAMBDA_BACKEND_DEPLOYMENT_PACKAGE = 'package_src'
+
+    __codes: 'weakref.WeakKeyDictionary[core.Stack, Dict[str, Code]]' = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def of(cls, stack: core.Stack, runtime: Runtime) -> Code:
+        """
+        Gets the code asset of the rotation lambda function.
+
+        :param stack: A stack in which the lambda function is created.
+        :param runtime: Runtime of the lambda function.
+
+        :return: The code asset shared by every rotation lambda function of the stack.
+        """
+        # Create rotation lambda functions source code path.
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        path = os.path.join(dir_path, cls.LAMBDA_BACKEND_DEPLOYMENT_PACKAGE)
+
+        # Ship a minimal deployment package built for the target runtime instead of the raw source directory.
+        path, signature = cached_deployment_package(path, runtime.name)
+
+        # Stacks are compared by identity, since construct paths of stacks in different apps may be the same.
+        codes = cls.__codes.setdefault(stack, {})
+        if signature not in codes:
+            codes[signature] = Code.from_asset(path=path)
+
+        return codes[signature]
@@ -1,11 +1,14 @@
 import json
 
-from typing import Optional, Union
+from typing import List, Optional, Tuple, Union
 from aws_cdk import aws_secretsmanager, core, aws_kms, aws_lambda, aws_rds
 from aws_cdk.aws_secretsmanager import SecretStringGenerator
 from aws_cdk.core import SecretValue
 from aws_secret_cdk.aurora_mysql_single_user.secret_rotation import SecretRotation
+from aws_secret_cdk.aurora_mysql_single_user.shared_secret_rotation import SharedSecretRotation
 from aws_secret_cdk.base_secret import BaseSecret
+from aws_secret_cdk.password_policy import PasswordPolicy
+from aws_secret_cdk.performance_profile import PerformanceProfile
 from aws_secret_cdk.vpc_parameters import VPCParameters
 
 
@@ -19,7 +22,13 @@ class Secret(BaseSecret):
             prefix: str,
             vpc_parameters: VPCParameters,
             database: Union[aws_rds.CfnDBInstance, aws_rds.CfnDBCluster],
-            kms_key: Optional[aws_kms.Key] = None
+            kms_key: Optional[aws_kms.Key] = None,
+            password_policy: Optional[PasswordPolicy] = None,
+            additional_endpoints: Optional[List[Tuple[str, int]]] = None,
+            profiling: bool = False,
+            profile_slowest_invocation: bool = False,
+            performance_profile: Optional[PerformanceProfile] = None,
+            shared_rotation: Optional[SharedSecretRotation] = None
     ) -> None:
         """
         Constructor.
@@ -29,9 +38,28 @@ class Secret(BaseSecret):
         :param vpc_parameters: VPC parameters for resource (e.g. lambda rotation function) configuration.
         :param database: A database instance for which this secret should be applied.
         :param kms_key: Custom or managed KMS key for secret encryption.
+        :param password_policy: Rules for passwords generated on every rotation.
+        :param additional_endpoints: (host, port) pairs of other MySQL servers where the same user
+            must have the same password, e.g. replicas which do not replicate users. The password
+            is set on all of them in parallel on every rotation.
+        :param profiling: Record resource usage of every rotation step, see SecretRotation.
+        :param profile_slowest_invocation: Also log a cProfile summary of the slowest rotation step.
+        :param performance_profile: Size, runtime and concurrency of the rotation lambda function,
+            e.g. PerformanceProfile.balanced(), see PerformanceProfile.
+        :param shared_rotation: A rotation lambda function shared with other secrets in the same VPC,
+            subnets and security groups. A dedicated function is created for this secret if not specified.
+            Password policy, profiling and performance profile are then set on the shared function instead.
         """
         super().__init__()
 
+        if shared_rotation is not None:
+            assert password_policy is None, 'Password policy of a shared rotation function must be set on it.'
+            assert not profiling and not profile_slowest_invocation, 'Profiling of a shared rotation function must be set on it.'
+            assert performance_profile is None, 'Performance profile of a shared rotation function must be set on it.'
+
+            if not shared_rotation.matches(vpc_parameters):
+                raise ValueError('Shared rotation function runs in a different VPC, subnets or security groups.')
+
         # This template is sent to a lambda function that executes secret rotation.
         # If you choose to change this template, make sure you change lambda
         # function source code too.
@@ -50,51 +78,88 @@ class Secret(BaseSecret):
         elif isinstance(database, aws_rds.CfnDBCluster):
             template['dbname'] = database.database_name
 
+        if additional_endpoints:
+            template['endpoints'] = [{'host': host, 'port': port} for host, port in additional_endpoints]
+
+        # A shared rotation lambda function does not know the initial password of every database. It is kept in a
+        # separate secret which only the rotation lambda function reads, the secret itself only refers to it.
+        self.initial_password_secret = None
+        if shared_rotation is not None:
+            self.initial_password_secret = aws_secretsmanager.CfnSecret(
+                scope=stack,
+                id=prefix + 'RdsInitialPassword',
+                name=prefix + 'RdsInitialPassword',
+                description=f'The initial database password of {prefix}, read by its rotation lambda function.',
+                kms_key_id=kms_key.key_arn if kms_key else None,
+                secret_string=database.master_user_password
+            )
+            template['initial_password_arn'] = self.initial_password_secret.ref
+
+        # Passwords of a secret follow the same policy from the start. Secrets without a policy keep the generator
+        # they always had, since changing the generator of an existing secret regenerates its value.
+        if shared_rotation is not None:
+            password_policy = shared_rotation.password_policy
+        if password_policy is not None:
+            generate_secret_string = password_policy.secret_string_generator('password', json.dumps(template))
+        else:
+            generate_secret_string = SecretStringGenerator(
+                generate_string_key='password',
+                secret_string_template=json.dumps(template)
+            )
+
         # Create a secret instance.
         self.secret = aws_secretsmanager.Secret(
             scope=stack,
             id=prefix + 'RdsSecret',
             description=f'A secret for {prefix}.',
             encryption_key=kms_key,
-            generate_secret_string=SecretStringGenerator(
-                generate_string_key='password',
-                secret_string_template=json.dumps(template)
-            ),
+            generate_secret_string=generate_secret_string,
             secret_name=prefix + 'RdsSecret'
         )
 
         # Make sure database is fully deployed and configured before creating a secret for it.
         self.secret.node.add_dependency(database)
 
-        # Create a lambda function for secret rotation.
-        self.secret_rotation = SecretRotation(
-            stack=stack,
-            prefix=prefix,
-            secret=self.secret,
-            kms_key=kms_key,
-            vpc_parameters=vpc_parameters,
-            database=database
-        )
-
-        # Make sure secrets manager can invoke this lambda function.
-        self.sm_invoke_permission = aws_lambda.CfnPermission(
-            scope=stack,
-            id=prefix + 'SecretsManagerInvokePermission',
-            action='lambda:InvokeFunction',
-            function_name=self.secret_rotation.rotation_lambda_function.function_name,
-            principal="secretsmanager.amazonaws.com",
-        )
-
-        # Make sure lambda function is created before making its permissions.
-        self.sm_invoke_permission.node.add_dependency(self.secret_rotation.rotation_lambda_function)
+        if shared_rotation is not None:
+            # Let the shared lambda function rotate this secret too.
+            self.secret_rotation = shared_rotation
+            self.secret_rotation.add_secret(self.secret, kms_key)
+            self.secret_rotation.add_secret(self.initial_password_secret, kms_key)
+            self.sm_invoke_permission = shared_rotation.sm_invoke_permission
+        else:
+            # Create a lambda function for secret rotation.
+            self.secret_rotation = SecretRotation(
+                stack=stack,
+                prefix=prefix,
+                secret=self.secret,
+                kms_key=kms_key,
+                vpc_parameters=vpc_parameters,
+                database=database,
+                password_policy=password_policy,
+                profiling=profiling,
+                profile_slowest_invocation=profile_slowest_invocation,
+                performance_profile=performance_profile
+            )
+
+            # Make sure secrets manager can invoke this lambda function.
+            self.sm_invoke_permission = aws_lambda.CfnPermission(
+                scope=stack,
+                id=prefix + 'SecretsManagerInvokePermission',
+                action='lambda:InvokeFunction',
+                function_name=self.secret_rotation.rotation_lambda.function_name,
+                principal="secretsmanager.amazonaws.com",
+            )
+
+            # Make sure lambda function is created before making its permissions.
+            self.sm_invoke_permission.node.add_dependency(self.secret_rotation.rotation_lambda)
 
         # Apply rotation for the secret instance.
-        self.rotation_schedule = aws_secretsmanager.RotationSchedule(
-            scope=stack,
+        self.rotation_schedule = self.create_rotation_schedule(
+            stack=stack,
             id=prefix + 'RotationSchedule',
             secret=self.secret,
-            rotation_lambda=self.secret_rotation.rotation_lambda_function,
-            automatically_after=core.Duration.days(30)
+            rotation_lambda=self.secret_rotation.rotation_lambda,
+            automatically_after_days=30
         )
 
         # Make sure invoke permission for secrets manager is created before creating a schedule.
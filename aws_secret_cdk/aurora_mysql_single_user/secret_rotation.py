@@ -1,11 +1,12 @@
-import os
 import re
 
 from typing import Optional, Union
 from aws_cdk import core, aws_iam, aws_secretsmanager, aws_kms, aws_rds
-from aws_cdk.aws_lambda import Runtime, Code
 from aws_lambda.cloud_formation.lambda_aws_cdk import LambdaFunction
+from aws_secret_cdk.aurora_mysql_single_user.rotation_code import RotationCode
 from aws_secret_cdk.base_secret_rotation import BaseSecretRotation
+from aws_secret_cdk.password_policy import PasswordPolicy
+from aws_secret_cdk.performance_profile import PerformanceProfile
 from aws_secret_cdk.vpc_parameters import VPCParameters
 
 
@@ -13,7 +14,8 @@ class SecretRotation(BaseSecretRotation):
     """
     Class which creates a lambda function responsible for RDS single user secret (password) rotation.
     """
-    LAMBDA_BACKEND_DEPLOYMENT_PACKAGE = 'package_src'
+    # Deprecated, kept for backwards compatibility. The deployment package directory is owned by RotationCode.
+    LAMBDA_BACKEND_DEPLOYMENT_PACKAGE = RotationCode.LAMBDA_BACKEND_DEPLOYMENT_PACKAGE
 
     def __init__(
             self,
@@ -23,6 +25,10 @@ class SecretRotation(BaseSecretRotation):
             vpc_parameters: VPCParameters,
             database: Union[aws_rds.CfnDBInstance, aws_rds.CfnDBCluster],
             kms_key: Optional[aws_kms.IKey] = None,
+            password_policy: Optional[PasswordPolicy] = None,
+            profiling: bool = False,
+            profile_slowest_invocation: bool = False,
+            performance_profile: Optional[PerformanceProfile] = None
     ) -> None:
         """
         Constructor.
@@ -33,9 +39,20 @@ class SecretRotation(BaseSecretRotation):
         :param vpc_parameters: VPC parameters for resource (e.g. lambda rotation function) configuration.
         :param kms_key: Custom or managed KMS key for secret encryption which the
         lambda function should be able to access.
+        :param password_policy: Rules for generated passwords. Passwords are generated by
+        the lambda function itself with default rules if not specified.
+        :param profiling: Record wall time, CPU time and peak memory of every rotation step
+        as metrics, in order to right-size the lambda function. Slows the function down.
+        :param profile_slowest_invocation: Also run every rotation step under cProfile and log
+        the top functions of the slowest one. Has no effect unless profiling is enabled.
+        :param performance_profile: Size, runtime and concurrency of the lambda function.
+        PerformanceProfile.minimal() if not specified.
         """
         super().__init__()
 
+        password_policy = password_policy or PasswordPolicy()
+        performance_profile = performance_profile or PerformanceProfile.minimal()
+
         self.__prefix = prefix + 'SecretRotation'
 
         # Read more about the permissions required to successfully rotate a secret:
@@ -68,18 +85,22 @@ class SecretRotation(BaseSecretRotation):
                 ],
                 effect=aws_iam.Effect.ALLOW,
                 resources=[secret.secret_arn]
-        ),
-            # Not exactly sure about this one.
-            # Despite that, this policy does not impose any security risks.
-            aws_iam.PolicyStatement(
-                actions=[
-                    "secretsmanager:GetRandomPassword"
-                ],
-                effect=aws_iam.Effect.ALLOW,
-                resources=['*']
-            )
+        )
         ]
 
+        if password_policy.use_api:
+            rotation_lambda_role_statements.append(
+                # Passwords are generated by secrets manager instead of the lambda function itself.
+                # GetRandomPassword does not access any resource, hence it can not be restricted to one.
+                aws_iam.PolicyStatement(
+                    actions=[
+                        "secretsmanager:GetRandomPassword"
+                    ],
+                    effect=aws_iam.Effect.ALLOW,
+                    resources=['*']
+                )
+            )
+
         if kms_key is not None:
             rotation_lambda_role_statements.append(
                 # Secrets may be KMS encrypted.
@@ -109,10 +130,6 @@ class SecretRotation(BaseSecretRotation):
             },
         )
 
-        # Create rotation lambda functions source code path.
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        path = os.path.join(dir_path, self.LAMBDA_BACKEND_DEPLOYMENT_PACKAGE)
-
         # Create a lambda function responsible for rds password rotation.
         self.rotation_lambda_function = LambdaFunction(
             scope=stack,
@@ -122,21 +139,30 @@ class SecretRotation(BaseSecretRotation):
                 'This lambda function connects to a given database and changes its password to whatever password was '
                 'provides by AWS SecretsManager.'
             ),
-            memory=128,
-            timeout=60,
+            memory=performance_profile.memory,
+            timeout=performance_profile.timeout,
             handler='lambda_function.lambda_handler',
-            runtime=Runtime.PYTHON_2_7,
+            runtime=performance_profile.runtime,
             role=self.rotation_lambda_role,
             env={
-                'SECRETS_MANAGER_ENDPOINT': f'https://secretsmanager.{stack.region}.amazonaws.com',
-                'INITIAL_DATABASE_PASSWORD': database.master_user_password
+                'SECRETS_MANAGER_ENDPOINT': vpc_parameters.secrets_manager_endpoint_url(stack),
+                'INITIAL_DATABASE_PASSWORD': database.master_user_password,
+                **password_policy.environment,
+                'PROFILING_ENABLED': str(profiling).lower(),
+                'PROFILING_CPROFILE': str(profile_slowest_invocation).lower()
             },
             security_groups=vpc_parameters.rotation_lambda_security_groups,
             subnets=vpc_parameters.rotation_lambda_subnets,
             vpc=vpc_parameters.rotation_lambda_vpc,
-            source_code=Code.from_asset(path=path)
+            # Every rotation lambda function of the stack shares the same code asset.
+            source_code=RotationCode.of(stack, performance_profile.runtime),
+            **performance_profile.function_options
         ).lambda_function
 
+        # Secrets manager invokes the alias with provisioned concurrency, if there is one.
+        self.rotation_lambda_alias = performance_profile.create_alias(stack, self.__prefix, self.rotation_lambda_function)
+        self.rotation_lambda = self.rotation_lambda_alias or self.rotation_lambda_function
+
     @staticmethod
     def __convert(name: str) -> str:
         """
@@ -0,0 +1,219 @@
+from typing import Optional, Union
+from aws_cdk import core, aws_iam, aws_secretsmanager, aws_kms, aws_lambda
+from aws_lambda.cloud_formation.lambda_aws_cdk import LambdaFunction
+from aws_secret_cdk.aurora_mysql_single_user.rotation_code import RotationCode
+from aws_secret_cdk.base_secret_rotation import BaseSecretRotation
+from aws_secret_cdk.password_policy import PasswordPolicy
+from aws_secret_cdk.performance_profile import PerformanceProfile
+from aws_secret_cdk.vpc_parameters import VPCParameters
+
+
+class SharedSecretRotation(BaseSecretRotation):
+    """
+    Class which creates a single lambda function responsible for RDS single user secret (password) rotation
+    of many secrets which run in the same VPC, subnets and security groups.
+    """
+    # Secrets rotated by the shared lambda function are tagged with this key and the prefix of the function.
+    ROTATION_FUNCTION_TAG = 'aws-secret-cdk:rotation-function'
+
+    def __init__(
+            self,
+            stack: core.Stack,
+            prefix: str,
+            vpc_parameters: VPCParameters,
+            password_policy: Optional[PasswordPolicy] = None,
+            profiling: bool = False,
+            profile_slowest_invocation: bool = False,
+            performance_profile: Optional[PerformanceProfile] = None
+    ) -> None:
+        """
+        Constructor.
+
+        :param stack: A stack in which resources should be created.
+        :param prefix: A prefix to give for every resource.
+        :param vpc_parameters: VPC parameters for resource (e.g. lambda rotation function) configuration.
+        Every secret rotated by this function must use the same VPC, subnets and security groups.
+        :param password_policy: Rules for generated passwords of every secret rotated by this function.
+        Passwords are generated by the lambda function itself with default rules if not specified.
+        :param profiling: Record wall time, CPU time and peak memory of every rotation step
+        as metrics, in order to right-size the lambda function. Slows the function down.
+        :param profile_slowest_invocation: Also run every rotation step under cProfile and log
+        the top functions of the slowest one. Has no effect unless profiling is enabled.
+        :param performance_profile: Size, runtime and concurrency of the lambda function.
+        PerformanceProfile.minimal() if not specified.
+        """
+        super().__init__()
+
+        password_policy = password_policy or PasswordPolicy()
+        performance_profile = performance_profile or PerformanceProfile.minimal()
+
+        self.__prefix = prefix + 'SharedSecretRotation'
+        self.__kms_key_arns = set()
+        self.vpc_parameters = vpc_parameters
+        self.password_policy = password_policy
+
+        # Read more about the permissions required to successfully rotate a secret:
+        # https://docs.aws.amazon.com/secretsmanager/latest/userguide//rotating-secrets-required-permissions.html
+        rotation_lambda_role_statements = [
+            # We enforce lambdas to run in a VPC.
+            # Therefore lambdas need some network interface permissions.
+            aws_iam.PolicyStatement(
+                actions=[
+                    'ec2:CreateNetworkInterface',
+                    'ec2:ModifyNetworkInterface',
+                    'ec2:DeleteNetworkInterface',
+                    'ec2:AttachNetworkInterface',
+                    'ec2:DetachNetworkInterface',
+                    'ec2:DescribeNetworkInterfaces',
+                    "logs:CreateLogGroup",
+                    "logs:CreateLogStream",
+                    "logs:PutLogEvents",
+                ],
+                effect=aws_iam.Effect.ALLOW,
+                resources=['*']
+            ),
+            # Lambda needs to call secrets manager to get secret value in order to update database password.
+            # A single statement covers every secret tagged for this function, instead of listing every secret arn.
+            # Rotation schedules add no statements either (see BaseSecret.create_rotation_schedule), hence the policy
+            # only grows with the number of distinct KMS keys of the secrets, by one statement per key.
+            aws_iam.PolicyStatement(
+                actions=[
+                    "secretsmanager:DescribeSecret",
+                    "secretsmanager:GetSecretValue",
+                    "secretsmanager:PutSecretValue",
+                    "secretsmanager:UpdateSecretVersionStage"
+                ],
+                effect=aws_iam.Effect.ALLOW,
+                resources=['*'],
+                conditions={
+                    'StringEquals': {
+                        f'secretsmanager:ResourceTag/{self.ROTATION_FUNCTION_TAG}': self.__prefix
+                    }
+                }
+            )
+        ]
+
+        if password_policy.use_api:
+            rotation_lambda_role_statements.append(
+                # Passwords are generated by secrets manager instead of the lambda function itself.
+                # GetRandomPassword does not access any resource, hence it can not be restricted to one.
+                aws_iam.PolicyStatement(
+                    actions=[
+                        "secretsmanager:GetRandomPassword"
+                    ],
+                    effect=aws_iam.Effect.ALLOW,
+                    resources=['*']
+                )
+            )
+
+        self.rotation_lambda_role = aws_iam.Role(
+            scope=stack,
+            id=self.__prefix + 'LambdaRole',
+            role_name=self.__prefix + 'LambdaRole',
+            assumed_by=aws_iam.CompositePrincipal(
+                aws_iam.ServicePrincipal("lambda.amazonaws.com"),
+                aws_iam.ServicePrincipal("secretsmanager.amazonaws.com"),
+            ),
+            inline_policies={
+                self.__prefix + 'LambdaPolicy': aws_iam.PolicyDocument(
+                    statements=rotation_lambda_role_statements
+                )
+            },
+        )
+
+        # Create a lambda function responsible for rds password rotation of every secret added to it.
+        # The initial database password differs from secret to secret, hence every secret refers to its own.
+        self.rotation_lambda_function = LambdaFunction(
+            scope=stack,
+            prefix=self.__prefix,
+            # Lambda function descriptions are limited to 256 characters.
+            description=(
+                'A lambda function that is utilized by AWS SecretsManager to rotate many secrets. It connects to '
+                'the database of a secret and changes its password to whatever password was provided by AWS '
+                'SecretsManager.'
+            ),
+            memory=performance_profile.memory,
+            timeout=performance_profile.timeout,
+            handler='lambda_function.lambda_handler',
+            runtime=performance_profile.runtime,
+            role=self.rotation_lambda_role,
+            env={
+                'SECRETS_MANAGER_ENDPOINT': vpc_parameters.secrets_manager_endpoint_url(stack),
+                **password_policy.environment,
+                'PROFILING_ENABLED': str(profiling).lower(),
+                'PROFILING_CPROFILE': str(profile_slowest_invocation).lower(),
+                # Only a shared function may access other secrets of a batch rotation.
+                'SHARED_ROTATION': 'true'
+            },
+            security_groups=vpc_parameters.rotation_lambda_security_groups,
+            subnets=vpc_parameters.rotation_lambda_subnets,
+            vpc=vpc_parameters.rotation_lambda_vpc,
+            # Every rotation lambda function of the stack shares the same code asset.
+            source_code=RotationCode.of(stack, performance_profile.runtime),
+            **performance_profile.function_options
+        ).lambda_function
+
+        # Secrets manager invokes the alias with provisioned concurrency, if there is one.
+        self.rotation_lambda_alias = performance_profile.create_alias(stack, self.__prefix, self.rotation_lambda_function)
+        self.rotation_lambda = self.rotation_lambda_alias or self.rotation_lambda_function
+
+        # Make sure secrets manager can invoke this lambda function, on behalf of any secret.
+        self.sm_invoke_permission = aws_lambda.CfnPermission(
+            scope=stack,
+            id=self.__prefix + 'SecretsManagerInvokePermission',
+            action='lambda:InvokeFunction',
+            function_name=self.rotation_lambda.function_name,
+            principal="secretsmanager.amazonaws.com",
+        )
+
+        # Make sure lambda function is created before making its permissions.
+        self.sm_invoke_permission.node.add_dependency(self.rotation_lambda)
+
+    def add_secret(
+            self,
+            secret: Union[aws_secretsmanager.Secret, aws_secretsmanager.CfnSecret],
+            kms_key: Optional[aws_kms.IKey] = None
+    ) -> None:
+        """
+        Allows the lambda function to rotate a secret.
+
+        :param secret: A secret instance which the lambda function should be able to access.
+        :param kms_key: Custom or managed KMS key for secret encryption which the
+        lambda function should be able to access.
+        """
+        core.Tags.of(secret).add(self.ROTATION_FUNCTION_TAG, self.__prefix)
+
+        # Secrets may be KMS encrypted.
+        # Therefore the lambda function should be able to get this value.
+        # Secrets sharing a key share a statement.
+        if kms_key is not None and kms_key.key_arn not in self.__kms_key_arns:
+            self.__kms_key_arns.add(kms_key.key_arn)
+            self.rotation_lambda_role.add_to_policy(
+                aws_iam.PolicyStatement(
+                    actions=[
+                        'kms:GenerateDataKey',
+                        'kms:Decrypt',
+                    ],
+                    effect=aws_iam.Effect.ALLOW,
+                    resources=[kms_key.key_arn],
+                )
+            )
+
+    def matches(self, vpc_parameters: VPCParameters) -> bool:
+        """
+        Tells whether a secret with given VPC parameters can be rotated by this lambda function.
+
+        :param vpc_parameters: VPC parameters of the secret.
+
+        :return: True if the VPC, subnets and security groups are the same as the ones of the lambda function.
+        """
+        if vpc_parameters is self.vpc_parameters:
+            return True
+
+        return (
+            vpc_parameters.rotation_lambda_vpc is self.vpc_parameters.rotation_lambda_vpc and
+            {id(sg) for sg in vpc_parameters.rotation_lambda_security_groups} ==
+            {id(sg) for sg in self.vpc_parameters.rotation_lambda_security_groups} and
+            {id(subnet) for subnet in vpc_parameters.rotation_lambda_subnets} ==
+            {id(subnet) for subnet in self.vpc_parameters.rotation_lambda_subnets}
+        )
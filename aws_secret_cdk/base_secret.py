@@ -1,6 +1,40 @@
 from abc import ABC
+from aws_cdk import aws_secretsmanager, core, aws_lambda
 
 
 class BaseSecret(ABC):
     def __init__(self):
         pass
+
+    @staticmethod
+    def create_rotation_schedule(
+            stack: core.Stack,
+            id: str,
+            secret: aws_secretsmanager.ISecret,
+            rotation_lambda: aws_lambda.IFunction,
+            automatically_after_days: int = 30
+    ) -> aws_secretsmanager.CfnRotationSchedule:
+        """
+        Applies rotation to a secret.
+
+        Unlike aws_secretsmanager.RotationSchedule, the schedule does not add statements to the policy
+        of the rotation lambda function, which is given every permission it needs by its own role. The schedule
+        is created at the path of a RotationSchedule with the same id, hence its logical id stays the same.
+
+        :param stack: A stack in which resources should be created.
+        :param id: Id of the rotation schedule.
+        :param secret: A secret to rotate.
+        :param rotation_lambda: A lambda function (or its alias) which rotates the secret.
+        :param automatically_after_days: Number of days between rotations.
+
+        :return: Rotation schedule of the secret.
+        """
+        return aws_secretsmanager.CfnRotationSchedule(
+            scope=core.Construct(stack, id),
+            id='Resource',
+            secret_id=secret.secret_arn,
+            rotation_lambda_arn=rotation_lambda.function_arn,
+            rotation_rules=aws_secretsmanager.CfnRotationSchedule.RotationRulesProperty(
+                automatically_after_days=automatically_after_days
+            )
+        )
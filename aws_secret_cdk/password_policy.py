@@ -0,0 +1,93 @@
+import json
+
+from typing import Dict
+from aws_cdk.aws_secretsmanager import SecretStringGenerator
+
+
+class PasswordPolicy:
+    """
+    Rules for passwords generated by a secret rotation lambda function.
+
+    By default passwords are generated inside the lambda function. Set use_api to generate them
+    with SecretsManager GetRandomPassword API instead, which costs an API call per rotation.
+    """
+    def __init__(
+            self,
+            length: int = 32,
+            exclude_characters: str = '/@"\'\\',
+            exclude_numbers: bool = False,
+            exclude_punctuation: bool = False,
+            exclude_uppercase: bool = False,
+            exclude_lowercase: bool = False,
+            include_space: bool = False,
+            require_each_included_type: bool = True,
+            use_api: bool = False
+    ) -> None:
+        """
+        Constructor.
+
+        :param length: Length of a password.
+        :param exclude_characters: Characters which must never be part of a password.
+        :param exclude_numbers: Do not use numbers.
+        :param exclude_punctuation: Do not use punctuation characters.
+        :param exclude_uppercase: Do not use uppercase letters.
+        :param exclude_lowercase: Do not use lowercase letters.
+        :param include_space: Use the space character.
+        :param require_each_included_type: Use at least one character of every included type.
+        :param use_api: Generate passwords with SecretsManager GetRandomPassword API instead of locally.
+        """
+        assert length > 0, 'Password length must be positive.'
+
+        self.length = length
+        self.exclude_characters = exclude_characters
+        self.exclude_numbers = exclude_numbers
+        self.exclude_punctuation = exclude_punctuation
+        self.exclude_uppercase = exclude_uppercase
+        self.exclude_lowercase = exclude_lowercase
+        self.include_space = include_space
+        self.require_each_included_type = require_each_included_type
+        self.use_api = use_api
+
+    @property
+    def environment(self) -> Dict[str, str]:
+        """
+        Lambda function environment variables which pass this policy to the rotation code.
+        """
+        # Keys match SecretsManager GetRandomPassword API parameters.
+        policy = {
+            'PasswordLength': self.length,
+            'ExcludeCharacters': self.exclude_characters,
+            'ExcludeNumbers': self.exclude_numbers,
+            'ExcludePunctuation': self.exclude_punctuation,
+            'ExcludeUppercase': self.exclude_uppercase,
+            'ExcludeLowercase': self.exclude_lowercase,
+            'IncludeSpace': self.include_space,
+            'RequireEachIncludedType': self.require_each_included_type
+        }
+
+        return {
+            'PASSWORD_POLICY': json.dumps(policy, sort_keys=True),
+            'PASSWORD_GENERATOR': 'api' if self.use_api else 'local'
+        }
+
+    def secret_string_generator(self, generate_string_key: str, secret_string_template: str) -> SecretStringGenerator:
+        """
+        Generator of the password a secret is created with, following this policy.
+
+        :param generate_string_key: The key of the generated password in the secret JSON.
+        :param secret_string_template: The secret JSON without the password.
+
+        :return: Secret string generator of the secret.
+        """
+        return SecretStringGenerator(
+            generate_string_key=generate_string_key,
+            secret_string_template=secret_string_template,
+            password_length=self.length,
+            exclude_characters=self.exclude_characters or None,
+            exclude_numbers=self.exclude_numbers,
+            exclude_punctuation=self.exclude_punctuation,
+            exclude_uppercase=self.exclude_uppercase,
+            exclude_lowercase=self.exclude_lowercase,
+            include_space=self.include_space,
+            require_each_included_type=self.require_each_included_type
+        )
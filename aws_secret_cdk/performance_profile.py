@@ -0,0 +1,142 @@
+from typing import Any, Dict, Optional
+from aws_cdk import core, aws_lambda
+from aws_cdk.aws_lambda import Runtime
+
+
+class PerformanceProfile:
+    """
+    Size, runtime and concurrency of a secret rotation lambda function.
+
+    Lambda assigns CPU in proportion to memory, hence more memory also makes password hashing during
+    database logins faster. Use one of the presets, or create a profile for anything in between.
+    """
+    X86_64 = 'x86_64'
+    ARM_64 = 'arm64'
+
+    def __init__(
+            self,
+            memory: int = 128,
+            timeout: int = 60,
+            runtime: Runtime = Runtime.PYTHON_2_7,
+            architecture: str = X86_64,
+            reserved_concurrency: Optional[int] = None,
+            provisioned_concurrency: Optional[int] = None,
+            alias_name: str = 'live'
+    ) -> None:
+        """
+        Constructor.
+
+        :param memory: Memory of the lambda function in megabytes.
+        :param timeout: Seconds after which a lambda function invocation is halted.
+        :param runtime: Python runtime of the lambda function.
+        :param architecture: Instruction set of the lambda function, x86_64 or arm64. arm64 requires a
+        Python 3.8 or later runtime and aws-cdk 1.124.0 or later.
+        :param reserved_concurrency: Maximum number of concurrent invocations, e.g. to protect the
+        SecretsManager API quota and the databases during mass rotations. Unreserved if not specified.
+        :param provisioned_concurrency: Number of lambda function instances kept initialized, so rotations
+        do not cold start. Secrets are then rotated through an alias of the lambda function.
+        :param alias_name: Name of the alias with provisioned concurrency.
+        """
+        assert 128 <= memory <= 10240, 'Memory must be between 128 and 10240 megabytes.'
+        assert 1 <= timeout <= 900, 'Timeout must be between 1 and 900 seconds.'
+        assert architecture in [self.X86_64, self.ARM_64], f'Unsupported architecture {architecture}.'
+        assert architecture == self.X86_64 or runtime.name not in ['python2.7', 'python3.6', 'python3.7'], (
+            f'{runtime.name} runtime does not support {architecture} architecture.'
+        )
+
+        if reserved_concurrency is not None and provisioned_concurrency:
+            assert provisioned_concurrency <= reserved_concurrency, (
+                'Provisioned concurrency must not exceed reserved concurrency.'
+            )
+
+        self.memory = memory
+        self.timeout = timeout
+        self.runtime = runtime
+        self.architecture = architecture
+        self.reserved_concurrency = reserved_concurrency
+        self.provisioned_concurrency = provisioned_concurrency
+        self.alias_name = alias_name
+
+    @classmethod
+    def minimal(cls) -> 'PerformanceProfile':
+        """
+        The smallest and cheapest lambda function. Good enough to rotate a few secrets on a schedule.
+        """
+        return cls()
+
+    @classmethod
+    def balanced(cls, architecture: str = X86_64) -> 'PerformanceProfile':
+        """
+        A Python 3 lambda function with enough CPU share for quick logins at a low cost.
+
+        :param architecture: Instruction set of the lambda function. arm64 is cheaper, but requires
+        aws-cdk 1.124.0 or later.
+        """
+        return cls(
+            memory=512,
+            timeout=60,
+            runtime=Runtime.PYTHON_3_8,
+            architecture=architecture
+        )
+
+    @classmethod
+    def mass_rotation(cls, architecture: str = X86_64) -> 'PerformanceProfile':
+        """
+        A lambda function sized for rotating many secrets at once, e.g. after an incident. Concurrency is
+        capped to stay within the SecretsManager API quota and warm instances are kept, so rotations do
+        not cold start. Provisioned concurrency is billed whether it is used or not.
+
+        :param architecture: Instruction set of the lambda function. arm64 is cheaper, but requires
+        aws-cdk 1.124.0 or later.
+        """
+        return cls(
+            memory=1024,
+            timeout=300,
+            runtime=Runtime.PYTHON_3_8,
+            architecture=architecture,
+            reserved_concurrency=10,
+            provisioned_concurrency=2
+        )
+
+    @property
+    def function_options(self) -> Dict[str, Any]:
+        """
+        Lambda function parameters of this profile, other than memory, timeout and runtime.
+        """
+        options = {}
+
+        if self.reserved_concurrency is not None:
+            options['reserved_concurrent_executions'] = self.reserved_concurrency
+
+        # x86_64 is the default, the parameter only exists in recent aws-cdk versions.
+        if self.architecture == self.ARM_64:
+            from aws_cdk.aws_lambda import Architecture
+            options['architecture'] = Architecture.ARM_64
+
+        return options
+
+    def create_alias(
+            self,
+            scope: core.Construct,
+            prefix: str,
+            function: aws_lambda.Function
+    ) -> Optional[aws_lambda.Alias]:
+        """
+        Creates an alias with provisioned concurrency, if this profile has any.
+
+        :param scope: A scope in which the alias should be created.
+        :param prefix: A prefix to give for the alias.
+        :param function: The lambda function.
+
+        :return: The alias, or None if this profile has no provisioned concurrency.
+        """
+        if not self.provisioned_concurrency:
+            return None
+
+        return aws_lambda.Alias(
+            scope=scope,
+            id=prefix + 'LambdaAlias',
+            alias_name=self.alias_name,
+            version=function.current_version,
+            provisioned_concurrent_executions=self.provisioned_concurrency
+        )
@@ -0,0 +1,284 @@
+"""
+Runtime cache of secrets for applications which consume secrets created by this library.
+
+Unlike the rest of this package, this module does not depend on aws-cdk. It needs boto3, unless a
+SecretsManager client is given.
+
+Usage:
+    cache = SecretCache(ttl=300)
+    credentials = cache.get_secret_dict(rds_secret_name('MyResourcesPrefix'))
+"""
+import json
+import logging
+import sys
+import threading
+import time
+
+from typing import Any, Callable, Dict, Optional, TextIO, Tuple
+
+logger = logging.getLogger(__name__)
+
+AWS_CURRENT = 'AWSCURRENT'
+AWS_PREVIOUS = 'AWSPREVIOUS'
+
+# Counters kept by a cache, published as metrics of the same name.
+COUNTERS = ['Hits', 'Misses', 'CoalescedMisses', 'Refreshes', 'RefreshErrors', 'ApiCalls']
+
+
+def rds_secret_name(prefix: str, multi_user: bool = False) -> str:
+    """
+    Name of a secret created by aurora_mysql_single_user.secret.Secret or aurora_mysql_multiuser_user.secret.Secret.
+
+    :param prefix: The prefix the secret was created with.
+    :param multi_user: Whether it is a multi user (alternating users) secret.
+
+    :return: The secret name.
+    """
+    return prefix + ('RdsMultiUserSecret' if multi_user else 'RdsSecret')
+
+
+class _Entry:
+    """
+    A cached get_secret_value response.
+    """
+    def __init__(self, response: Dict[str, Any], fetched_at: float, ttl: float, refresh_ahead: float) -> None:
+        self.response = response
+        self.expires_at = fetched_at + ttl
+        self.refresh_at = fetched_at + ttl * (1.0 - refresh_ahead)
+        self.refreshing = False
+
+
+class _Load:
+    """
+    An API call in flight, which every concurrent miss of the same secret version waits for.
+    """
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.entry: Optional[_Entry] = None
+        self.error: Optional[BaseException] = None
+
+
+class SecretCache:
+    """
+    Thread-safe in-memory cache of secret values, keyed by secret id and version stage.
+
+    A cached value is served for ttl seconds. Once the last refresh_ahead fraction of its time to live
+    has started, the first read starts refreshing it in a background thread and keeps serving the cached
+    value meanwhile, hence a secret which is read regularly never expires on the request path. Concurrent
+    misses of the same secret version wait for a single API call. A failed background refresh is retried
+    by a read after REFRESH_RETRY_SECONDS, the cached value is served until it expires.
+
+    Every secret version changes stages on rotation, hence once a refresh finds a new AWSCURRENT version,
+    every other cached stage of the secret is dropped. Applications should call refresh when the cached
+    credentials stop working, e.g. right after a single user rotation.
+    """
+    # Seconds before a failed background refresh is attempted again.
+    REFRESH_RETRY_SECONDS = 5.0
+
+    def __init__(
+            self,
+            client: Any = None,
+            ttl: float = 300.0,
+            refresh_ahead: float = 0.2,
+            clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """
+        Constructor.
+
+        :param client: A boto3 SecretsManager client. Created with the default session if not given.
+        :param ttl: Seconds a cached value is served for.
+        :param refresh_ahead: Fraction of the time to live, at the end of which a read refreshes the value
+        in the background. 0 disables background refreshes.
+        :param clock: Monotonic time source, in seconds.
+        """
+        assert ttl > 0, 'Time to live must be positive.'
+        assert 0 <= refresh_ahead < 1, 'Refresh ahead must be a fraction of the time to live.'
+
+        if client is None:
+            import boto3
+            client = boto3.client('secretsmanager')
+
+        self.client = client
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.clock = clock
+
+        self.__lock = threading.Lock()
+        self.__entries: Dict[Tuple[str, str], _Entry] = {}
+        self.__loads: Dict[Tuple[str, str], _Load] = {}
+        self.__counters = {name: 0 for name in COUNTERS}
+        self.__published = dict(self.__counters)
+
+    def get_secret_value(self, secret_id: str, version_stage: str = AWS_CURRENT) -> Dict[str, Any]:
+        """
+        Gets a secret version, from the cache if possible.
+
+        :param secret_id: The secret name or arn.
+        :param version_stage: The stage of the secret version, e.g. AWSCURRENT or AWSPREVIOUS.
+
+        :return: The get_secret_value response. It is shared between callers and must be treated as read only.
+        """
+        key = (secret_id, version_stage)
+        now = self.clock()
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and now < entry.expires_at:
+                self.__counters['Hits'] += 1
+                refresh = self.refresh_ahead > 0 and now >= entry.refresh_at and not entry.refreshing
+                if refresh:
+                    entry.refreshing = True
+            else:
+                refresh = False
+                entry = None
+
+        if entry is None:
+            return self.__load(key, miss=True).response
+
+        if refresh:
+            thread = threading.Thread(target=self.__refresh_in_background, args=(key, entry), daemon=True)
+            thread.start()
+
+        return entry.response
+
+    def get_secret_string(self, secret_id: str, version_stage: str = AWS_CURRENT) -> str:
+        """
+        Gets the string value of a secret version, from the cache if possible.
+
+        :param secret_id: The secret name or arn.
+        :param version_stage: The stage of the secret version.
+
+        :return: The SecretString of the secret version.
+        """
+        return self.get_secret_value(secret_id, version_stage)['SecretString']
+
+    def get_secret_dict(self, secret_id: str, version_stage: str = AWS_CURRENT) -> Dict[str, Any]:
+        """
+        Gets the JSON value of a secret version, e.g. database credentials, from the cache if possible.
+
+        :param secret_id: The secret name or arn.
+        :param version_stage: The stage of the secret version.
+
+        :return: A new dictionary parsed from the SecretString of the secret version.
+        """
+        return json.loads(self.get_secret_string(secret_id, version_stage))
+
+    def refresh(self, secret_id: str, version_stage: str = AWS_CURRENT) -> Dict[str, Any]:
+        """
+        Fetches a secret version again, e.g. when the cached credentials are rejected after a rotation.
+        Concurrent refreshes of the same secret version share a single API call.
+
+        :param secret_id: The secret name or arn.
+        :param version_stage: The stage of the secret version.
+
+        :return: The get_secret_value response.
+        """
+        return self.__load((secret_id, version_stage), miss=False).response
+
+    def invalidate(self, secret_id: Optional[str] = None) -> None:
+        """
+        Drops cached values.
+
+        :param secret_id: The secret name or arn to drop every stage of. Everything is dropped if not given.
+        """
+        with self.__lock:
+            if secret_id is None:
+                self.__entries.clear()
+            else:
+                for key in [key for key in self.__entries if key[0] == secret_id]:
+                    del self.__entries[key]
+
+    def statistics(self) -> Dict[str, int]:
+        """
+        Counters of this cache since it was created.
+
+        :return: Hits, Misses, CoalescedMisses (misses which waited for another API call), Refreshes,
+        RefreshErrors and ApiCalls.
+        """
+        with self.__lock:
+            return dict(self.__counters)
+
+    def publish_statistics(self, namespace: str = 'AwsSecretCdk/SecretCache', stream: Optional[TextIO] = None) -> None:
+        """
+        Writes the counters accumulated since the last call as a CloudWatch embedded metric format document,
+        which the CloudWatch agent and AWS Lambda turn into metrics. Call it periodically.
+
+        :param namespace: CloudWatch metrics namespace.
+        :param stream: Where to write the document to, standard output by default.
+        """
+        with self.__lock:
+            deltas = {name: self.__counters[name] - self.__published[name] for name in COUNTERS}
+            self.__published = dict(self.__counters)
+
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [[]],
+                    'Metrics': [{'Name': name, 'Unit': 'Count'} for name in COUNTERS]
+                }]
+            },
+            **deltas
+        }
+
+        stream = stream or sys.stdout
+        stream.write(json.dumps(document, separators=(',', ':')) + '\n')
+        stream.flush()
+
+    def __load(self, key: Tuple[str, str], miss: bool) -> _Entry:
+        with self.__lock:
+            load = self.__loads.get(key)
+            owner = load is None
+            if owner:
+                load = self.__loads[key] = _Load()
+            if miss:
+                self.__counters['Misses' if owner else 'CoalescedMisses'] += 1
+
+        if not owner:
+            load.done.wait()
+            if load.error is not None:
+                raise load.error
+            return load.entry
+
+        try:
+            load.entry = self.__fetch(key)
+            return load.entry
+        except BaseException as e:
+            load.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__loads[key]
+            load.done.set()
+
+    def __fetch(self, key: Tuple[str, str]) -> _Entry:
+        secret_id, version_stage = key
+        with self.__lock:
+            self.__counters['ApiCalls'] += 1
+
+        response = self.client.get_secret_value(SecretId=secret_id, VersionStage=version_stage)
+        entry = _Entry(response, self.clock(), self.ttl, self.refresh_ahead)
+
+        with self.__lock:
+            previous = self.__entries.get(key)
+            # A new current version means every other version of the secret may have changed stages.
+            if version_stage == AWS_CURRENT and previous is not None and previous.response.get('VersionId') != response.get('VersionId'):
+                for other in [other for other in self.__entries if other[0] == secret_id and other != key]:
+                    del self.__entries[other]
+            self.__entries[key] = entry
+
+        return entry
+
+    def __refresh_in_background(self, key: Tuple[str, str], entry: _Entry) -> None:
+        try:
+            self.__load(key, miss=False)
+            with self.__lock:
+                self.__counters['Refreshes'] += 1
+        except Exception as e:
+            # The cached value is served until it expires, a later read retries.
+            with self.__lock:
+                entry.refreshing = False
+                entry.refresh_at = self.clock() + self.REFRESH_RETRY_SECONDS
+                self.__counters['RefreshErrors'] += 1
+            logger.warning('Refreshing secret %s (%s) failed: %s: %s', key[0], key[1], type(e).__name__, e)
@@ -1,16 +1,25 @@
-from typing import List
-from aws_cdk.aws_ec2 import Vpc, SecurityGroup, Subnet
+from typing import List, Optional
+from aws_cdk import core
+from aws_cdk.aws_ec2 import (
+    Vpc, SecurityGroup, Subnet, SubnetSelection, IInterfaceVpcEndpoint, InterfaceVpcEndpoint,
+    InterfaceVpcEndpointAwsService
+)
 
 
 class VPCParameters:
     """
     Parameters class for resources configuration to run in a VPC.
     """
+    # Id of the SecretsManager interface VPC endpoint within the VPC construct.
+    SECRETS_MANAGER_ENDPOINT_ID = 'SecretsManagerEndpoint'
+
     def __init__(
             self,
             rotation_lambda_vpc: Vpc,
             rotation_lambda_security_groups: List[SecurityGroup],
-            rotation_lambda_subnets: List[Subnet]
+            rotation_lambda_subnets: List[Subnet],
+            create_secrets_manager_endpoint: bool = False,
+            secrets_manager_endpoint: Optional[IInterfaceVpcEndpoint] = None
     ) -> None:
         """
         Constructor.
@@ -18,7 +27,68 @@ class VPCParameters:
         :param rotation_lambda_vpc: A VPC in which a secrets rotation lambda function will be deployed to.
         :param rotation_lambda_security_groups: Security groups to attach to a rotation lambda function.
         :param rotation_lambda_subnets: Subnets in which a rotation lambda function can operate.
+        :param create_secrets_manager_endpoint: Create a SecretsManager interface VPC endpoint with private DNS
+        in the rotation lambda function subnets, so the function reaches SecretsManager without a NAT gateway.
+        A single endpoint is created per VPC, however many secrets use it.
+        :param secrets_manager_endpoint: An existing SecretsManager interface VPC endpoint to use instead.
         """
+        assert not (create_secrets_manager_endpoint and secrets_manager_endpoint), (
+            'Either create a SecretsManager endpoint or use an existing one, not both.'
+        )
+
         self.rotation_lambda_vpc = rotation_lambda_vpc
         self.rotation_lambda_security_groups = rotation_lambda_security_groups
         self.rotation_lambda_subnets = rotation_lambda_subnets
+        self.create_secrets_manager_endpoint = create_secrets_manager_endpoint
+        self.secrets_manager_endpoint = secrets_manager_endpoint
+        self.__endpoint_configured = False
+
+    def secrets_manager_endpoint_url(self, stack: core.Stack) -> str:
+        """
+        Gets the SecretsManager API url the rotation lambda function should use. Creates the SecretsManager
+        interface VPC endpoint first, if it should be created, and allows the rotation lambda function
+        security groups to reach it.
+
+        :param stack: A stack in which the rotation lambda function is created.
+
+        :return: The endpoint specific DNS name of the interface VPC endpoint if it is known,
+        the regional SecretsManager url otherwise.
+        """
+        if not self.__endpoint_configured:
+            self.__configure_endpoint()
+            self.__endpoint_configured = True
+
+        endpoint = self.secrets_manager_endpoint
+        # Imported endpoints have no DNS entries, they must have private DNS enabled.
+        if isinstance(endpoint, InterfaceVpcEndpoint):
+            # Every DNS entry is a hosted zone id and a DNS name separated by a colon, the first one is regional.
+            dns_name = core.Fn.select(1, core.Fn.split(':', core.Fn.select(0, endpoint.vpc_endpoint_dns_entries)))
+            return f'https://{dns_name}'
+
+        return f'https://secretsmanager.{stack.region}.amazonaws.com'
+
+    def __configure_endpoint(self) -> None:
+        if self.create_secrets_manager_endpoint:
+            # Secrets with different parameters in the same VPC share the endpoint, since private DNS of
+            # a second endpoint for the same service would conflict with the first one.
+            self.secrets_manager_endpoint = (
+                self.rotation_lambda_vpc.node.try_find_child(self.SECRETS_MANAGER_ENDPOINT_ID) or
+                self.rotation_lambda_vpc.add_interface_endpoint(
+                    self.SECRETS_MANAGER_ENDPOINT_ID,
+                    service=InterfaceVpcEndpointAwsService.SECRETS_MANAGER,
+                    private_dns_enabled=True,
+                    subnets=SubnetSelection(subnets=self.rotation_lambda_subnets),
+                    open=False
+                )
+            )
+
+        if self.secrets_manager_endpoint is None:
+            return
+
+        # HTTPS from the rotation lambda function to the endpoint, egress rules included,
+        # since the rotation lambda function does not allow all outbound traffic.
+        for security_group in self.rotation_lambda_security_groups:
+            self.secrets_manager_endpoint.connections.allow_default_port_from(
+                security_group,
+                'SecretsManager API calls of a secret rotation lambda function.'
+            )
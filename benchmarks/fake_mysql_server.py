@@ -0,0 +1,293 @@
+import hashlib
+import os
+import re
+import socket
+import struct
+import threading
+import time
+
+from typing import Dict, List, Optional
+
+# Capabilities announced by the server, matching what the vendored pymysql client asks for.
+CAPABILITIES = (
+    1            # LONG_PASSWORD
+    | 1 << 2     # LONG_FLAG
+    | 1 << 3     # CONNECT_WITH_DB
+    | 1 << 9     # PROTOCOL_41
+    | 1 << 13    # TRANSACTIONS
+    | 1 << 15    # SECURE_CONNECTION
+    | 1 << 17    # MULTI_RESULTS
+    | 1 << 19    # PLUGIN_AUTH
+    | 1 << 20    # CONNECT_ATTRS
+    | 1 << 21    # PLUGIN_AUTH_LENENC_CLIENT_DATA
+)
+
+COM_QUIT = 0x01
+COM_QUERY = 0x03
+COM_PING = 0x0e
+COM_CHANGE_USER = 0x11
+
+ER_ACCESS_DENIED_ERROR = 1045
+ER_UNKNOWN_COM_ERROR = 1047
+
+SERVER_STATUS_AUTOCOMMIT = 2
+UTF8MB4_GENERAL_CI = 45
+VAR_STRING = 0xfd
+
+
+def scramble_native_password(password: bytes, salt: bytes) -> bytes:
+    """
+    Expected mysql_native_password auth response for a password and salt.
+    """
+    if not password:
+        return b''
+    stage1 = hashlib.sha1(password).digest()
+    stage2 = hashlib.sha1(stage1).digest()
+    stage3 = hashlib.sha1(salt + stage2).digest()
+    return bytes(a ^ b for a, b in zip(stage1, stage3))
+
+
+def _lenenc_bytes(value: bytes) -> bytes:
+    assert len(value) < 0xfb
+    return bytes([len(value)]) + value
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r'\\(.)', lambda match: {'0': '\0', 'n': '\n', 'r': '\r', 'Z': '\x1a'}.get(match.group(1), match.group(1)), value)
+
+
+class FakeMySQLServer:
+    """
+    A local MySQL-protocol server which is just good enough for the rotation lambda function.
+
+    It accepts mysql_native_password logins and COM_CHANGE_USER, answers SELECT queries with a single
+    row and applies SET PASSWORD to the logged in user or the user it names. CREATE USER, GRANT, SHOW GRANTS
+    and user lookups in mysql.user are applied to the users and grants of the server, as the multi user
+    rotation needs them. Every other query is acknowledged with an OK packet.
+    Latency of the server greeting and of every command response can be injected.
+    """
+    def __init__(
+            self,
+            users: Dict[str, str],
+            version: str = '8.0.28',
+            handshake_latency: float = 0.0,
+            query_latency: float = 0.0,
+            grants: Optional[Dict[str, List[str]]] = None
+    ) -> None:
+        """
+        Constructor.
+
+        :param users: Usernames mapped to their passwords.
+        :param version: Server version announced in the handshake.
+        :param handshake_latency: Seconds before the server greeting is sent.
+        :param query_latency: Seconds before every command response is sent.
+        :param grants: Usernames mapped to the rows SHOW GRANTS returns for them.
+        """
+        self.users = dict(users)
+        self.grants = {user: list(rows) for user, rows in (grants or {}).items()}
+        self.version = version
+        self.handshake_latency = handshake_latency
+        self.query_latency = query_latency
+
+        self.connections_opened = 0
+        self.logins = 0
+        self.failed_logins = 0
+        self.change_users = 0
+        self.queries = 0
+
+        self.__lock = threading.Lock()
+        self.__socket: Optional[socket.socket] = None
+        self.port: Optional[int] = None
+
+    def __enter__(self) -> 'FakeMySQLServer':
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__socket.bind(('127.0.0.1', 0))
+        self.__socket.listen(128)
+        self.port = self.__socket.getsockname()[1]
+
+        thread = threading.Thread(target=self.__accept_loop, daemon=True)
+        thread.start()
+
+    def stop(self) -> None:
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+
+    def reset_counters(self) -> None:
+        with self.__lock:
+            self.connections_opened = self.logins = self.failed_logins = self.change_users = self.queries = 0
+
+    def count(self, counter: str) -> None:
+        with self.__lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def __accept_loop(self) -> None:
+        while self.__socket is not None:
+            try:
+                conn, _ = self.__socket.accept()
+            except OSError:
+                return
+            self.count('connections_opened')
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.__serve, args=(conn,), daemon=True).start()
+
+    def __serve(self, conn: socket.socket) -> None:
+        try:
+            _Session(self, conn).run()
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            conn.close()
+
+
+class _Session:
+    def __init__(self, server: FakeMySQLServer, conn: socket.socket) -> None:
+        self.server = server
+        self.conn = conn
+        self.rfile = conn.makefile('rb')
+        self.seq = 0
+        self.salt = os.urandom(20).replace(b'\0', b'\1')
+        self.user: Optional[str] = None
+
+    def run(self) -> None:
+        if self.server.handshake_latency:
+            time.sleep(self.server.handshake_latency)
+        self.send_greeting()
+
+        packet = self.read()
+        if packet is None:
+            return
+        user, auth_response = self.parse_handshake_response(packet)
+        if not self.authenticate(user, auth_response):
+            return
+
+        while True:
+            packet = self.read()
+            if not packet or packet[0] == COM_QUIT:
+                return
+            if self.server.query_latency:
+                time.sleep(self.server.query_latency)
+            if packet[0] == COM_CHANGE_USER:
+                user, auth_response = self.parse_change_user(packet)
+                if not self.authenticate(user, auth_response, change_user=True):
+                    return
+            elif packet[0] == COM_QUERY:
+                self.query(packet[1:].decode('utf-8'))
+            elif packet[0] == COM_PING:
+                self.ok()
+            else:
+                self.error(ER_UNKNOWN_COM_ERROR, '08S01', 'Unknown command')
+
+    def authenticate(self, user: str, auth_response: bytes, change_user: bool = False) -> bool:
+        password = self.server.users.get(user)
+        if password is None or scramble_native_password(password.encode('latin1'), self.salt) != auth_response:
+            self.server.count('failed_logins')
+            self.error(ER_ACCESS_DENIED_ERROR, '28000', f"Access denied for user '{user}'@'localhost'")
+            return False
+
+        self.user = user
+        self.server.count('change_users' if change_user else 'logins')
+        self.ok()
+        return True
+
+    def query(self, sql: str) -> None:
+        self.server.count('queries')
+        command = sql.upper()
+        literals = [_unescape(value) for value in re.findall(r"'((?:[^'\\]|\\.)*)'", sql)]
+        if command.startswith('SET PASSWORD'):
+            user = literals[0] if command.startswith('SET PASSWORD FOR') else self.user
+            self.server.users[user] = literals[-1]
+            self.ok()
+        elif command.startswith('CREATE USER'):
+            self.server.users[literals[0]] = literals[1]
+            self.ok()
+        elif command.startswith('GRANT'):
+            # The grantee is the last literal, e.g. GRANT SELECT ON `db`.* TO 'user' WITH GRANT OPTION.
+            self.server.grants.setdefault(literals[-1], []).append(sql)
+            self.ok()
+        elif command.startswith('SHOW GRANTS FOR'):
+            self.result_set(f'Grants for {literals[0]}', self.server.grants.get(literals[0], []))
+        elif command.startswith('SELECT USER FROM MYSQL.USER'):
+            self.result_set('User', [literals[0]] if literals[0] in self.server.users else [])
+        elif command.startswith('SELECT'):
+            column = sql[len('SELECT '):].strip()
+            value = self.server.version if column.upper() == 'VERSION()' else time.strftime('%Y-%m-%d %H:%M:%S')
+            self.result_set(column, [value])
+        else:
+            self.ok()
+
+    def send_greeting(self) -> None:
+        self.send(
+            b'\x0a'
+            + self.server.version.encode('ascii') + b'\0'
+            + struct.pack('<I', threading.get_ident() & 0xffffffff)
+            + self.salt[:8] + b'\0'
+            + struct.pack('<H', CAPABILITIES & 0xffff)
+            + bytes([UTF8MB4_GENERAL_CI])
+            + struct.pack('<H', SERVER_STATUS_AUTOCOMMIT)
+            + struct.pack('<H', CAPABILITIES >> 16)
+            + bytes([len(self.salt) + 1])
+            + b'\0' * 10
+            + self.salt[8:] + b'\0'
+            + b'mysql_native_password\0'
+        )
+
+    @staticmethod
+    def parse_handshake_response(packet: bytes):
+        # capability flags (4), max packet size (4), charset (1), reserved (23)
+        position = 32
+        end = packet.index(b'\0', position)
+        user = packet[position:end].decode('utf-8')
+        position = end + 1
+        length = packet[position]
+        return user, packet[position + 1:position + 1 + length]
+
+    @staticmethod
+    def parse_change_user(packet: bytes):
+        position = 1
+        end = packet.index(b'\0', position)
+        user = packet[position:end].decode('utf-8')
+        position = end + 1
+        length = packet[position]
+        return user, packet[position + 1:position + 1 + length]
+
+    def result_set(self, column: str, values: List[str]) -> None:
+        self.send(b'\x01')
+        self.send(
+            _lenenc_bytes(b'def') + _lenenc_bytes(b'') + _lenenc_bytes(b'') + _lenenc_bytes(b'')
+            + _lenenc_bytes(column.encode('utf-8')) + _lenenc_bytes(b'')
+            + b'\x0c' + struct.pack('<HIBHBH', UTF8MB4_GENERAL_CI, 255, VAR_STRING, 0, 0, 0)
+        )
+        self.eof()
+        for value in values:
+            self.send(_lenenc_bytes(value.encode('utf-8')))
+        self.eof()
+
+    def ok(self) -> None:
+        self.send(b'\x00\x00\x00' + struct.pack('<HH', SERVER_STATUS_AUTOCOMMIT, 0))
+
+    def eof(self) -> None:
+        self.send(b'\xfe' + struct.pack('<HH', 0, SERVER_STATUS_AUTOCOMMIT))
+
+    def error(self, code: int, state: str, message: str) -> None:
+        self.send(b'\xff' + struct.pack('<H', code) + b'#' + state.encode('ascii') + message.encode('utf-8'))
+
+    def send(self, payload: bytes) -> None:
+        self.conn.sendall(struct.pack('<I', len(payload))[:3] + bytes([self.seq]) + payload)
+        self.seq = (self.seq + 1) % 256
+
+    def read(self) -> Optional[bytes]:
+        header = self.rfile.read(4)
+        if len(header) < 4:
+            return None
+        length = header[0] | header[1] << 8 | header[2] << 16
+        self.seq = (header[3] + 1) % 256
+        return self.rfile.read(length)
@@ -0,0 +1,181 @@
+import json
+import string
+import threading
+import time
+import uuid
+
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+
+class ResourceNotFoundException(Exception):
+    """
+    Mirrors the exception raised by a boto3 secrets manager client for missing secrets and versions.
+    """
+
+
+class _Exceptions:
+    ResourceNotFoundException = ResourceNotFoundException
+
+
+class _SecretVersion:
+    def __init__(self, secret_string: Optional[str], stages: List[str]) -> None:
+        self.secret_string = secret_string
+        self.stages = stages
+
+
+class FakeSecretsManager:
+    """
+    In-memory stand-in for a boto3 secrets manager client.
+
+    Supports the subset of the API used by the rotation lambda function, including version stage
+    bookkeeping: a single version holds a stage at a time and finishing a rotation moves AWSPREVIOUS
+    to the version which was AWSCURRENT before.
+    """
+    exceptions = _Exceptions
+
+    def __init__(self, latency: float = 0.0) -> None:
+        """
+        Constructor.
+
+        :param latency: Seconds every API call takes, e.g. to simulate a NAT gateway.
+        """
+        self.latency = latency
+        self.calls = Counter()
+        self.__lock = threading.Lock()
+        self.__secrets: Dict[str, Dict[str, _SecretVersion]] = {}
+
+    def create_secret(self, secret_id: str, secret: Dict[str, Any]) -> None:
+        """
+        Creates a secret whose only version is staged as AWSCURRENT. Not counted as an API call.
+
+        :param secret_id: The secret identifier.
+        :param secret: The secret dictionary to store as a JSON string.
+        """
+        with self.__lock:
+            self.__secrets[secret_id] = {str(uuid.uuid4()): _SecretVersion(json.dumps(secret), ['AWSCURRENT'])}
+
+    def start_rotation(self, secret_id: str) -> str:
+        """
+        Stages AWSPENDING on a new, still empty version like RotateSecret does. Not counted as an API call.
+
+        :param secret_id: The secret identifier.
+
+        :return: The ClientRequestToken of the new version.
+        """
+        token = str(uuid.uuid4())
+        with self.__lock:
+            versions = self.__secrets[secret_id]
+            self.__remove_stage(versions, 'AWSPENDING')
+            versions[token] = _SecretVersion(None, ['AWSPENDING'])
+        return token
+
+    def secret_dict(self, secret_id: str, stage: str = 'AWSCURRENT') -> Dict[str, Any]:
+        """
+        Returns the secret dictionary staged with the given stage. Not counted as an API call.
+        """
+        with self.__lock:
+            for version in self.__secrets[secret_id].values():
+                if stage in version.stages and version.secret_string is not None:
+                    return json.loads(version.secret_string)
+        raise ResourceNotFoundException(f'{secret_id} has no {stage} version.')
+
+    def reset_calls(self) -> None:
+        self.calls.clear()
+
+    def describe_secret(self, SecretId: str) -> Dict[str, Any]:
+        self.__call('DescribeSecret')
+        with self.__lock:
+            versions = self.__versions(SecretId)
+            return {
+                'ARN': SecretId,
+                'RotationEnabled': True,
+                'VersionIdsToStages': {version_id: list(version.stages) for version_id, version in versions.items()}
+            }
+
+    def get_secret_value(
+            self,
+            SecretId: str,
+            VersionId: Optional[str] = None,
+            VersionStage: Optional[str] = None
+    ) -> Dict[str, Any]:
+        self.__call('GetSecretValue')
+        if VersionId is None and VersionStage is None:
+            VersionStage = 'AWSCURRENT'
+
+        with self.__lock:
+            for version_id, version in self.__versions(SecretId).items():
+                if version.secret_string is None:
+                    continue
+                if VersionId is not None and VersionId != version_id:
+                    continue
+                if VersionStage is not None and VersionStage not in version.stages:
+                    continue
+                return {
+                    'ARN': SecretId,
+                    'VersionId': version_id,
+                    'SecretString': version.secret_string,
+                    'VersionStages': list(version.stages)
+                }
+
+        raise ResourceNotFoundException(f'{SecretId} has no version {VersionId} staged {VersionStage}.')
+
+    def get_random_password(self, ExcludeCharacters: str = '', PasswordLength: int = 32, **kwargs: Any) -> Dict[str, str]:
+        self.__call('GetRandomPassword')
+        alphabet = string.ascii_letters + string.digits
+        return {'RandomPassword': ''.join(c for c in uuid.uuid4().hex + uuid.uuid4().hex if c in alphabet)[:PasswordLength]}
+
+    def put_secret_value(
+            self,
+            SecretId: str,
+            ClientRequestToken: str,
+            SecretString: str,
+            VersionStages: List[str]
+    ) -> Dict[str, Any]:
+        self.__call('PutSecretValue')
+        with self.__lock:
+            versions = self.__versions(SecretId)
+            for stage in VersionStages:
+                self.__remove_stage(versions, stage)
+            versions[ClientRequestToken] = _SecretVersion(SecretString, list(VersionStages))
+        return {'ARN': SecretId, 'VersionId': ClientRequestToken, 'VersionStages': list(VersionStages)}
+
+    def update_secret_version_stage(
+            self,
+            SecretId: str,
+            VersionStage: str,
+            MoveToVersionId: Optional[str] = None,
+            RemoveFromVersionId: Optional[str] = None
+    ) -> Dict[str, Any]:
+        self.__call('UpdateSecretVersionStage')
+        with self.__lock:
+            versions = self.__versions(SecretId)
+            if RemoveFromVersionId is not None:
+                versions[RemoveFromVersionId].stages.remove(VersionStage)
+                if VersionStage == 'AWSCURRENT':
+                    self.__remove_stage(versions, 'AWSPREVIOUS')
+                    versions[RemoveFromVersionId].stages.append('AWSPREVIOUS')
+            if MoveToVersionId is not None:
+                self.__remove_stage(versions, VersionStage)
+                versions[MoveToVersionId].stages.append(VersionStage)
+            if VersionStage == 'AWSCURRENT' and MoveToVersionId is not None:
+                self.__remove_stage(versions, 'AWSPENDING')
+        return {'ARN': SecretId}
+
+    def __call(self, operation: str) -> None:
+        with self.__lock:
+            self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def __versions(self, secret_id: str) -> Dict[str, _SecretVersion]:
+        try:
+            return self.__secrets[secret_id]
+        except KeyError:
+            raise ResourceNotFoundException(f'Secret {secret_id} does not exist.')
+
+    @staticmethod
+    def __remove_stage(versions: Dict[str, _SecretVersion], stage: str) -> None:
+        for version in versions.values():
+            if stage in version.stages:
+                version.stages.remove(stage)
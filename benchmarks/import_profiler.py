@@ -0,0 +1,182 @@
+"""
+Cold start import profiler of the rotation lambda function.
+
+Imports a module of the lambda deployment package in fresh interpreters with ``python -X importtime``
+and reports the median self and cumulative import time of every module, the slowest modules and the
+import time grouped by top-level package.
+
+Like on AWS Lambda, where the deployment package is read-only, bytecode of the package is neither cached
+nor written, hence every run compiles the package sources.
+
+Usage:
+    python -m benchmarks.import_profiler
+    python -m benchmarks.import_profiler --module pymysql --repeat 20 --top 15
+    python -m benchmarks.import_profiler --build --json imports.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from typing import Any, Dict, List, Optional
+from aws_secret_cdk.aurora_mysql_single_user.deployment_package import DeploymentPackage
+
+PACKAGE_SRC = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    'aws_secret_cdk',
+    'aurora_mysql_single_user',
+    'package_src'
+)
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$')
+
+
+def parse_import_times(output: str) -> List[Dict[str, Any]]:
+    """
+    Parses ``-X importtime`` output.
+
+    :param output: Standard error of an interpreter run with ``-X importtime``.
+
+    :return: Imported modules in import order with self and cumulative times in microseconds and nesting depth.
+    """
+    modules = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            modules.append({
+                'module': match.group(4),
+                'self_us': int(match.group(1)),
+                'cumulative_us': int(match.group(2)),
+                'depth': (len(match.group(3)) - 1) // 2
+            })
+    return modules
+
+
+def measure(module: str, package_path: str = PACKAGE_SRC) -> List[Dict[str, Any]]:
+    """
+    Imports a module in a fresh interpreter and returns its import times.
+
+    :param module: Module name to import, e.g. lambda_function.
+    :param package_path: Directory prepended to the module search path.
+
+    :return: Parsed import times.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_path, env.get('PYTHONPATH')]))
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    env.setdefault('SECRETS_MANAGER_ENDPOINT', 'https://secretsmanager.eu-west-1.amazonaws.com')
+    env.setdefault('INITIAL_DATABASE_PASSWORD', 'InitialPassword1')
+
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    if process.returncode != 0:
+        errors = [line for line in process.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError(f'Failed to import {module}:\n' + '\n'.join(errors))
+
+    return parse_import_times(process.stderr)
+
+
+def profile(module: str, repeat: int = 10, package_path: str = PACKAGE_SRC) -> Dict[str, Any]:
+    """
+    Imports a module several times and aggregates the medians.
+
+    :param module: Module name to import.
+    :param repeat: Number of fresh interpreters to import the module in.
+    :param package_path: Directory prepended to the module search path.
+
+    :return: A report with total import time, per module and per top-level package times in milliseconds.
+    """
+    # Profile a copy of the package, so bytecode cached in the working tree is not picked up.
+    with tempfile.TemporaryDirectory() as directory:
+        package_copy = os.path.join(directory, 'package')
+        shutil.copytree(package_path, package_copy, ignore=shutil.ignore_patterns('__pycache__'))
+        runs = [measure(module, package_copy) for _ in range(repeat)]
+
+    samples: Dict[str, Dict[str, List[int]]] = {}
+    for run in runs:
+        for entry in run:
+            module_samples = samples.setdefault(entry['module'], {'self_us': [], 'cumulative_us': []})
+            module_samples['self_us'].append(entry['self_us'])
+            module_samples['cumulative_us'].append(entry['cumulative_us'])
+
+    modules = {
+        name: {
+            'self_ms': statistics.median(values['self_us']) / 1000.0,
+            'cumulative_ms': statistics.median(values['cumulative_us']) / 1000.0
+        } for name, values in samples.items()
+    }
+
+    packages: Dict[str, float] = {}
+    for name, times in modules.items():
+        top_level = name.split('.', 1)[0]
+        packages[top_level] = packages.get(top_level, 0.0) + times['self_ms']
+
+    return {
+        'module': module,
+        'repeat': repeat,
+        'total_ms': modules.get(module, {}).get('cumulative_ms', 0.0),
+        'modules': modules,
+        'packages': packages
+    }
+
+
+def format_report(report: Dict[str, Any], top: int = 20) -> str:
+    lines = [f'Import of {report["module"]}: {report["total_ms"]:.2f} ms (median of {report["repeat"]} runs)', '']
+
+    lines.append(f'{"slowest modules":<50}{"self ms":>10}{"cumul. ms":>12}')
+    slowest = sorted(report['modules'].items(), key=lambda item: item[1]['self_ms'], reverse=True)[:top]
+    for name, times in slowest:
+        lines.append(f'{name:<50}{times["self_ms"]:>10.2f}{times["cumulative_ms"]:>12.2f}')
+
+    lines.append('')
+    lines.append(f'{"top-level packages":<50}{"self ms":>10}')
+    packages = sorted(report['packages'].items(), key=lambda item: item[1], reverse=True)[:top]
+    for name, self_ms in packages:
+        lines.append(f'{name:<50}{self_ms:>10.2f}')
+
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Cold start import profiler of the rotation lambda function.')
+    parser.add_argument('--module', default='lambda_function', help='Module of the deployment package to import.')
+    parser.add_argument('--package-path', default=PACKAGE_SRC, help='Deployment package directory.')
+    parser.add_argument('--repeat', type=int, default=10, help='Number of fresh interpreters to measure.')
+    parser.add_argument('--top', type=int, default=20, help='Number of modules and packages to list.')
+    parser.add_argument('--build', action='store_true', help='Profile the built deployment package as well.')
+    parser.add_argument('--json', help='Write the report to this file.')
+    args = parser.parse_args(argv)
+
+    report = profile(args.module, args.repeat, args.package_path)
+    print(format_report(report, args.top))
+
+    if args.build:
+        with tempfile.TemporaryDirectory() as directory:
+            runtime = f'python{sys.version_info[0]}.{sys.version_info[1]}'
+            build = DeploymentPackage(args.package_path, runtime).build(os.path.join(directory, 'package'))
+            report['build'] = build.to_dict()
+            report['build']['import'] = profile(args.module, args.repeat, build.output_path)
+
+        print('')
+        print(build)
+        print(format_report(report['build']['import'], args.top))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
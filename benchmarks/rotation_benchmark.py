@@ -0,0 +1,264 @@
+"""
+Offline end-to-end benchmark of the RDS MySQL single user rotation lambda function.
+
+Drives lambda_function.lambda_handler through every rotation step against an in-memory secrets manager
+and a local MySQL-protocol server, reporting step latency percentiles, API calls and database connections.
+
+Usage:
+    python -m benchmarks.rotation_benchmark --iterations 100 --secrets-manager-latency-ms 30
+    python -m benchmarks.rotation_benchmark --json report.json
+    python -m benchmarks.rotation_benchmark --baseline report.json --tolerance 0.2
+
+The rotation lambda function imports boto3, hence it must be installed in the environment.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+
+from typing import Any, Dict, List, Optional
+from benchmarks.fake_mysql_server import FakeMySQLServer
+from benchmarks.fake_secrets_manager import FakeSecretsManager
+
+PACKAGE_SRC = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    'aws_secret_cdk',
+    'aurora_mysql_single_user',
+    'package_src'
+)
+
+STEPS = ['createSecret', 'setSecret', 'testSecret', 'finishSecret']
+
+SECRET_ID = 'arn:aws:secretsmanager:eu-west-1:000000000000:secret:BenchmarkRdsSecret'
+USERNAME = 'rotation_user'
+INITIAL_PASSWORD = 'InitialPassword1'
+
+# Absolute slack (in milliseconds) on top of the relative tolerance, so sub-millisecond noise never fails a gate.
+LATENCY_SLACK_MS = 1.0
+
+
+def load_rotation_lambda():
+    """
+    Imports the rotation lambda function module the same way lambda runtime does.
+    """
+    if PACKAGE_SRC not in sys.path:
+        sys.path.insert(0, PACKAGE_SRC)
+
+    os.environ.setdefault('SECRETS_MANAGER_ENDPOINT', 'https://secretsmanager.eu-west-1.amazonaws.com')
+    os.environ.setdefault('INITIAL_DATABASE_PASSWORD', INITIAL_PASSWORD)
+
+    import instrumentation
+    import lambda_function
+
+    # Keep benchmark output readable.
+    instrumentation.recorder.enabled = False
+    logging.getLogger().setLevel(logging.WARNING)
+
+    return lambda_function
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    :param values: Measured values.
+    :param q: Percentile in range (0, 100].
+
+    :return: The percentile value, or 0 if there are no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(q / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+class RotationBenchmark:
+    """
+    Runs a number of full rotations of a single secret and collects per step timings.
+    """
+    def __init__(
+            self,
+            iterations: int = 50,
+            secrets_manager_latency: float = 0.0,
+            handshake_latency: float = 0.0,
+            query_latency: float = 0.0,
+            mysql_version: str = '8.0.28',
+            cold: bool = False
+    ) -> None:
+        """
+        Constructor.
+
+        :param iterations: Number of full rotations to run.
+        :param secrets_manager_latency: Seconds every secrets manager API call takes.
+        :param handshake_latency: Seconds before the database server greets a new connection.
+        :param query_latency: Seconds before the database server answers a command.
+        :param mysql_version: Version announced by the database server.
+        :param cold: Drop every container wide state (clients, connection pool) before every step.
+        """
+        self.iterations = iterations
+        self.secrets_manager_latency = secrets_manager_latency
+        self.handshake_latency = handshake_latency
+        self.query_latency = query_latency
+        self.mysql_version = mysql_version
+        self.cold = cold
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Runs the benchmark.
+
+        :return: A report with step latency percentiles (in milliseconds), API calls and connections per rotation.
+        """
+        lambda_function = load_rotation_lambda()
+        secrets_manager = FakeSecretsManager(latency=self.secrets_manager_latency)
+
+        server = FakeMySQLServer(
+            users={USERNAME: INITIAL_PASSWORD},
+            version=self.mysql_version,
+            handshake_latency=self.handshake_latency,
+            query_latency=self.query_latency
+        )
+
+        timings: Dict[str, List[float]] = {step: [] for step in STEPS}
+        with server:
+            secrets_manager.create_secret(SECRET_ID, {
+                'engine': 'mysql',
+                'host': '127.0.0.1',
+                'port': server.port,
+                'username': USERNAME,
+                'password': INITIAL_PASSWORD,
+                'dbname': None
+            })
+
+            self.__reset_container(lambda_function, secrets_manager)
+            secrets_manager.reset_calls()
+            server.reset_counters()
+
+            for _ in range(self.iterations):
+                token = secrets_manager.start_rotation(SECRET_ID)
+                for step in STEPS:
+                    if self.cold:
+                        self.__reset_container(lambda_function, secrets_manager)
+
+                    start = time.perf_counter()
+                    lambda_function.lambda_handler({'SecretId': SECRET_ID, 'ClientRequestToken': token, 'Step': step}, None)
+                    timings[step].append((time.perf_counter() - start) * 1000.0)
+
+                if server.users[USERNAME] != secrets_manager.secret_dict(SECRET_ID)['password']:
+                    raise AssertionError('Database password does not match AWSCURRENT secret after rotation.')
+
+            # Idle pooled connections are not part of any rotation.
+            lambda_function.connection_pool.clear()
+
+        api_calls = sum(secrets_manager.calls.values())
+        return {
+            'iterations': self.iterations,
+            'steps': {
+                step: {
+                    'p50': percentile(values, 50),
+                    'p99': percentile(values, 99),
+                    'mean': sum(values) / len(values) if values else 0.0
+                } for step, values in timings.items()
+            },
+            'api_calls_per_rotation': api_calls / float(self.iterations),
+            'api_calls': {operation: count / float(self.iterations) for operation, count in sorted(secrets_manager.calls.items())},
+            'connections_per_rotation': server.connections_opened / float(self.iterations),
+            'logins_per_rotation': server.logins / float(self.iterations),
+            'failed_logins_per_rotation': server.failed_logins / float(self.iterations),
+            'change_users_per_rotation': server.change_users / float(self.iterations)
+        }
+
+    @staticmethod
+    def __reset_container(lambda_function, secrets_manager: FakeSecretsManager) -> None:
+        lambda_function.connection_pool.clear()
+        lambda_function.connect_timeouts = lambda_function.ConnectTimeoutEstimator()
+        lambda_function._runtime_context = lambda_function.RuntimeContext(
+            lambda_function.read_runtime_config(),
+            service_client=secrets_manager
+        )
+
+
+def find_regressions(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compares a report against a baseline report.
+
+    :param report: The report of the current run.
+    :param baseline: A previously saved report.
+    :param tolerance: Allowed relative increase, e.g. 0.2 for 20%.
+
+    :return: Human readable descriptions of every regression.
+    """
+    regressions = []
+
+    for step, stats in baseline['steps'].items():
+        limit = stats['p99'] * (1 + tolerance) + LATENCY_SLACK_MS
+        current = report['steps'][step]['p99']
+        if current > limit:
+            regressions.append(f'{step} p99 {current:.2f} ms exceeds {limit:.2f} ms (baseline {stats["p99"]:.2f} ms)')
+
+    for counter in ['api_calls_per_rotation', 'connections_per_rotation']:
+        limit = baseline[counter] * (1 + tolerance)
+        if report[counter] > limit:
+            regressions.append(f'{counter} {report[counter]:.2f} exceeds {limit:.2f} (baseline {baseline[counter]:.2f})')
+
+    return regressions
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f'{"step":<14}{"p50 ms":>10}{"p99 ms":>10}{"mean ms":>10}']
+    for step in STEPS:
+        stats = report['steps'][step]
+        lines.append(f'{step:<14}{stats["p50"]:>10.2f}{stats["p99"]:>10.2f}{stats["mean"]:>10.2f}')
+    lines.append('')
+    lines.append(f'API calls per rotation:   {report["api_calls_per_rotation"]:.2f}')
+    for operation, count in report['api_calls'].items():
+        lines.append(f'  {operation:<28}{count:.2f}')
+    lines.append(f'Connections per rotation: {report["connections_per_rotation"]:.2f}')
+    lines.append(f'Logins per rotation:      {report["logins_per_rotation"]:.2f} ({report["failed_logins_per_rotation"]:.2f} failed)')
+    lines.append(f'Change user per rotation: {report["change_users_per_rotation"]:.2f}')
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark of the rotation lambda function.')
+    parser.add_argument('--iterations', type=int, default=50, help='Number of full rotations.')
+    parser.add_argument('--secrets-manager-latency-ms', type=float, default=0.0, help='Latency of every API call.')
+    parser.add_argument('--handshake-latency-ms', type=float, default=0.0, help='Latency of the server greeting.')
+    parser.add_argument('--query-latency-ms', type=float, default=0.0, help='Latency of every database command.')
+    parser.add_argument('--mysql-version', default='8.0.28', help='Version announced by the database server.')
+    parser.add_argument('--cold', action='store_true', help='Drop container wide state before every step.')
+    parser.add_argument('--json', help='Write the report to this file.')
+    parser.add_argument('--baseline', help='Fail if the run regressed against this report.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression.')
+    args = parser.parse_args(argv)
+
+    report = RotationBenchmark(
+        iterations=args.iterations,
+        secrets_manager_latency=args.secrets_manager_latency_ms / 1000.0,
+        handshake_latency=args.handshake_latency_ms / 1000.0,
+        query_latency=args.query_latency_ms / 1000.0,
+        mysql_version=args.mysql_version,
+        cold=args.cold
+    ).run()
+
+    print(format_report(report))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(report, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
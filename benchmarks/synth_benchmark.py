@@ -0,0 +1,327 @@
+"""
+Synthesis benchmark of stacks with many Secret constructs.
+
+Builds a stack with N RDS clusters and a Secret for each of them and synthesizes it, for every requested N
+(at most MAX_SIZE, above which the stack exceeds the CloudFormation limit of 500 resources),
+reporting wall time (import, construct and synth phases), peak RSS and the number of jsii calls into node
+per jsii class (e.g. PolicyStatement, Function, CfnSecretTargetAttachment) and per kernel operation.
+
+Every stack is synthesized in a fresh interpreter, so no jsii kernel or module state leaks between sizes and
+peak RSS is that of a single synthesis. Peak RSS is reported for the Python process alone and for the whole
+process tree including the node process of the jsii kernel.
+
+Usage:
+    python -m benchmarks.synth_benchmark
+    python -m benchmarks.synth_benchmark --sizes 1 10 25 --shared --top 10
+    python -m benchmarks.synth_benchmark --json synth.json
+    python -m benchmarks.synth_benchmark --baseline synth.json --tolerance 0.2
+
+aws-cdk and aws-lambda (see setup.py) must be installed in the environment.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SIZES = [1, 10, 25, 45]
+
+# Every secret adds up to 10 resources, depending on the aws-cdk version, to the 22 of the VPC and security group,
+# while a CloudFormation stack holds at most 500 resources.
+MAX_SIZE = 47
+
+# Kernel operations which cross the process boundary into node, apart from loading assemblies.
+JSII_OPERATIONS = ['create', 'invoke', 'ainvoke', 'get', 'set', 'sinvoke', 'sget', 'sset']
+
+# Absolute slack (in milliseconds) on top of the relative tolerance, so small stacks never fail a gate on noise.
+WALL_TIME_SLACK_MS = 250.0
+
+
+class JsiiCallCounter:
+    """
+    Counts jsii kernel calls by the jsii class they are made on and by kernel operation.
+    """
+    def __init__(self) -> None:
+        self.by_class: Counter = Counter()
+        self.by_operation: Counter = Counter()
+        self.__originals: Dict[str, Any] = {}
+
+    def install(self) -> None:
+        import jsii
+        from jsii import _runtime
+
+        # jsii binds the methods of its single kernel instance as module level functions (jsii.create, jsii.invoke,
+        # ...) at import time, which is what generated bindings call, while the runtime calls the kernel instance
+        # directly. Patching the Kernel class would miss both, so the bound methods are wrapped on the instance
+        # and the module level aliases are rebound to the same wrappers.
+        for operation in JSII_OPERATIONS:
+            original = getattr(_runtime.kernel, operation, None)
+            if original is None:
+                continue
+            self.__originals[operation] = original
+            counting = self.__counting(operation, original)
+            setattr(_runtime.kernel, operation, counting)
+            if hasattr(jsii, operation):
+                setattr(jsii, operation, counting)
+
+    def uninstall(self) -> None:
+        import jsii
+        from jsii import _runtime
+
+        for operation, original in self.__originals.items():
+            # Removing the instance attribute exposes the class method again.
+            _runtime.kernel.__dict__.pop(operation, None)
+            if hasattr(jsii, operation):
+                setattr(jsii, operation, original)
+        self.__originals.clear()
+
+    def __counting(self, operation: str, original: Any) -> Any:
+        counter = self
+
+        def counting(target, *args, **kwargs):
+            # Static operations and create are made on a class, the others on an instance.
+            counter.by_class[target.__name__ if isinstance(target, type) else type(target).__name__] += 1
+            counter.by_operation[operation] += 1
+            return original(target, *args, **kwargs)
+
+        return counting
+
+    @property
+    def total(self) -> int:
+        return sum(self.by_operation.values())
+
+
+def synthesize(size: int, shared: bool = False) -> Dict[str, Any]:
+    """
+    Builds and synthesizes a stack with a number of secrets in this interpreter.
+
+    :param size: Number of Secret constructs.
+    :param shared: Rotate every secret with a single SharedSecretRotation.
+
+    :return: Phase wall times in milliseconds, Python peak RSS and jsii call counts.
+    """
+    start = time.perf_counter()
+    from aws_cdk import core, aws_ec2, aws_rds
+    from aws_secret_cdk.aurora_mysql_single_user.secret import Secret
+    from aws_secret_cdk.aurora_mysql_single_user.shared_secret_rotation import SharedSecretRotation
+    from aws_secret_cdk.vpc_parameters import VPCParameters
+    imported = time.perf_counter()
+
+    counter = JsiiCallCounter()
+    counter.install()
+
+    with tempfile.TemporaryDirectory() as outdir:
+        app = core.App(outdir=outdir)
+        stack = core.Stack(
+            app,
+            'SynthBenchmark',
+            env=core.Environment(account='000000000000', region='eu-west-1')
+        )
+
+        vpc = aws_ec2.Vpc(stack, 'Vpc', max_azs=2, nat_gateways=1)
+        vpc_parameters = VPCParameters(
+            rotation_lambda_vpc=vpc,
+            rotation_lambda_security_groups=[aws_ec2.SecurityGroup(stack, 'SecurityGroup', vpc=vpc)],
+            rotation_lambda_subnets=vpc.private_subnets
+        )
+
+        shared_rotation = None
+        if shared:
+            shared_rotation = SharedSecretRotation(stack=stack, prefix='Benchmark', vpc_parameters=vpc_parameters)
+
+        for index in range(size):
+            database = aws_rds.CfnDBCluster(
+                stack,
+                f'Database{index}',
+                engine='aurora-mysql',
+                master_username='admin',
+                master_user_password='InitialPassword1',
+                database_name='benchmark',
+                db_cluster_identifier=f'benchmark-{index}'
+            )
+
+            Secret(
+                stack=stack,
+                prefix=f'Benchmark{index}',
+                vpc_parameters=vpc_parameters,
+                database=database,
+                shared_rotation=shared_rotation
+            )
+
+        constructed = time.perf_counter()
+        construct_calls = counter.total
+
+        app.synth()
+        synthesized = time.perf_counter()
+
+    counter.uninstall()
+
+    if counter.total == 0:
+        raise RuntimeError('No jsii calls were counted, the counter does not intercept this jsii version.')
+
+    return {
+        'size': size,
+        'import_ms': (imported - start) * 1000.0,
+        'construct_ms': (constructed - imported) * 1000.0,
+        'synth_ms': (synthesized - constructed) * 1000.0,
+        'python_peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'jsii_calls': counter.total,
+        'jsii_construct_calls': construct_calls,
+        'jsii_calls_by_class': dict(counter.by_class),
+        'jsii_calls_by_operation': dict(counter.by_operation)
+    }
+
+
+def measure(size: int, shared: bool = False) -> Dict[str, Any]:
+    """
+    Synthesizes a stack with a number of secrets in a fresh interpreter.
+
+    :param size: Number of Secret constructs.
+    :param shared: Rotate every secret with a single SharedSecretRotation.
+
+    :return: The result of synthesize with the peak RSS of the whole process tree added.
+    """
+    command = [sys.executable, '-m', 'benchmarks.synth_benchmark', '--worker', str(size)]
+    if shared:
+        command.append('--shared')
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+    output = process.stdout.read()
+    process.stdout.close()
+    # Unlike Popen.wait, wait4 also returns the resource usage of the worker and the processes it waited for.
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status
+    wall_time = (time.perf_counter() - start) * 1000.0
+
+    if process.returncode != 0:
+        raise RuntimeError(f'Synthesis of {size} secrets failed with exit code {process.returncode}.')
+
+    # Construct libraries may print to stdout, the result is the last line.
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall_ms'] = wall_time
+    result['peak_rss_kb'] = usage.ru_maxrss
+    return result
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combines repeated runs of the same size into medians. jsii call counts are deterministic.
+
+    :param runs: Results of measure for the same size.
+
+    :return: A single result.
+    """
+    summary = dict(runs[-1])
+    for key in ['wall_ms', 'import_ms', 'construct_ms', 'synth_ms', 'peak_rss_kb', 'python_peak_rss_kb']:
+        summary[key] = statistics.median(run[key] for run in runs)
+    summary['jsii_calls_per_secret'] = summary['jsii_calls'] / float(summary['size'])
+    return summary
+
+
+def find_regressions(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compares a report against a baseline report. Only sizes present in both are compared.
+
+    :param report: The report of the current run.
+    :param baseline: A previously saved report.
+    :param tolerance: Allowed relative increase, e.g. 0.2 for 20%.
+
+    :return: Human readable descriptions of every regression.
+    """
+    regressions = []
+
+    for size, stats in baseline['sizes'].items():
+        current = report['sizes'].get(size)
+        if current is None:
+            continue
+
+        for key in ['construct_ms', 'synth_ms']:
+            limit = stats[key] * (1 + tolerance) + WALL_TIME_SLACK_MS
+            if current[key] > limit:
+                regressions.append(f'N={size} {key} {current[key]:.0f} ms exceeds {limit:.0f} ms (baseline {stats[key]:.0f} ms)')
+
+        for key in ['jsii_calls', 'peak_rss_kb']:
+            limit = stats[key] * (1 + tolerance)
+            if current[key] > limit:
+                regressions.append(f'N={size} {key} {current[key]} exceeds {limit:.0f} (baseline {stats[key]})')
+
+    return regressions
+
+
+def format_report(report: Dict[str, Any], top: int = 10) -> str:
+    lines = [
+        f'{"secrets":>8}{"wall ms":>10}{"import ms":>11}{"construct ms":>14}{"synth ms":>10}'
+        f'{"rss MB":>9}{"py rss MB":>11}{"jsii calls":>12}{"per secret":>12}'
+    ]
+    for stats in report['sizes'].values():
+        lines.append(
+            f'{stats["size"]:>8}{stats["wall_ms"]:>10.0f}{stats["import_ms"]:>11.0f}{stats["construct_ms"]:>14.0f}'
+            f'{stats["synth_ms"]:>10.0f}{stats["peak_rss_kb"] / 1024.0:>9.1f}{stats["python_peak_rss_kb"] / 1024.0:>11.1f}'
+            f'{stats["jsii_calls"]:>12}{stats["jsii_calls_per_secret"]:>12.1f}'
+        )
+
+    largest = list(report['sizes'].values())[-1]
+    lines.append('')
+    lines.append(f'jsii calls by class (N={largest["size"]}):')
+    for name, count in Counter(largest['jsii_calls_by_class']).most_common(top):
+        lines.append(f'  {name:<40}{count:>10}{count / float(largest["size"]):>10.1f} per secret')
+    lines.append(f'jsii calls by operation (N={largest["size"]}):')
+    for name, count in Counter(largest['jsii_calls_by_operation']).most_common():
+        lines.append(f'  {name:<40}{count:>10}')
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Synthesis benchmark of stacks with many Secret constructs.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Numbers of secrets per stack.')
+    parser.add_argument('--repeat', type=int, default=1, help='Synthesize every size this many times.')
+    parser.add_argument('--shared', action='store_true', help='Rotate all secrets with one shared lambda function.')
+    parser.add_argument('--top', type=int, default=10, help='Number of jsii classes listed.')
+    parser.add_argument('--json', help='Write the report to this file.')
+    parser.add_argument('--baseline', help='Fail if the run regressed against this report.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression.')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    for size in args.sizes if args.worker is None else [args.worker]:
+        if not 1 <= size <= MAX_SIZE:
+            parser.error(f'sizes must be between 1 and {MAX_SIZE}, larger stacks exceed 500 resources.')
+
+    if args.worker is not None:
+        print(json.dumps(synthesize(args.worker, args.shared)))
+        return 0
+
+    report = {
+        'shared': args.shared,
+        'sizes': {
+            str(size): summarize([measure(size, args.shared) for _ in range(args.repeat)])
+            for size in args.sizes
+        }
+    }
+
+    print(format_report(report, args.top))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(report, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,11 +10,13 @@ setup(
     name='aws_secret_cdk',
     version='5.3.0',
     license='GNU GENERAL PUBLIC LICENSE Version 3',
-    packages=find_packages(exclude=['venv', 'test']),
+    packages=find_packages(exclude=['venv', 'test', 'benchmarks', 'benchmarks.*']),
     description='Package to create a SecretsManager\'s secret with auto rotation.',
     long_description=README + '\n\n' + HISTORY,
     long_description_content_type="text/markdown",
     include_package_data=True,
+    # Python 3 rotation lambda deployment packages are built with the ast line ranges of Python 3.8.
+    python_requires='>=3.8',
     install_requires=[
         # Aws Cdk dependencies.
         'aws-cdk.core>=1.60.0,<2.0.0',
@@ -34,10 +36,12 @@ setup(
     url='https://github.com/idenfy/AwsSecretCdk',
     classifiers=[
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
+        'Programming Language :: Python :: 3.13',
         'Operating System :: OS Independent',
     ],
 )
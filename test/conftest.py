@@ -0,0 +1,54 @@
+import sys
+
+import pytest
+
+from benchmarks.fake_mysql_server import FakeMySQLServer
+from benchmarks.fake_secrets_manager import FakeSecretsManager
+from test.helpers import INITIAL_PASSWORD, SINGLE_USER_PACKAGE_SRC, USERNAME
+
+# Modules of the rotation lambda function are imported the way lambda runtime does.
+if SINGLE_USER_PACKAGE_SRC not in sys.path:
+    sys.path.insert(0, SINGLE_USER_PACKAGE_SRC)
+
+
+@pytest.fixture
+def secrets_manager():
+    return FakeSecretsManager()
+
+
+@pytest.fixture
+def mysql_server():
+    with FakeMySQLServer(users={USERNAME: INITIAL_PASSWORD}) as server:
+        yield server
+
+
+@pytest.fixture
+def rotation_lambda(monkeypatch, tmp_path, secrets_manager):
+    """
+    The rotation lambda function module with fresh container wide state, talking to the fake secrets manager.
+    """
+    pytest.importorskip('boto3')
+
+    from benchmarks.rotation_benchmark import load_rotation_lambda
+    from checkpoints import CheckpointStore
+    from connection_result import ConnectTimeoutEstimator
+    from server_profile import ServerProfileCache
+
+    for name in ['PASSWORD_POLICY', 'PASSWORD_GENERATOR', 'SHARED_ROTATION']:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('SECRETS_MANAGER_ENDPOINT', 'https://secretsmanager.eu-west-1.amazonaws.com')
+    monkeypatch.setenv('INITIAL_DATABASE_PASSWORD', INITIAL_PASSWORD)
+
+    lambda_function = load_rotation_lambda()
+    lambda_function.connection_pool.clear()
+    monkeypatch.setattr(lambda_function, 'connect_timeouts', ConnectTimeoutEstimator())
+    monkeypatch.setattr(lambda_function, 'server_profiles', ServerProfileCache())
+    monkeypatch.setattr(lambda_function, 'checkpoints', CheckpointStore(str(tmp_path / 'checkpoints')))
+    monkeypatch.setattr(lambda_function, '_runtime_context', lambda_function.RuntimeContext(
+        lambda_function.read_runtime_config(),
+        service_client=secrets_manager
+    ))
+
+    yield lambda_function
+
+    lambda_function.connection_pool.clear()
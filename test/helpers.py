@@ -0,0 +1,78 @@
+import os
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+SINGLE_USER_PACKAGE_SRC = os.path.join(ROOT, 'aws_secret_cdk', 'aurora_mysql_single_user', 'package_src')
+
+
+def find_interpreter(version: str) -> str:
+    """
+    Finds a Python interpreter of a given version on PATH, skipping the test if there is none.
+
+    :param version: Version of the interpreter, e.g. 2.7.
+
+    :return: Name of the interpreter executable.
+    """
+    executable = f'python{version}'
+    try:
+        subprocess.check_output([executable, '-c', 'pass'], stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip(f'{executable} is not available.')
+    return executable
+
+
+def subprocess_environment() -> dict:
+    """
+    Environment of a subprocess which imports the benchmarks package of this repository.
+    """
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, environment.get('PYTHONPATH')]))
+    return environment
+
+
+SECRET_ID = 'arn:aws:secretsmanager:eu-west-1:000000000000:secret:TestRdsSecret'
+USERNAME = 'rotation_user'
+INITIAL_PASSWORD = 'InitialPassword1'
+
+STEPS = ['createSecret', 'setSecret', 'testSecret', 'finishSecret']
+
+
+def create_secret(secrets_manager, server, secret_id: str = SECRET_ID, **values) -> None:
+    """
+    Creates a secret of the single user rotation in the fake secrets manager.
+
+    :param secrets_manager: The fake secrets manager.
+    :param server: The fake MySQL server of the secret.
+    :param secret_id: The secret identifier.
+    :param values: Values to set on top of the default secret dictionary.
+    """
+    secret = {
+        'engine': 'mysql',
+        'host': '127.0.0.1',
+        'port': server.port,
+        'username': USERNAME,
+        'password': INITIAL_PASSWORD,
+        'dbname': None
+    }
+    secret.update(values)
+    secrets_manager.create_secret(secret_id, secret)
+
+
+def rotate(handler, secrets_manager, secret_id: str = SECRET_ID, steps=None) -> str:
+    """
+    Runs rotation steps of a new rotation of a secret.
+
+    :param handler: The lambda handler to invoke.
+    :param secrets_manager: The fake secrets manager.
+    :param secret_id: The secret identifier.
+    :param steps: Steps to run, every step if not given.
+
+    :return: The ClientRequestToken of the rotation.
+    """
+    token = secrets_manager.start_rotation(secret_id)
+    for step in steps or STEPS:
+        handler({'SecretId': secret_id, 'ClientRequestToken': token, 'Step': step}, None)
+    return token
@@ -0,0 +1,101 @@
+import asyncio
+import socket
+import time
+
+import pymysql
+import pytest
+
+import async_mysql
+from test.helpers import INITIAL_PASSWORD, SECRET_ID, USERNAME, create_secret, rotate
+
+
+@pytest.fixture
+def stalled_server():
+    """
+    A server which accepts TCP connections and never says a word.
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(16)
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def async_rotation_lambda(rotation_lambda):
+    import async_lambda_function
+    return async_lambda_function
+
+
+def test_async_rotation_sets_the_current_password_in_the_database(async_rotation_lambda, secrets_manager, mysql_server):
+    create_secret(secrets_manager, mysql_server, password='GeneratedPassword1')
+
+    for _ in range(2):
+        rotate(async_rotation_lambda.lambda_handler, secrets_manager)
+        assert mysql_server.users[USERNAME] == secrets_manager.secret_dict(SECRET_ID)['password']
+
+
+def test_probe_closes_every_connection_but_the_winning_one(async_rotation_lambda, mysql_server):
+    good = {'host': '127.0.0.1', 'port': mysql_server.port, 'username': USERNAME, 'password': INITIAL_PASSWORD}
+    candidates = [('wrong', dict(good, password='WrongPassword1')), ('good', good), ('also good', dict(good))]
+
+    async def probe():
+        result = await async_rotation_lambda.probe_credentials(candidates)
+        await result.connection.close()
+        return result, async_mysql.all_tasks(asyncio.get_event_loop())
+
+    result, tasks = asyncio.run(probe())
+
+    assert result.name in ['good', 'also good']
+    assert len(tasks) == 1
+
+
+def test_login_runs_in_the_task_which_awaits_it(stalled_server):
+    async def login():
+        attempt = asyncio.ensure_future(async_mysql.connect('127.0.0.1', USERNAME, INITIAL_PASSWORD, port=stalled_server, connect_timeout=5))
+        await asyncio.sleep(0.1)
+        tasks = async_mysql.all_tasks(asyncio.get_event_loop())
+        attempt.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await attempt
+        return tasks
+
+    # A cancelled login can not leave a task of its own behind, e.g. with an exception nobody retrieves.
+    assert len(asyncio.run(login())) == 2
+
+
+def test_stalled_handshake_times_out(stalled_server):
+    start = time.time()
+
+    with pytest.raises(pymysql.OperationalError) as error:
+        asyncio.run(async_mysql.connect('127.0.0.1', USERNAME, INITIAL_PASSWORD, port=stalled_server, connect_timeout=0.2))
+
+    assert error.value.args[0] == 2013
+    assert time.time() - start < 2
+
+
+def test_wrong_password_is_an_access_denied_error(mysql_server):
+    with pytest.raises(pymysql.OperationalError) as error:
+        asyncio.run(async_mysql.connect('127.0.0.1', USERNAME, 'WrongPassword1', port=mysql_server.port, connect_timeout=5))
+
+    assert error.value.args[0] == 1045
+
+
+def test_values_are_quoted_like_the_synchronous_client(mysql_server):
+    password = "a\\b'c"
+
+    async def set_password():
+        conn = await async_mysql.connect('127.0.0.1', USERNAME, INITIAL_PASSWORD, port=mysql_server.port)
+        await conn.query('SET PASSWORD = %s', (password,))
+        await conn.close()
+
+    asyncio.run(set_password())
+
+    assert mysql_server.users[USERNAME] == password
+
+
+def test_with_timeout_raises_a_timeout_error():
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(async_mysql.with_timeout(asyncio.sleep(5), 0.05))
+
+    assert asyncio.run(async_mysql.with_timeout(asyncio.sleep(0, 'done'), 0.05)) == 'done'
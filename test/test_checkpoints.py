@@ -0,0 +1,65 @@
+import os
+import time
+
+from checkpoints import CheckpointStore
+
+ARN = 'arn:aws:secretsmanager:eu-west-1:000000000000:secret:TestRdsSecret'
+
+
+def test_saved_values_are_merged(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+
+    store.save(ARN, 'token', credential='AWSCURRENT')
+    store.save(ARN, 'token', password_set=True)
+
+    assert store.load(ARN, 'token') == {'credential': 'AWSCURRENT', 'password_set': True}
+    assert store.load(ARN, 'other-token') == {}
+
+
+def test_checkpoints_survive_a_new_store(tmp_path):
+    CheckpointStore(str(tmp_path)).save(ARN, 'token', credential='AWSPENDING')
+
+    assert CheckpointStore(str(tmp_path)).load(ARN, 'token') == {'credential': 'AWSPENDING'}
+
+
+def test_expired_checkpoint_is_ignored(tmp_path):
+    store = CheckpointStore(str(tmp_path), ttl=60)
+    store.save(ARN, 'token', credential='AWSCURRENT')
+
+    path = store._path(ARN, 'token')
+    with open(path, 'w') as file:
+        file.write('{"updated": %f, "values": {"credential": "AWSCURRENT"}}' % (time.time() - 120))
+
+    assert store.load(ARN, 'token') == {}
+
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.save(ARN, 'token', credential='AWSCURRENT')
+
+    with open(store._path(ARN, 'token'), 'w') as file:
+        file.write('{')
+
+    assert store.load(ARN, 'token') == {}
+
+
+def test_discard_prunes_abandoned_checkpoints(tmp_path):
+    store = CheckpointStore(str(tmp_path), ttl=60)
+    store.save(ARN, 'abandoned', credential='AWSCURRENT')
+    store.save(ARN, 'token', credential='AWSCURRENT')
+    stale = time.time() - 120
+    os.utime(store._path(ARN, 'abandoned'), (stale, stale))
+
+    store.discard(ARN, 'token')
+
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_saving_to_a_read_only_location_is_not_an_error(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    store = CheckpointStore(str(blocker / 'checkpoints'))
+
+    store.save(ARN, 'token', credential='AWSCURRENT')
+
+    assert store.load(ARN, 'token') == {}
@@ -0,0 +1,213 @@
+import json
+
+import pytest
+
+core = pytest.importorskip('aws_cdk.core')
+
+from aws_cdk import aws_ec2, aws_rds  # noqa: E402
+from aws_cdk.aws_lambda import Runtime  # noqa: E402
+from aws_secret_cdk.aurora_mysql_single_user.rotation_code import RotationCode  # noqa: E402
+from aws_secret_cdk.aurora_mysql_multiuser_user.secret import Secret as MultiUserSecret  # noqa: E402
+from aws_secret_cdk.aurora_mysql_single_user.secret import Secret  # noqa: E402
+from aws_secret_cdk.aurora_mysql_single_user.shared_secret_rotation import SharedSecretRotation  # noqa: E402
+from aws_secret_cdk.password_policy import PasswordPolicy  # noqa: E402
+from aws_secret_cdk.vpc_parameters import VPCParameters  # noqa: E402
+
+
+class SynthStack:
+    """
+    A stack with a VPC, synthesized into its CloudFormation template.
+    """
+    def __init__(self) -> None:
+        self.app = core.App()
+        self.stack = core.Stack(self.app, 'Test', env=core.Environment(account='000000000000', region='eu-west-1'))
+        vpc = aws_ec2.Vpc(self.stack, 'Vpc', max_azs=2, nat_gateways=1)
+        self.vpc_parameters = VPCParameters(
+            rotation_lambda_vpc=vpc,
+            rotation_lambda_security_groups=[aws_ec2.SecurityGroup(self.stack, 'SecurityGroup', vpc=vpc)],
+            rotation_lambda_subnets=vpc.private_subnets
+        )
+        self.__databases = 0
+
+    def database(self) -> aws_rds.CfnDBCluster:
+        self.__databases += 1
+        return aws_rds.CfnDBCluster(
+            self.stack,
+            f'Database{self.__databases}',
+            engine='aurora-mysql',
+            master_username='admin',
+            master_user_password='InitialPassword1',
+            database_name='test',
+            db_cluster_identifier=f'test-{self.__databases}'
+        )
+
+    def template(self) -> dict:
+        return self.app.synth().get_stack_by_name(self.stack.stack_name).template
+
+
+def resources(template: dict, resource_type: str) -> list:
+    return [resource['Properties'] for resource in template['Resources'].values() if resource['Type'] == resource_type]
+
+
+def policy_actions(template: dict) -> list:
+    documents = [policy['PolicyDocument'] for policy in resources(template, 'AWS::IAM::Policy')]
+    for role in resources(template, 'AWS::IAM::Role'):
+        documents += [policy['PolicyDocument'] for policy in role.get('Policies', [])]
+
+    actions = []
+    for document in documents:
+        for statement in document['Statement']:
+            action = statement['Action']
+            actions += action if isinstance(action, list) else [action]
+    return actions
+
+
+def test_secret_is_created_with_a_password_following_the_policy():
+    test_stack = SynthStack()
+    Secret(
+        stack=test_stack.stack,
+        prefix='Test',
+        vpc_parameters=test_stack.vpc_parameters,
+        database=test_stack.database(),
+        password_policy=PasswordPolicy(length=40, exclude_punctuation=True)
+    )
+
+    generator = resources(test_stack.template(), 'AWS::SecretsManager::Secret')[0]['GenerateSecretString']
+
+    assert generator['GenerateStringKey'] == 'password'
+    assert generator['PasswordLength'] == 40
+    assert generator['ExcludePunctuation'] is True
+    assert generator['ExcludeCharacters'] == '/@"\'\\'
+
+
+def test_secret_without_a_policy_keeps_its_generator():
+    test_stack = SynthStack()
+    Secret(stack=test_stack.stack, prefix='Test', vpc_parameters=test_stack.vpc_parameters, database=test_stack.database())
+
+    generator = resources(test_stack.template(), 'AWS::SecretsManager::Secret')[0]['GenerateSecretString']
+
+    assert set(generator) == {'GenerateStringKey', 'SecretStringTemplate'}
+
+
+@pytest.mark.parametrize('use_api', [False, True])
+def test_get_random_password_is_granted_only_to_use_the_api(use_api):
+    test_stack = SynthStack()
+    Secret(
+        stack=test_stack.stack,
+        prefix='Test',
+        vpc_parameters=test_stack.vpc_parameters,
+        database=test_stack.database(),
+        password_policy=PasswordPolicy(use_api=use_api)
+    )
+
+    template = test_stack.template()
+
+    assert ('secretsmanager:GetRandomPassword' in policy_actions(template)) is use_api
+    schedule, = resources(template, 'AWS::SecretsManager::RotationSchedule')
+    assert schedule['RotationRules'] == {'AutomaticallyAfterDays': 30}
+
+
+def secrets_manager_statements(template: dict) -> list:
+    statements = []
+    for role in resources(template, 'AWS::IAM::Role'):
+        for policy in role.get('Policies', []):
+            statements += policy['PolicyDocument']['Statement']
+    statements += [statement for policy in resources(template, 'AWS::IAM::Policy') for statement in policy['PolicyDocument']['Statement']]
+    return [statement for statement in statements if 'secretsmanager:GetSecretValue' in statement['Action']]
+
+
+def test_shared_rotation_policy_does_not_grow_with_the_number_of_secrets():
+    test_stack = SynthStack()
+    shared_rotation = SharedSecretRotation(stack=test_stack.stack, prefix='Test', vpc_parameters=test_stack.vpc_parameters)
+    for index in range(3):
+        Secret(
+            stack=test_stack.stack,
+            prefix=f'Test{index}',
+            vpc_parameters=test_stack.vpc_parameters,
+            database=test_stack.database(),
+            shared_rotation=shared_rotation
+        )
+
+    template = test_stack.template()
+
+    statement, = secrets_manager_statements(template)
+    assert statement['Resource'] == '*'
+    assert 'secretsmanager:ResourceTag/aws-secret-cdk:rotation-function' in json.dumps(statement['Condition'])
+    assert len(resources(template, 'AWS::Lambda::Function')) == 1
+    assert len(resources(template, 'AWS::SecretsManager::RotationSchedule')) == 3
+    # Every secret and its initial password secret.
+    assert len(resources(template, 'AWS::SecretsManager::Secret')) == 6
+
+
+def test_shared_rotation_secrets_refer_to_their_initial_password():
+    test_stack = SynthStack()
+    shared_rotation = SharedSecretRotation(stack=test_stack.stack, prefix='Test', vpc_parameters=test_stack.vpc_parameters)
+    Secret(
+        stack=test_stack.stack,
+        prefix='Test',
+        vpc_parameters=test_stack.vpc_parameters,
+        database=test_stack.database(),
+        shared_rotation=shared_rotation
+    )
+
+    template = test_stack.template()
+
+    function, = resources(template, 'AWS::Lambda::Function')
+    assert 'INITIAL_DATABASE_PASSWORD' not in function['Environment']['Variables']
+    assert function['Environment']['Variables']['SHARED_ROTATION'] == 'true'
+    generated, = [secret['GenerateSecretString'] for secret in resources(template, 'AWS::SecretsManager::Secret') if 'GenerateSecretString' in secret]
+    assert 'initial_password_arn' in json.dumps(generated['SecretStringTemplate'])
+
+
+def test_lambda_function_descriptions_fit_the_limit():
+    test_stack = SynthStack()
+    shared_rotation = SharedSecretRotation(stack=test_stack.stack, prefix='Shared', vpc_parameters=test_stack.vpc_parameters)
+    Secret(stack=test_stack.stack, prefix='Shared', vpc_parameters=test_stack.vpc_parameters, database=test_stack.database(), shared_rotation=shared_rotation)
+    master = Secret(stack=test_stack.stack, prefix='Dedicated', vpc_parameters=test_stack.vpc_parameters, database=test_stack.database())
+    MultiUserSecret(
+        stack=test_stack.stack,
+        prefix='MultiUser',
+        vpc_parameters=test_stack.vpc_parameters,
+        database=test_stack.database(),
+        master_secret=master.secret,
+        username='app_user'
+    )
+
+    functions = resources(test_stack.template(), 'AWS::Lambda::Function')
+
+    assert len(functions) == 3
+    for function in functions:
+        assert len(function['Description']) <= 256
+
+
+def test_rotation_code_is_shared_within_a_stack_only():
+    first_stack, second_stack = SynthStack(), SynthStack()
+
+    code = RotationCode.of(first_stack.stack, Runtime.PYTHON_3_8)
+
+    assert RotationCode.of(first_stack.stack, Runtime.PYTHON_3_8) is code
+    assert RotationCode.of(first_stack.stack, Runtime.PYTHON_2_7) is not code
+    assert RotationCode.of(second_stack.stack, Runtime.PYTHON_3_8) is not code
+
+
+def test_multiuser_secret_refers_to_its_master_secret():
+    test_stack = SynthStack()
+    database = test_stack.database()
+    master = Secret(stack=test_stack.stack, prefix='Master', vpc_parameters=test_stack.vpc_parameters, database=database)
+    MultiUserSecret(
+        stack=test_stack.stack,
+        prefix='MultiUser',
+        vpc_parameters=test_stack.vpc_parameters,
+        database=database,
+        master_secret=master.secret,
+        username='app_user'
+    )
+
+    template = test_stack.template()
+
+    handlers = sorted(function['Handler'] for function in resources(template, 'AWS::Lambda::Function'))
+    assert handlers == ['lambda_function.lambda_handler', 'multiuser_lambda_function.lambda_handler']
+    generators = [secret['GenerateSecretString'] for secret in resources(template, 'AWS::SecretsManager::Secret')]
+    multiuser_template, = [generator['SecretStringTemplate'] for generator in generators if 'masterarn' in json.dumps(generator)]
+    assert 'app_user' in json.dumps(multiuser_template)
+    assert len(resources(template, 'AWS::SecretsManager::RotationSchedule')) == 2
@@ -0,0 +1,153 @@
+import ast
+import filecmp
+import os
+import subprocess
+import sys
+
+import pytest
+
+from aws_secret_cdk.aurora_mysql_single_user.deployment_package import DeploymentPackage, _SourceStripper
+from benchmarks.fake_mysql_server import FakeMySQLServer
+from test.helpers import SINGLE_USER_PACKAGE_SRC, find_interpreter, subprocess_environment
+
+CURRENT_RUNTIME = f'python{sys.version_info[0]}.{sys.version_info[1]}'
+
+# Written for both Python 2 and 3: imports every module which does not need boto3 and changes a password.
+LOGIN_SCRIPT = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import caching_client, checkpoints, connection_pool, connection_result, credential_probe
+import instrumentation, password_generator, preflight, profiling, server_profile
+import pymysql
+conn = pymysql.connect(host='127.0.0.1', port=int(sys.argv[2]), user='rotation_user', password='Password1')
+conn.cursor().execute('SET PASSWORD = %s', ('Password2',))
+conn.close()
+'''
+
+# Runs the rotation benchmark against a deployment package instead of the sources.
+ROTATION_SCRIPT = '''
+import sys
+import benchmarks.rotation_benchmark as rotation_benchmark
+rotation_benchmark.PACKAGE_SRC = sys.argv[1]
+rotation_benchmark.RotationBenchmark(iterations=2).run()
+'''
+
+
+def build(runtime: str, output_path: str) -> str:
+    return DeploymentPackage(SINGLE_USER_PACKAGE_SRC, runtime).build(str(output_path)).output_path
+
+
+def python_files(path: str):
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name.endswith('.py'):
+                yield os.path.join(root, name)
+
+
+def test_python2_package_is_a_copy_of_the_sources(tmp_path):
+    output_path = build('python2.7', tmp_path)
+
+    assert not os.path.exists(os.path.join(output_path, 'async_lambda_function.py'))
+    assert not os.path.exists(os.path.join(output_path, '__init__.py'))
+    for path in python_files(output_path):
+        source = os.path.join(SINGLE_USER_PACKAGE_SRC, os.path.relpath(path, output_path))
+        assert filecmp.cmp(path, source, shallow=False), path
+
+
+def count_python2_branches(path: str) -> int:
+    with open(path, encoding='utf-8') as file:
+        tree = ast.parse(file.read(), filename=path)
+    return sum(1 for node in ast.walk(tree) if isinstance(node, ast.If) and 'PY2' in ast.dump(node.test))
+
+
+def test_python3_package_has_no_docstrings_or_python2_modules(tmp_path):
+    output_path = build('python3.8', tmp_path)
+
+    assert not os.path.exists(os.path.join(output_path, 'pymysql', '_socketio.py'))
+    assert os.path.exists(os.path.join(output_path, 'async_lambda_function.py'))
+    for path in python_files(output_path):
+        with open(path, encoding='utf-8') as file:
+            source = file.read()
+        assert '_socketio' not in source, path
+        for node in ast.walk(ast.parse(source, filename=path)):
+            if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                assert ast.get_docstring(node, clean=False) is None, path
+
+
+def test_python3_package_folds_python2_branches(tmp_path):
+    output_path = build('python3.8', tmp_path)
+
+    source_branches = sum(count_python2_branches(path) for path in python_files(SINGLE_USER_PACKAGE_SRC))
+    package_branches = sum(count_python2_branches(path) for path in python_files(output_path))
+    # Elif chains are kept as they are.
+    assert package_branches < source_branches / 2
+
+
+def test_python3_package_is_smaller_than_the_sources(tmp_path):
+    report = DeploymentPackage(SINGLE_USER_PACKAGE_SRC, 'python3.8').build(str(tmp_path))
+
+    assert report.artifact['zipped_bytes'] < report.source['zipped_bytes']
+
+
+def test_python3_package_does_not_depend_on_the_build_interpreter(tmp_path):
+    first = build('python3.8', tmp_path / 'first')
+    second = build('python3.8', tmp_path / 'second')
+
+    comparison = filecmp.dircmp(first, second)
+    assert not comparison.diff_files and not comparison.left_only and not comparison.right_only
+
+
+def test_source_stripper_folds_python2_branches():
+    source = (
+        '"""Module docstring."""\n'
+        'if PY2:\n'
+        '    import cStringIO as io\n'
+        'else:\n'
+        '    import io\n'
+        '\n'
+        'def read():\n'
+        '    """Function docstring."""\n'
+        '    if not PY2 and JYTHON:\n'
+        '        return 1\n'
+        '    return 2\n'
+    )
+
+    stripped = _SourceStripper(source, 'module.py', DeploymentPackage.PY3_CONSTANTS).strip()
+
+    # Blank lines between statements belong to no statement, hence they are dropped too.
+    assert stripped == (
+        'import io\n'
+        'def read():\n'
+        '    return 2\n'
+    )
+
+
+def test_source_stripper_keeps_a_body_of_a_function_with_a_docstring_only():
+    source = 'class Error(Exception):\n    """Docstring."""\n'
+
+    stripped = _SourceStripper(source, 'module.py', DeploymentPackage.PY3_CONSTANTS).strip()
+
+    assert stripped == 'class Error(Exception):\n    pass\n'
+
+
+@pytest.mark.parametrize('runtime, version', [
+    ('python2.7', '2.7'),
+    ('python3.8', '3.8'),
+    (CURRENT_RUNTIME, None)
+])
+def test_package_logs_in_on_its_runtime(tmp_path, runtime, version):
+    executable = find_interpreter(version) if version else sys.executable
+    output_path = build(runtime, tmp_path)
+
+    with FakeMySQLServer(users={'rotation_user': 'Password1'}) as server:
+        subprocess.check_call([executable, '-c', LOGIN_SCRIPT, output_path, str(server.port)])
+
+    assert server.users['rotation_user'] == 'Password2'
+    assert server.logins == 1
+
+
+def test_python3_package_rotates_a_secret(tmp_path):
+    pytest.importorskip('boto3')
+    output_path = build(CURRENT_RUNTIME, tmp_path)
+
+    subprocess.check_call([sys.executable, '-c', ROTATION_SCRIPT, output_path], env=subprocess_environment())
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from test.helpers import INITIAL_PASSWORD, SECRET_ID, USERNAME, create_secret, rotate
+
+
+def credentials(mysql_server, password):
+    return {'host': '127.0.0.1', 'port': mysql_server.port, 'username': USERNAME, 'password': password, 'dbname': None}
+
+
+def test_rotation_sets_the_current_password_in_the_database(rotation_lambda, secrets_manager, mysql_server):
+    create_secret(secrets_manager, mysql_server)
+
+    for _ in range(3):
+        rotate(rotation_lambda.lambda_handler, secrets_manager)
+        assert mysql_server.users[USERNAME] == secrets_manager.secret_dict(SECRET_ID)['password']
+
+    assert secrets_manager.secret_dict(SECRET_ID, 'AWSPREVIOUS')['password'] != mysql_server.users[USERNAME]
+
+
+def test_rotation_falls_back_to_the_initial_password(rotation_lambda, secrets_manager, mysql_server):
+    # A secret generates its own password while the database is created with the initial one.
+    create_secret(secrets_manager, mysql_server, password='GeneratedPassword1')
+
+    rotate(rotation_lambda.lambda_handler, secrets_manager)
+
+    assert mysql_server.users[USERNAME] == secrets_manager.secret_dict(SECRET_ID)['password']
+    assert mysql_server.users[USERNAME] != INITIAL_PASSWORD
+
+
+def test_rotation_fails_without_valid_credentials(rotation_lambda, secrets_manager, mysql_server):
+    create_secret(secrets_manager, mysql_server, password='WrongPassword1')
+    mysql_server.users[USERNAME] = 'UnknownPassword1'
+
+    with pytest.raises(ValueError, match='Unable to log into database'):
+        rotate(rotation_lambda.lambda_handler, secrets_manager)
+
+    assert mysql_server.users[USERNAME] == 'UnknownPassword1'
+
+
+def test_rotation_reads_every_secret_version_once_per_step(rotation_lambda, secrets_manager, mysql_server):
+    create_secret(secrets_manager, mysql_server)
+    token = secrets_manager.start_rotation(SECRET_ID)
+    rotation_lambda.lambda_handler({'SecretId': SECRET_ID, 'ClientRequestToken': token, 'Step': 'createSecret'}, None)
+    secrets_manager.reset_calls()
+
+    rotation_lambda.lambda_handler({'SecretId': SECRET_ID, 'ClientRequestToken': token, 'Step': 'setSecret'}, None)
+
+    # AWSPENDING, AWSCURRENT and AWSPREVIOUS, which does not exist yet.
+    assert secrets_manager.calls['DescribeSecret'] == 1
+    assert secrets_manager.calls['GetSecretValue'] == 3
+
+
+def test_pooled_connections_are_reauthenticated_with_change_user(rotation_lambda, secrets_manager, mysql_server):
+    create_secret(secrets_manager, mysql_server)
+
+    rotate(rotation_lambda.lambda_handler, secrets_manager)
+
+    # testSecret logs in with the new password over the connection setSecret logged in with.
+    assert mysql_server.change_users >= 1
+    assert mysql_server.connections_opened == mysql_server.logins + mysql_server.failed_logins
+
+
+def test_change_user_with_a_wrong_password_drops_the_connection(rotation_lambda, secrets_manager, mysql_server):
+    conn = rotation_lambda.connect(credentials(mysql_server, INITIAL_PASSWORD)).connection
+    rotation_lambda.release_connection(conn)
+
+    result = rotation_lambda.connect(credentials(mysql_server, 'WrongPassword1'))
+
+    assert result.status == result.AUTH_FAILURE
+    assert not conn.open
+    assert rotation_lambda.connection_pool.acquire('127.0.0.1', mysql_server.port) is None
+    assert mysql_server.change_users == 0 and mysql_server.failed_logins == 1
+
+
+def test_retried_set_secret_resumes_with_the_pending_password(rotation_lambda, secrets_manager, mysql_server):
+    create_secret(secrets_manager, mysql_server, password='GeneratedPassword1')
+    token = rotate(rotation_lambda.lambda_handler, secrets_manager, steps=['createSecret', 'setSecret'])
+    rotation_lambda.connection_pool.clear()
+    mysql_server.reset_counters()
+
+    rotation_lambda.lambda_handler({'SecretId': SECRET_ID, 'ClientRequestToken': token, 'Step': 'setSecret'}, None)
+
+    # The checkpoint says the password was set, hence no other credential is tried.
+    assert mysql_server.logins == 1
+    assert mysql_server.failed_logins == 0
+    assert mysql_server.users[USERNAME] == secrets_manager.secret_dict(SECRET_ID, 'AWSPENDING')['password']
+
+
+def test_finished_rotation_discards_its_checkpoint(rotation_lambda, secrets_manager, mysql_server):
+    create_secret(secrets_manager, mysql_server)
+
+    rotate(rotation_lambda.lambda_handler, secrets_manager)
+
+    assert os.listdir(rotation_lambda.checkpoints.directory) == []
+
+
+def test_invalid_step_is_rejected(rotation_lambda, secrets_manager, mysql_server):
+    create_secret(secrets_manager, mysql_server)
+
+    with pytest.raises(ValueError, match='Invalid step'):
+        rotate(rotation_lambda.lambda_handler, secrets_manager, steps=['createSecret', 'rotateSecret'])
@@ -0,0 +1,78 @@
+import pytest
+
+from benchmarks.fake_mysql_server import FakeMySQLServer
+from test.helpers import SECRET_ID, create_secret, rotate
+
+MASTER_SECRET_ID = 'arn:aws:secretsmanager:eu-west-1:000000000000:secret:TestRdsMasterSecret'
+MASTER_USERNAME = 'admin'
+MASTER_PASSWORD = 'MasterPassword1'
+APP_USERNAME = 'app_user'
+APP_PASSWORD = 'AppPassword1'
+
+
+@pytest.fixture
+def multiuser_lambda(rotation_lambda):
+    import multiuser_lambda_function
+
+    return multiuser_lambda_function
+
+
+@pytest.fixture
+def database():
+    users = {MASTER_USERNAME: MASTER_PASSWORD, APP_USERNAME: APP_PASSWORD}
+    grants = {
+        APP_USERNAME: [
+            'GRANT USAGE ON *.* TO `app_user`@`%`',
+            'GRANT SELECT, INSERT ON `app`.* TO `app_user`@`%` WITH GRANT OPTION'
+        ]
+    }
+    with FakeMySQLServer(users=users, grants=grants) as server:
+        yield server
+
+
+@pytest.fixture
+def secrets(secrets_manager, database):
+    create_secret(secrets_manager, database, secret_id=MASTER_SECRET_ID, username=MASTER_USERNAME, password=MASTER_PASSWORD)
+    create_secret(secrets_manager, database, username=APP_USERNAME, password=APP_PASSWORD, masterarn=MASTER_SECRET_ID)
+
+
+def test_first_rotation_creates_the_clone_with_the_same_grants(multiuser_lambda, secrets_manager, database, secrets):
+    rotate(multiuser_lambda.lambda_handler, secrets_manager)
+
+    current = secrets_manager.secret_dict(SECRET_ID)
+    assert current['username'] == 'app_user_clone'
+    assert database.users['app_user_clone'] == current['password']
+    assert database.users[APP_USERNAME] == APP_PASSWORD
+    assert database.grants['app_user_clone'] == [
+        "GRANT USAGE ON *.* TO 'app_user_clone'",
+        "GRANT SELECT, INSERT ON `app`.* TO 'app_user_clone' WITH GRANT OPTION"
+    ]
+
+
+def test_rotations_alternate_between_the_user_and_its_clone(multiuser_lambda, secrets_manager, database, secrets):
+    rotate(multiuser_lambda.lambda_handler, secrets_manager)
+    clone_password = database.users['app_user_clone']
+
+    rotate(multiuser_lambda.lambda_handler, secrets_manager)
+
+    current = secrets_manager.secret_dict(SECRET_ID)
+    assert current['username'] == APP_USERNAME
+    assert database.users[APP_USERNAME] == current['password'] != APP_PASSWORD
+    # The previous user keeps its password, so its connections keep working.
+    assert database.users['app_user_clone'] == clone_password
+    assert database.users[MASTER_USERNAME] == MASTER_PASSWORD
+
+
+def test_rotation_fails_without_a_working_master_secret(multiuser_lambda, secrets_manager, database, secrets):
+    database.users[MASTER_USERNAME] = 'ChangedPassword1'
+
+    with pytest.raises(ValueError, match='master secret'):
+        rotate(multiuser_lambda.lambda_handler, secrets_manager)
+
+    assert 'app_user_clone' not in database.users
+
+
+@pytest.mark.parametrize('event', [{'SecretIds': [SECRET_ID]}, {'SecretId': SECRET_ID, 'DryRun': True}])
+def test_batch_rotations_and_dry_runs_are_rejected(multiuser_lambda, event):
+    with pytest.raises(ValueError, match='not supported'):
+        multiuser_lambda.lambda_handler(event, None)
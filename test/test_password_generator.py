@@ -0,0 +1,45 @@
+import string
+
+import pytest
+
+from password_generator import PasswordPolicy, generate_password
+
+
+def test_default_policy_matches_the_rotation_defaults():
+    password = generate_password(PasswordPolicy())
+
+    assert len(password) == 32
+    assert not set(password) & set('/@"\'\\')
+    for characters in [string.ascii_lowercase, string.ascii_uppercase, string.digits, string.punctuation]:
+        assert set(password) & set(characters)
+
+
+def test_policy_is_parsed_from_get_random_password_parameters():
+    policy = PasswordPolicy.from_json('{"PasswordLength": 12, "ExcludePunctuation": true, "ExcludeCharacters": "aA"}')
+
+    for _ in range(20):
+        password = generate_password(policy)
+        assert len(password) == 12
+        assert not set(password) & set(string.punctuation + 'aA')
+
+
+def test_empty_policy_is_the_default_one():
+    assert PasswordPolicy.from_json(None) == PasswordPolicy()
+    assert PasswordPolicy.from_json('') == PasswordPolicy()
+
+
+def test_unknown_policy_parameters_are_rejected():
+    with pytest.raises(ValueError, match='Unknown password policy parameters: Length'):
+        PasswordPolicy.from_json('{"Length": 12}')
+
+
+def test_policy_excluding_every_character_is_rejected():
+    policy = PasswordPolicy(ExcludeNumbers=True, ExcludePunctuation=True, ExcludeUppercase=True, ExcludeLowercase=True)
+
+    with pytest.raises(ValueError, match='excludes every character'):
+        generate_password(policy)
+
+
+def test_password_too_short_for_every_required_type_is_rejected():
+    with pytest.raises(ValueError, match='too short'):
+        generate_password(PasswordPolicy(PasswordLength=3))
@@ -0,0 +1,192 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from aws_secret_cdk.secret_cache import SecretCache, rds_secret_name
+from benchmarks.fake_secrets_manager import FakeSecretsManager, ResourceNotFoundException
+
+SECRET_ID = 'TestRdsSecret'
+
+
+class Clock:
+    """
+    A clock which only moves when told to.
+    """
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FailingClient:
+    """
+    Fails every call once told to, like an endpoint which became unreachable.
+    """
+    def __init__(self, client: FakeSecretsManager) -> None:
+        self.client = client
+        self.failing = False
+
+    def get_secret_value(self, **kwargs):
+        if self.failing:
+            raise ConnectionError('Endpoint is unreachable.')
+        return self.client.get_secret_value(**kwargs)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def secret(secrets_manager):
+    secrets_manager.create_secret(SECRET_ID, {'username': 'user', 'password': 'Password1'})
+
+
+def put_current(secrets_manager, password: str) -> None:
+    secrets_manager.put_secret_value(
+        SecretId=SECRET_ID,
+        ClientRequestToken=password,
+        SecretString=json.dumps({'username': 'user', 'password': password}),
+        VersionStages=['AWSCURRENT']
+    )
+
+
+def wait_for(condition) -> None:
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out.'
+        time.sleep(0.01)
+
+
+def test_values_are_served_from_memory_until_they_expire(secrets_manager, secret, clock):
+    cache = SecretCache(client=secrets_manager, ttl=100, refresh_ahead=0, clock=clock)
+
+    assert cache.get_secret_dict(SECRET_ID)['password'] == 'Password1'
+    put_current(secrets_manager, 'Password2')
+    clock.now = 99
+    assert cache.get_secret_dict(SECRET_ID)['password'] == 'Password1'
+    clock.now = 100
+    assert cache.get_secret_dict(SECRET_ID)['password'] == 'Password2'
+
+    assert secrets_manager.calls['GetSecretValue'] == 2
+    assert cache.statistics() == {'Hits': 1, 'Misses': 2, 'CoalescedMisses': 0, 'Refreshes': 0, 'RefreshErrors': 0, 'ApiCalls': 2}
+
+
+def test_values_are_refreshed_in_the_background_before_they_expire(secrets_manager, secret, clock):
+    cache = SecretCache(client=secrets_manager, ttl=100, refresh_ahead=0.2, clock=clock)
+    cache.get_secret_dict(SECRET_ID)
+    put_current(secrets_manager, 'Password2')
+
+    clock.now = 80
+    # The cached value is served while the refresh runs.
+    assert cache.get_secret_dict(SECRET_ID)['password'] == 'Password1'
+    wait_for(lambda: cache.statistics()['Refreshes'] == 1)
+
+    assert cache.get_secret_dict(SECRET_ID)['password'] == 'Password2'
+    assert cache.statistics()['Misses'] == 1
+
+
+def test_failed_background_refresh_serves_the_cached_value(secrets_manager, secret, clock):
+    client = FailingClient(secrets_manager)
+    cache = SecretCache(client=client, ttl=100, refresh_ahead=0.2, clock=clock)
+    cache.get_secret_dict(SECRET_ID)
+    client.failing = True
+
+    clock.now = 80
+    assert cache.get_secret_dict(SECRET_ID)['password'] == 'Password1'
+    wait_for(lambda: cache.statistics()['RefreshErrors'] == 1)
+
+    # No new refresh is started until the retry delay passed.
+    assert cache.get_secret_dict(SECRET_ID)['password'] == 'Password1'
+    assert cache.statistics()['ApiCalls'] == 2
+
+    clock.now = 80 + SecretCache.REFRESH_RETRY_SECONDS
+    client.failing = False
+    cache.get_secret_dict(SECRET_ID)
+    wait_for(lambda: cache.statistics()['Refreshes'] == 1)
+    assert cache.statistics()['ApiCalls'] == 3
+
+
+def test_concurrent_misses_share_a_single_api_call(clock):
+    secrets_manager = FakeSecretsManager(latency=0.2)
+    secrets_manager.create_secret(SECRET_ID, {'username': 'user', 'password': 'Password1'})
+    cache = SecretCache(client=secrets_manager, clock=clock)
+    barrier = threading.Barrier(5)
+    passwords = []
+
+    def read():
+        barrier.wait()
+        passwords.append(cache.get_secret_dict(SECRET_ID)['password'])
+
+    threads = [threading.Thread(target=read) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert passwords == ['Password1'] * 5
+    assert secrets_manager.calls['GetSecretValue'] == 1
+    assert cache.statistics()['Misses'] == 1
+    assert cache.statistics()['CoalescedMisses'] == 4
+
+
+def test_new_current_version_drops_the_other_stages(secrets_manager, secret, clock):
+    cache = SecretCache(client=secrets_manager, clock=clock)
+    put_current(secrets_manager, 'Password2')
+    secrets_manager.update_secret_version_stage(SecretId=SECRET_ID, VersionStage='AWSPREVIOUS', MoveToVersionId='Password2')
+    cache.get_secret_value(SECRET_ID)
+    cache.get_secret_value(SECRET_ID, 'AWSPREVIOUS')
+
+    put_current(secrets_manager, 'Password3')
+    assert cache.get_secret_dict(SECRET_ID)['password'] == 'Password2'
+    assert json.loads(cache.refresh(SECRET_ID)['SecretString'])['password'] == 'Password3'
+    cache.get_secret_value(SECRET_ID, 'AWSPREVIOUS')
+
+    assert cache.statistics()['ApiCalls'] == 4
+
+
+def test_invalidate_drops_cached_values(secrets_manager, secret, clock):
+    cache = SecretCache(client=secrets_manager, clock=clock)
+    cache.get_secret_value(SECRET_ID)
+
+    cache.invalidate(SECRET_ID)
+    cache.get_secret_value(SECRET_ID)
+    cache.invalidate()
+    cache.get_secret_value(SECRET_ID)
+
+    assert secrets_manager.calls['GetSecretValue'] == 3
+
+
+def test_missing_secrets_are_not_cached(secrets_manager, clock):
+    cache = SecretCache(client=secrets_manager, clock=clock)
+
+    for _ in range(2):
+        with pytest.raises(ResourceNotFoundException):
+            cache.get_secret_value(SECRET_ID)
+
+    assert secrets_manager.calls['GetSecretValue'] == 2
+
+
+def test_published_statistics_are_counts_since_the_last_publication(secrets_manager, secret, clock):
+    cache = SecretCache(client=secrets_manager, clock=clock)
+    stream = io.StringIO()
+
+    cache.get_secret_value(SECRET_ID)
+    cache.get_secret_value(SECRET_ID)
+    cache.publish_statistics(stream=stream)
+    cache.get_secret_value(SECRET_ID)
+    cache.publish_statistics(namespace='Test', stream=stream)
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert (first['Hits'], first['Misses'], first['ApiCalls']) == (1, 1, 1)
+    assert (second['Hits'], second['Misses'], second['ApiCalls']) == (1, 0, 0)
+    assert second['_aws']['CloudWatchMetrics'][0]['Namespace'] == 'Test'
+
+
+def test_secret_names_follow_the_constructs():
+    assert rds_secret_name('Prefix') == 'PrefixRdsSecret'
+    assert rds_secret_name('Prefix', multi_user=True) == 'PrefixRdsMultiUserSecret'
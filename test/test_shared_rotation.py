@@ -0,0 +1,105 @@
+import pytest
+
+from benchmarks.fake_mysql_server import FakeMySQLServer
+from test.helpers import INITIAL_PASSWORD, SECRET_ID, USERNAME, create_secret, rotate
+
+INITIAL_PASSWORD_ID = 'arn:aws:secretsmanager:eu-west-1:000000000000:secret:TestRdsInitialPassword'
+
+
+@pytest.fixture
+def shared_rotation_lambda(rotation_lambda, monkeypatch, secrets_manager):
+    """
+    The rotation lambda function module configured like a shared rotation function.
+    """
+    monkeypatch.setenv('SHARED_ROTATION', 'true')
+    monkeypatch.delenv('INITIAL_DATABASE_PASSWORD')
+    monkeypatch.setattr(rotation_lambda, '_runtime_context', rotation_lambda.RuntimeContext(
+        rotation_lambda.read_runtime_config(),
+        service_client=secrets_manager
+    ))
+    return rotation_lambda
+
+
+def create_shared_secret(secrets_manager, server, secret_id: str = SECRET_ID, username: str = USERNAME) -> None:
+    # The password of a new secret is generated, the database still has the initial one.
+    create_secret(
+        secrets_manager,
+        server,
+        secret_id=secret_id,
+        username=username,
+        password='GeneratedPassword1',
+        initial_password_arn=INITIAL_PASSWORD_ID
+    )
+
+
+@pytest.fixture
+def initial_password_secret(secrets_manager):
+    secrets_manager.create_secret(INITIAL_PASSWORD_ID, {})
+    secrets_manager.put_secret_value(
+        SecretId=INITIAL_PASSWORD_ID,
+        ClientRequestToken='initial',
+        SecretString=INITIAL_PASSWORD,
+        VersionStages=['AWSCURRENT']
+    )
+    secrets_manager.reset_calls()
+
+
+def test_initial_password_is_read_from_its_own_secret(shared_rotation_lambda, secrets_manager, mysql_server, initial_password_secret):
+    create_shared_secret(secrets_manager, mysql_server)
+
+    rotate(shared_rotation_lambda.lambda_handler, secrets_manager)
+
+    assert mysql_server.users[USERNAME] == secrets_manager.secret_dict(SECRET_ID)['password']
+
+
+def test_initial_password_is_never_stored_in_the_secret(shared_rotation_lambda, secrets_manager, mysql_server, initial_password_secret):
+    create_shared_secret(secrets_manager, mysql_server)
+
+    for _ in range(2):
+        rotate(shared_rotation_lambda.lambda_handler, secrets_manager)
+
+    for stage in ['AWSCURRENT', 'AWSPREVIOUS']:
+        secret = secrets_manager.secret_dict(SECRET_ID, stage)
+        assert INITIAL_PASSWORD not in secret.values()
+        assert secret['initial_password_arn'] == INITIAL_PASSWORD_ID
+
+
+def test_batch_rotation_rotates_every_secret(shared_rotation_lambda, secrets_manager, initial_password_secret):
+    usernames = [f'user{index}' for index in range(5)]
+    with FakeMySQLServer(users={username: INITIAL_PASSWORD for username in usernames}) as server:
+        for username in usernames:
+            create_shared_secret(secrets_manager, server, secret_id=username, username=username)
+
+        summary = shared_rotation_lambda.lambda_handler({'SecretIds': usernames, 'MaxConcurrency': 3}, None)
+
+    assert (summary['Succeeded'], summary['Failed'], summary['Skipped']) == (5, 0, 0)
+    for username in usernames:
+        assert server.users[username] == secrets_manager.secret_dict(username)['password']
+
+
+def test_batch_rotation_skips_a_rotation_in_progress(shared_rotation_lambda, secrets_manager, mysql_server, initial_password_secret):
+    create_shared_secret(secrets_manager, mysql_server)
+    secrets_manager.start_rotation(SECRET_ID)
+
+    summary = shared_rotation_lambda.lambda_handler({'SecretIds': [SECRET_ID]}, None)
+
+    assert summary['Skipped'] == 1
+    assert 'in progress' in summary['Results'][0]['Reason']
+    assert mysql_server.users[USERNAME] == INITIAL_PASSWORD
+
+
+def test_batch_rotation_reports_failed_secrets(shared_rotation_lambda, secrets_manager, mysql_server, initial_password_secret):
+    create_shared_secret(secrets_manager, mysql_server)
+
+    summary = shared_rotation_lambda.lambda_handler({'SecretIds': [SECRET_ID, 'missing']}, None)
+
+    assert (summary['Succeeded'], summary['Failed']) == (1, 1)
+    assert summary['Results'][1]['SecretId'] == 'missing'
+    assert summary['Results'][1]['Status'] == 'failed'
+
+
+def test_batch_rotation_requires_a_shared_function(rotation_lambda, secrets_manager, mysql_server):
+    create_secret(secrets_manager, mysql_server)
+
+    with pytest.raises(ValueError, match='shared rotation function'):
+        rotation_lambda.lambda_handler({'SecretIds': [SECRET_ID]}, None)
@@ -0,0 +1,24 @@
+import pytest
+
+from benchmarks.synth_benchmark import MAX_SIZE, main
+
+
+def test_sizes_above_the_resource_limit_are_rejected():
+    with pytest.raises(SystemExit) as error:
+        main(['--sizes', '1', str(MAX_SIZE + 1)])
+
+    assert error.value.code == 2
+
+
+def test_jsii_calls_are_counted():
+    pytest.importorskip('aws_cdk.core')
+    import jsii
+    from benchmarks.synth_benchmark import synthesize
+
+    create = jsii.create
+    result = synthesize(1)
+
+    assert result['jsii_calls'] > 0
+    assert result['jsii_calls_by_operation']['create'] > 0
+    assert result['jsii_calls_by_class']['CfnDBCluster'] > 0
+    assert jsii.create == create